@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多账号支持
+
+- 一个进程同时服务多个机器人QQ号，共用插件实例、缓存和数据
+- 事件按 self_id 找到对应账号，处理期间的API调用通过该账号的LLOneBot接口发送
+- 当前账号保存在上下文变量中，事件处理中创建的任务自动继承，插件无需传递账号
+- 每个账号有独立的HTTP会话和连接数上限，超出上限的请求在该账号的会话中排队
+- 多个账号在同一个群时，由最先收到该群事件的账号负责处理，其他账号的重复事件直接丢弃；
+  负责的账号长时间没有收到该群的事件（例如被移出群）后由其他账号接替
+"""
+
+import time
+import logging
+import contextvars
+from typing import Dict, Any, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger("LCHBot")
+
+# 当前事件所属的账号
+current_account: contextvars.ContextVar[Optional["BotAccount"]] = contextvars.ContextVar(
+    "lchbot_account", default=None)
+
+class BotAccount:
+    """一个机器人账号的接口配置和统计"""
+
+    __slots__ = ("self_id", "base_url", "headers", "max_connections", "session", "events", "duplicates")
+
+    def __init__(self, self_id: str, base_url: str, token: str = "", max_connections: int = 16):
+        """
+        参数:
+            self_id: 机器人QQ号
+            base_url: LLOneBot HTTP API 地址
+            token: 访问令牌
+            max_connections: 同时进行的API请求上限
+        """
+        self.self_id = str(self_id)
+        self.base_url = base_url
+        self.headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.max_connections = max_connections
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.events = 0  # 处理的事件数
+        self.duplicates = 0  # 因其他账号负责该群而丢弃的事件数
+
+    def open(self) -> aiohttp.ClientSession:
+        """创建该账号的HTTP会话"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_connections))
+        return self.session
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+
+class AccountRegistry:
+    """按 self_id 管理机器人账号"""
+
+    def __init__(self, config: Dict[str, Any], metrics=None):
+        """
+        参数:
+            config: 完整配置。未配置 accounts.bots 时，使用 bot.self_id 和 llonebot.http_api 作为唯一账号
+            metrics: 运行指标注册表
+        """
+        self.metrics = metrics
+        self.config = config
+        self.accounts: Dict[str, BotAccount] = {}
+        self.load()
+
+        # 负责各群的账号 {群号: (账号QQ号, 最近收到事件的时间)}
+        self.group_owners: Dict[int, Tuple[str, float]] = {}
+        self.unknown = 0  # 未配置的账号发来的事件数
+
+    def load(self) -> None:
+        """从配置读取账号列表"""
+        accounts_config = self.config.get("accounts", {})
+        api_config = self.config.get("llonebot", {}).get("http_api", {})
+        bots = accounts_config.get("bots") or [{
+            "self_id": self.config.get("bot", {}).get("self_id", ""),
+            "base_url": api_config.get("base_url", ""),
+            "token": api_config.get("token", "")
+        }]
+
+        accounts = {}
+        for item in bots:
+            account = BotAccount(
+                self_id=item.get("self_id", ""),
+                base_url=item.get("base_url", api_config.get("base_url", "")),
+                token=item.get("token", ""),
+                max_connections=item.get("max_connections", 16)
+            )
+            accounts[account.self_id] = account
+        self.accounts = accounts
+        self.default = next(iter(accounts.values()))
+        self.multiple = len(accounts) > 1
+        self.owner_timeout = accounts_config.get("group_owner_timeout", 600)
+
+    def current(self) -> BotAccount:
+        """当前事件所属的账号，不在事件处理中时为默认账号"""
+        return current_account.get() or self.default
+
+    def get(self, self_id: Any) -> Optional[BotAccount]:
+        return self.accounts.get(str(self_id))
+
+    def activate(self, account: BotAccount) -> None:
+        """把账号设为当前上下文（当前任务及其创建的任务）的账号"""
+        current_account.set(account)
+
+    def route(self, event: Dict[str, Any]) -> Optional[BotAccount]:
+        """
+        找到处理事件的账号并设为当前账号
+
+        返回:
+            账号，事件来自未配置的账号或该群由其他账号负责时返回None
+        """
+        if not self.multiple:
+            self.default.events += 1
+            return self.default
+
+        account = self.accounts.get(str(event.get("self_id", "")))
+        if account is None:
+            self.unknown += 1
+            self._count("unknown", "unknown")
+            logger.debug(f"忽略未配置的账号 {event.get('self_id')} 的事件")
+            return None
+
+        group_id = event.get("group_id")
+        if group_id is not None and event.get("post_type") in ("message", "notice"):
+            now = time.monotonic()
+            owner = self.group_owners.get(group_id)
+            if owner is not None and owner[0] != account.self_id and now - owner[1] < self.owner_timeout:
+                account.duplicates += 1
+                self._count(account.self_id, "duplicate")
+                return None
+            self.group_owners[group_id] = (account.self_id, now)
+
+        account.events += 1
+        self._count(account.self_id, "handled")
+        current_account.set(account)
+        return account
+
+    def _count(self, self_id: str, result: str) -> None:
+        if self.metrics is not None:
+            self.metrics.inc("lchbot_account_events_total", self_id=self_id, result=result)
+
+    async def open(self) -> None:
+        """打开各账号的HTTP会话。配置在创建后可能被修改（例如压测工具替换接口地址），打开前重新读取"""
+        if all(account.session is None for account in self.accounts.values()):
+            self.load()
+        for account in self.accounts.values():
+            account.open()
+
+    async def close(self) -> None:
+        for account in self.accounts.values():
+            await account.close()
+
+    def format_status(self) -> Dict[str, str]:
+        """生成用于 /system 显示的状态信息"""
+        if not self.multiple:
+            return {}
+        status = {}
+        for account in self.accounts.values():
+            groups = sum(1 for owner, _ in self.group_owners.values() if owner == account.self_id)
+            status[f"账号 {account.self_id}"] = (f"负责 {groups} 个群，处理 {account.events} 个事件，"
+                                                 f"丢弃重复事件 {account.duplicates} 个")
+        if self.unknown:
+            status["未配置账号的事件"] = str(self.unknown)
+        return status
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+消息准入过滤
+
+- 屏蔽列表、全局黑名单、访问限制的拉黑和白名单合并为一张以 (类型, QQ号/群号) 为键的哈希表，
+  消息事件在分发给插件之前只查一次表决定是否丢弃，被丢弃的消息不再经过任何插件
+- 各名单由拥有它的插件作为"来源"注册，名单变化时只重新合并受影响的键，不重建整张表
+- 规则可以带过期时间，过期的规则在查到时删除
+- 按丢弃原因计数；黑名单、访问限制等需要提示用户的原因可以注册提示回调，只在丢弃时调用
+- 保存在共享状态存储中的名单可以注册加载函数，按间隔重新加载，其他进程的修改在一个间隔内生效
+"""
+
+import time
+import logging
+from collections import Counter
+from typing import Dict, Any, Callable, Optional, Tuple, Awaitable
+
+logger = logging.getLogger("LCHBot")
+
+USER = "user"
+GROUP = "group"
+
+# 规则类型，按优先级从高到低：同一个键有多条规则时，第一条适用的规则决定结果
+BLOCKED = "blocked"            # 屏蔽（如Q群管家），只对群消息生效，静默丢弃
+BLACKLISTED = "blacklisted"    # 全局黑名单，对所有消息生效
+EXEMPT = "exempt"              # 访问限制白名单，放行并跳过之后的访问限制规则
+RATE_LIMITED = "rate_limited"  # 访问限制临时拉黑，只对群消息生效
+
+PRECEDENCE = {BLOCKED: 0, BLACKLISTED: 1, EXEMPT: 2, RATE_LIMITED: 3}
+GROUP_ONLY = {BLOCKED, EXEMPT, RATE_LIMITED}
+
+Key = Tuple[str, int]
+
+class Rule:
+    """一条准入规则"""
+
+    __slots__ = ("kind", "source", "expires", "data")
+
+    def __init__(self, kind: str, source: str, expires: float = 0, data: Any = None):
+        """
+        参数:
+            kind: 规则类型
+            source: 来源名称
+            expires: 过期时间戳，0表示不过期
+            data: 来源附带的信息（如黑名单原因），提示回调中使用
+        """
+        self.kind = kind
+        self.source = source
+        self.expires = expires
+        self.data = data
+
+    def expired(self, now: float) -> bool:
+        return 0 < self.expires < now
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Rule) and (self.kind, self.source, self.expires, self.data) == \
+            (other.kind, other.source, other.expires, other.data)
+
+def make_key(scope: str, target: Any) -> Optional[Key]:
+    """生成规则的键，QQ号和群号统一为整数，无效时返回None"""
+    try:
+        return scope, int(target)
+    except (TypeError, ValueError):
+        return None
+
+class AdmissionFilter:
+    """消息事件的准入判断"""
+
+    def __init__(self, refresh_interval: float = 30.0, metrics=None):
+        """
+        参数:
+            refresh_interval: 重新加载共享名单的间隔（秒），0表示不重新加载
+            metrics: 运行指标注册表
+        """
+        self.refresh_interval = refresh_interval
+        self.metrics = metrics
+        # 合并后的规则 {键: (规则, ...)}，按优先级排序
+        self.rules: Dict[Key, Tuple[Rule, ...]] = {}
+        # 各来源的规则 {来源: {键: 规则}}
+        self.sources: Dict[str, Dict[Key, Rule]] = {}
+        # 共享名单的加载函数 {来源: 返回 {键: 规则} 的函数}
+        self.loaders: Dict[str, Callable[[], Dict[Key, Rule]]] = {}
+        # 丢弃时的提示回调 {规则类型: async (事件, 规则)}
+        self.notifiers: Dict[str, Callable[[Dict[str, Any], Rule], Awaitable[None]]] = {}
+        self.drops: Counter = Counter()  # 各原因的丢弃数
+        self.checked = 0                 # 检查的消息数
+        self.rebuilds = 0                # 重新合并的键数
+        self.group_keys = 0              # 有规则的群数，为0时不查群规则
+        self._next_refresh = 0.0
+
+    # ---- 名单维护 ----
+
+    def set_source(self, source: str, rules: Dict[Key, Rule],
+                   loader: Optional[Callable[[], Dict[Key, Rule]]] = None) -> None:
+        """
+        替换一个来源的全部规则（插件初始化或热重载时调用），只重新合并有变化的键
+
+        参数:
+            source: 来源名称
+            rules: {键: 规则}
+            loader: 共享名单的加载函数，按间隔调用并替换该来源的规则
+        """
+        old = self.sources.get(source, {})
+        self.sources[source] = dict(rules)
+        if loader is not None:
+            self.loaders[source] = loader
+        for key in old.keys() | rules.keys():
+            if old.get(key) != rules.get(key):
+                self._merge(key)
+
+    def add(self, source: str, key: Optional[Key], kind: str, expires: float = 0, data: Any = None) -> None:
+        """添加或更新一条规则"""
+        if key is None:
+            return
+        self.sources.setdefault(source, {})[key] = Rule(kind, source, expires, data)
+        self._merge(key)
+
+    def remove(self, source: str, key: Optional[Key]) -> bool:
+        """删除一条规则，返回规则是否存在"""
+        if key is None or self.sources.get(source, {}).pop(key, None) is None:
+            return False
+        self._merge(key)
+        return True
+
+    def get(self, source: str, key: Optional[Key]) -> Optional[Rule]:
+        """获取来源中未过期的规则"""
+        rule = self.sources.get(source, {}).get(key)
+        if rule is None or rule.expired(time.time()):
+            return None
+        return rule
+
+    def set_notifier(self, kind: str, notifier: Callable[[Dict[str, Any], Rule], Awaitable[None]]) -> None:
+        """设置某类规则丢弃消息时的提示回调"""
+        self.notifiers[kind] = notifier
+
+    def _merge(self, key: Key) -> None:
+        """重新合并一个键在各来源中的规则"""
+        now = time.time()
+        merged = []
+        for rules in self.sources.values():
+            rule = rules.get(key)
+            if rule is None:
+                continue
+            if rule.expired(now):
+                del rules[key]
+                continue
+            merged.append(rule)
+        existed = key in self.rules
+        if merged:
+            merged.sort(key=lambda rule: PRECEDENCE.get(rule.kind, len(PRECEDENCE)))
+            self.rules[key] = tuple(merged)
+        else:
+            self.rules.pop(key, None)
+        if key[0] == GROUP and existed != bool(merged):
+            self.group_keys += 1 if merged else -1
+        self.rebuilds += 1
+
+    def refresh(self) -> None:
+        """重新加载共享名单"""
+        for source, loader in list(self.loaders.items()):
+            try:
+                self.set_source(source, loader())
+            except Exception as e:
+                logger.error(f"重新加载准入名单 {source} 失败: {e}")
+
+    # ---- 准入判断 ----
+
+    def _match(self, key: Optional[Key], is_group: bool, now: float) -> Optional[Rule]:
+        """键对应的第一条适用的规则"""
+        rules = self.rules.get(key)
+        if rules is None:
+            return None
+        for rule in rules:
+            if rule.expired(now):
+                self._merge(key)
+                return self._match(key, is_group, now)
+            if is_group or rule.kind not in GROUP_ONLY:
+                return rule
+        return None
+
+    def check(self, event: Dict[str, Any]) -> Optional[Rule]:
+        """
+        判断消息事件是否放行
+
+        返回:
+            丢弃消息的规则，放行时返回None（包括命中白名单）
+        """
+        if event.get("post_type") != "message":
+            return None
+        self.checked += 1
+        now = time.time()
+        if self.loaders and self.refresh_interval > 0 and now >= self._next_refresh:
+            self._next_refresh = now + self.refresh_interval
+            self.refresh()
+        if not self.rules:
+            return None
+
+        is_group = event.get("message_type") == "group"
+        user_id = event.get("user_id")
+        if isinstance(user_id, str):
+            user_id = int(user_id) if user_id.isdigit() else 0
+        rule = self._match((USER, user_id or 0), is_group, now)
+        # 用户的规则为白名单或访问限制时仍要查群规则：白名单只跳过访问限制，群被屏蔽时照样丢弃
+        if is_group and self.group_keys and (rule is None or PRECEDENCE[rule.kind] >= PRECEDENCE[EXEMPT]):
+            # 群号可能是字符串，与名单中的键一样统一为整数，无效时不匹配任何规则
+            group_rule = self._match(make_key(GROUP, event.get("group_id")), True, now)
+            if group_rule is not None and (rule is None or PRECEDENCE[group_rule.kind] < PRECEDENCE[rule.kind]):
+                rule = group_rule
+        if rule is None or rule.kind == EXEMPT:
+            return None
+
+        self.drops[rule.kind] += 1
+        if self.metrics is not None:
+            self.metrics.inc("lchbot_admission_dropped_total", reason=rule.kind)
+        return rule
+
+    def is_exempt(self, user_id: Any) -> bool:
+        """用户是否在访问限制白名单中"""
+        return any(rule.kind == EXEMPT for rule in self.rules.get(make_key(USER, user_id), ()))
+
+    async def notify(self, event: Dict[str, Any], rule: Rule) -> None:
+        """调用丢弃原因对应的提示回调"""
+        notifier = self.notifiers.get(rule.kind)
+        if notifier is None:
+            return
+        try:
+            await notifier(event, rule)
+        except Exception as e:
+            logger.error(f"发送准入提示失败 ({rule.kind}): {e}", exc_info=True)
+
+    def format_status(self) -> Dict[str, str]:
+        """生成用于 /system 显示的状态信息"""
+        if not self.checked:
+            return {}
+        names = {BLOCKED: "屏蔽", BLACKLISTED: "黑名单", RATE_LIMITED: "访问限制"}
+        drops = "，".join(f"{names.get(kind, kind)} {count}" for kind, count in self.drops.most_common())
+        return {"准入过滤": f"{len(self.rules)} 条规则，检查 {self.checked} 条消息，丢弃 {sum(self.drops.values())} 条"
+                           + (f"（{drops}）" if drops else "")}
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+LLOneBot API调用保护
+
+- 每个账号的每个接口一个熔断器：连续失败达到阈值后打开，打开期间的调用立即失败，不再等待超时；
+  冷却时间过后放行一个探测调用（半开），成功则关闭，失败则重新打开并延长冷却时间
+- 超时时间根据该接口最近的耗时分位数计算，样本不足时使用上限
+- 重试间隔为带随机抖动的指数退避，多个调用不会在同一时刻一起重试
+- 不重要的消息（如提示、订阅推送）在接口不可用时放入延迟队列，接口恢复后按顺序补发，超过保留时间的丢弃
+"""
+
+import time
+import random
+import logging
+from collections import deque
+from typing import Dict, Any, Deque, Optional, Tuple
+
+logger = logging.getLogger("LCHBot")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_NAMES = {CLOSED: "正常", OPEN: "熔断", HALF_OPEN: "探测中"}
+
+class CircuitBreaker:
+    """一个接口的熔断器和耗时统计"""
+
+    __slots__ = ("endpoint", "state", "failures", "opened_at", "cooldown", "probing",
+                 "latencies", "opens", "rejected", "_timeout", "_timeout_samples")
+
+    def __init__(self, endpoint: str, cooldown: float, window_size: int = 128):
+        self.endpoint = endpoint
+        self.state = CLOSED
+        self.failures = 0          # 连续失败次数
+        self.opened_at = 0.0
+        self.cooldown = cooldown   # 当前的冷却时间（秒），连续探测失败时加倍
+        self.probing = False       # 半开状态下是否已有探测调用
+        self.latencies: Deque[float] = deque(maxlen=window_size)  # 最近成功调用的耗时（秒）
+        self.opens = 0             # 打开次数
+        self.rejected = 0          # 打开期间拒绝的调用数
+        self._timeout = 0.0        # 缓存的超时时间
+        self._timeout_samples = -1 # 计算缓存时的样本数
+
+    def allow(self, now: float) -> bool:
+        """是否放行一次调用；冷却结束时转为半开并放行一个探测调用"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self.probing = False
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def end_probe(self) -> None:
+        """探测调用结束但没有记录结果（如被取消）时，允许下一个调用继续探测"""
+        if self.state == HALF_OPEN:
+            self.probing = False
+
+    def available(self, now: float) -> bool:
+        """是否可以调用（不改变状态），延迟队列判断是否补发时使用"""
+        if self.state == OPEN:
+            return now - self.opened_at >= self.cooldown
+        return not (self.state == HALF_OPEN and self.probing)
+
+    def record_success(self, elapsed: float, base_cooldown: float) -> None:
+        self.latencies.append(elapsed)
+        self.failures = 0
+        if self.state != CLOSED:
+            logger.info(f"LLOneBot接口 {self.endpoint} 已恢复")
+            self.state = CLOSED
+            self.cooldown = base_cooldown
+            self.probing = False
+
+    def record_failure(self, now: float, threshold: int, max_cooldown: float) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            # 探测失败，重新打开并延长冷却时间
+            self.cooldown = min(self.cooldown * 2, max_cooldown)
+            self._open(now)
+        elif self.state == CLOSED and self.failures >= threshold:
+            self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self.opened_at = now
+        self.probing = False
+        self.opens += 1
+        logger.warning(f"LLOneBot接口 {self.endpoint} 连续失败 {self.failures} 次，熔断 {self.cooldown:.0f} 秒")
+
+    def percentile(self, point: float) -> float:
+        """最近成功调用耗时的分位数（秒），没有样本时返回0"""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(point / 100 * len(ordered)))]
+
+    def timeout(self, min_timeout: float, max_timeout: float, multiplier: float, min_samples: int) -> float:
+        """根据耗时分位数计算本次调用的超时时间，每收到若干个新样本重新计算一次"""
+        samples = len(self.latencies)
+        if samples < min_samples:
+            return max_timeout
+        if self._timeout_samples < 0 or abs(samples - self._timeout_samples) >= 16 or samples == self.latencies.maxlen:
+            self._timeout = min(max_timeout, max(min_timeout, self.percentile(99) * multiplier))
+            self._timeout_samples = samples
+        return self._timeout
+
+class ApiGuard:
+    """LLOneBot API调用的熔断、超时、退避和延迟发送"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, metrics=None):
+        """
+        参数:
+            config: api_guard 配置
+            metrics: 运行指标注册表
+        """
+        config = config or {}
+        self.failure_threshold = config.get("failure_threshold", 5)   # 连续失败多少次后熔断
+        self.cooldown = config.get("cooldown", 10.0)                  # 熔断后首次探测前的等待时间（秒）
+        self.max_cooldown = config.get("max_cooldown", 120.0)         # 冷却时间上限（秒）
+        self.min_timeout = config.get("min_timeout", 2.0)             # 超时时间下限（秒）
+        self.max_timeout = config.get("max_timeout", 10.0)            # 超时时间上限，样本不足时使用（秒）
+        self.timeout_multiplier = config.get("timeout_multiplier", 4.0)  # 超时时间 = p99耗时 × 倍数
+        self.min_samples = config.get("min_samples", 20)              # 开始自适应超时所需的样本数
+        self.max_retries = config.get("max_retries", 3)               # 最多尝试次数
+        self.backoff_base = config.get("backoff_base", 0.5)           # 退避基数（秒）
+        self.backoff_cap = config.get("backoff_cap", 5.0)             # 单次退避上限（秒）
+        self.deferred_ttl = config.get("deferred_ttl", 600)           # 延迟消息的保留时间（秒）
+        self.metrics = metrics
+
+        self.breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        # 延迟发送的调用 (加入时间, 账号QQ号, 接口地址, 参数)
+        self.deferred: Deque[Tuple[float, str, str, Dict[str, Any]]] = deque(maxlen=config.get("deferred_size", 1000))
+        self.deferred_sent = 0
+        self.deferred_dropped = 0
+
+    def breaker(self, self_id: str, endpoint: str) -> CircuitBreaker:
+        key = (self_id, endpoint)
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            breaker = self.breakers[key] = CircuitBreaker(endpoint, self.cooldown)
+        return breaker
+
+    def timeout(self, breaker: CircuitBreaker) -> float:
+        return breaker.timeout(self.min_timeout, self.max_timeout, self.timeout_multiplier, self.min_samples)
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重试前的等待时间：指数增长的上限内均匀随机"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def record_success(self, breaker: CircuitBreaker, elapsed: float) -> None:
+        breaker.record_success(elapsed, self.cooldown)
+        self._set_state_gauge(breaker)
+
+    def record_failure(self, breaker: CircuitBreaker) -> None:
+        breaker.record_failure(time.monotonic(), self.failure_threshold, self.max_cooldown)
+        self._set_state_gauge(breaker)
+
+    def _set_state_gauge(self, breaker: CircuitBreaker) -> None:
+        if self.metrics is not None:
+            self.metrics.set_gauge("lchbot_api_breaker_open", 0 if breaker.state == CLOSED else 1,
+                                   endpoint=breaker.endpoint)
+
+    # ---- 延迟发送 ----
+
+    def defer(self, self_id: str, url: str, data: Dict[str, Any]) -> None:
+        """加入延迟队列，队列已满时丢弃最早的调用"""
+        if len(self.deferred) == self.deferred.maxlen:
+            self.deferred_dropped += 1
+            if self.metrics is not None:
+                self.metrics.inc("lchbot_api_deferred_total", result="dropped")
+        self.deferred.append((time.monotonic(), self_id, url, data))
+        if self.metrics is not None:
+            self.metrics.inc("lchbot_api_deferred_total", result="queued")
+
+    def requeue(self, item: Tuple[float, str, str, Dict[str, Any]]) -> None:
+        """
+        补发失败的调用放回队首，保持发送顺序和加入时间
+
+        队列在补发期间已被新的调用填满时，与 defer 一样丢弃最早的调用（即这个调用），不挤掉较新的调用
+        """
+        if len(self.deferred) == self.deferred.maxlen:
+            self.deferred_dropped += 1
+            if self.metrics is not None:
+                self.metrics.inc("lchbot_api_deferred_total", result="dropped")
+            return
+        self.deferred.appendleft(item)
+
+    def next_deferred(self) -> Optional[Tuple[float, str, str, Dict[str, Any]]]:
+        """
+        取出下一个可以补发的调用，丢弃过期的调用
+
+        返回:
+            (加入时间, 账号QQ号, 接口地址, 参数)；队列为空或接口仍不可用时返回None
+        """
+        now = time.monotonic()
+        while self.deferred:
+            queued_at, self_id, url, data = self.deferred[0]
+            if now - queued_at > self.deferred_ttl:
+                self.deferred.popleft()
+                self.deferred_dropped += 1
+                if self.metrics is not None:
+                    self.metrics.inc("lchbot_api_deferred_total", result="expired")
+                continue
+            if not self.breaker(self_id, url.strip("/")).available(now):
+                return None
+            return self.deferred.popleft()
+        return None
+
+    def format_status(self) -> Dict[str, str]:
+        """生成用于 /system 显示的状态信息"""
+        status = {}
+        multiple = len({self_id for self_id, _ in self.breakers}) > 1
+        for (self_id, endpoint), breaker in sorted(self.breakers.items()):
+            if breaker.state == CLOSED and not breaker.opens:
+                continue
+            name = f"{self_id} {endpoint}" if multiple else endpoint
+            status[f"接口 {name}"] = (f"{STATE_NAMES[breaker.state]}，熔断 {breaker.opens} 次，"
+                                     f"拒绝 {breaker.rejected} 次，p99 {breaker.percentile(99) * 1000:.0f}ms")
+        if not status:
+            status["LLOneBot接口"] = f"正常（{len(self.breakers)} 个接口）"
+        if self.deferred or self.deferred_sent or self.deferred_dropped:
+            status["延迟发送"] = (f"排队 {len(self.deferred)} 条，已补发 {self.deferred_sent} 条，"
+                                  f"丢弃 {self.deferred_dropped} 条")
+        return status
@@ -0,0 +1,581 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+事件回放与压测工具
+
+在进程内启动一个模拟LLOneBot HTTP API的服务，并把机器人的API地址指向它。
+然后按指定速率把合成事件或录制的OneBot事件送入机器人，最后输出以下结果:
+吞吐量、端到端延迟分位数、内存增长和各插件耗时。
+
+用法（在项目根目录执行）:
+    python src/benchmark.py --events 2000 --rate 200
+    python src/benchmark.py --input events.jsonl --mode http --output bench.json
+    python src/benchmark.py --input logs/journal --original-timing --speed 2
+    python src/benchmark.py --events 2000 --compare bench.json
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from collections import Counter, deque
+from typing import Dict, Any, List, Optional, Iterable, Callable, Awaitable, Tuple
+
+import aiohttp
+import psutil
+from aiohttp import web
+
+# 添加当前目录到模块搜索路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from metrics import MetricsRegistry
+from event_journal import iter_journal, JOURNAL_SUFFIX
+
+logger = logging.getLogger("LCHBot")
+
+# 记录事件发出时间的字段，机器人处理前会被移除
+SENT_AT_KEY = "_bench_sent_at"
+
+# 合成事件使用的@机器人命令，只包含不访问外部网络的命令
+SYNTHETIC_COMMANDS = ["/help", "/sign", "/mysign", "/points", "/rank", "/bag", "/shop", "/echo 压测", "/join_time 5"]
+
+# 合成事件使用的普通聊天内容
+SYNTHETIC_TEXTS = ["早上好", "今天天气不错", "有人一起玩吗", "哈哈哈哈", "这个怎么弄啊", "晚安", "收到", "+1"]
+
+class StubOneBotServer:
+    """模拟LLOneBot HTTP API的服务，记录并应答机器人的API调用"""
+
+    def __init__(self, host: str = "127.0.0.1", latency: float = 0.0, member_count: int = 50):
+        """
+        参数:
+            host: 监听地址，端口由系统分配
+            latency: 每次API调用的模拟延迟（秒）
+            member_count: get_group_member_list 返回的成员数量
+        """
+        self.host = host
+        self.latency = latency
+        self.member_count = member_count
+        # 各接口调用次数 {接口名: 次数}
+        self.calls = Counter()
+        # 最近的调用记录 [(接口名, 参数)]
+        self.recent_calls = deque(maxlen=100)
+        self.base_url = ""
+        self._message_id = 0
+        self._runner: Optional[web.AppRunner] = None
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "send_msg": self._send_msg,
+            "send_group_msg": self._send_msg,
+            "send_private_msg": self._send_msg,
+            "get_group_member_info": self._get_group_member_info,
+            "get_group_member_list": self._get_group_member_list,
+        }
+
+    async def start(self) -> str:
+        """启动服务并返回API地址"""
+        app = web.Application()
+        app.router.add_post("/{endpoint:.*}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind((self.host, 0))
+        site = web.SockSite(self._runner, sock)
+        await site.start()
+
+        self.base_url = f"http://{self.host}:{sock.getsockname()[1]}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        """停止服务"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        """记录调用并返回模拟结果"""
+        endpoint = request.match_info["endpoint"].strip("/")
+        try:
+            data = await request.json()
+        except Exception:
+            data = {}
+        self.calls[endpoint] += 1
+        self.recent_calls.append((endpoint, data))
+
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+        handler = self._handlers.get(endpoint)
+        result = handler(data) if handler else None
+        return web.json_response({"status": "ok", "retcode": 0, "data": result})
+
+    def _send_msg(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        self._message_id += 1
+        return {"message_id": self._message_id}
+
+    def _member(self, group_id: Any, user_id: Any) -> Dict[str, Any]:
+        return {
+            "group_id": group_id,
+            "user_id": user_id,
+            "nickname": f"用户{user_id}",
+            "card": "",
+            "role": "member",
+            "title": "",
+            "join_time": 1600000000 + int(user_id) % 10000000,
+            "last_sent_time": int(time.time())
+        }
+
+    def _get_group_member_info(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return self._member(data.get("group_id"), data.get("user_id", 0))
+
+    def _get_group_member_list(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        group_id = data.get("group_id")
+        return [self._member(group_id, 10000 + i) for i in range(self.member_count)]
+
+class LatencyRecorder:
+    """包装机器人的事件处理函数，记录每个事件的端到端延迟"""
+
+    def __init__(self):
+        self.samples: List[float] = []
+        self.completed = 0
+        self.errors = 0
+        self.expected = 0
+        self._done = asyncio.Event()
+
+    def wrap(self, handler: Callable[[Dict[str, Any]], Awaitable[Any]]) -> Callable[[Dict[str, Any]], Awaitable[None]]:
+        """返回记录延迟的事件处理函数"""
+        async def timed_handler(event: Dict[str, Any]) -> None:
+            sent_at = event.pop(SENT_AT_KEY, None)
+            try:
+                await handler(event)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"压测事件处理出错: {e}", exc_info=True)
+            finally:
+                if sent_at is not None:
+                    self.samples.append(time.perf_counter() - sent_at)
+                self.completed += 1
+                if self.completed >= self.expected:
+                    self._done.set()
+        return timed_handler
+
+    def reset(self, expected: int) -> None:
+        """清空样本并设置期望完成的事件数"""
+        self.samples = []
+        self.completed = 0
+        self.errors = 0
+        self.expected = expected
+        self._done.clear()
+
+    async def wait(self, timeout: float) -> bool:
+        """等待所有事件处理完毕，超时返回False"""
+        if self.completed >= self.expected:
+            return True
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+def percentile(ordered: List[float], point: float) -> float:
+    """从已排序的样本中取分位数"""
+    if not ordered:
+        return 0.0
+    return ordered[int(round(point / 100 * (len(ordered) - 1)))]
+
+def generate_events(count: int, self_id: str, groups: int = 5, users: int = 1000,
+                    command_ratio: float = 0.2, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    生成合成的群消息事件
+
+    参数:
+        count: 事件数量
+        self_id: 机器人QQ号
+        groups: 群数量
+        users: 用户数量，用户越多越不容易触发频率限制
+        command_ratio: @机器人命令所占比例，其余为普通聊天
+        seed: 随机种子，相同参数生成相同的事件序列
+    返回:
+        事件列表
+    """
+    rng = random.Random(seed)
+    events = []
+    now = int(time.time())
+    for i in range(count):
+        group_id = 100000 + rng.randrange(groups)
+        user_id = 20000000 + rng.randrange(users)
+        if rng.random() < command_ratio:
+            command = rng.choice(SYNTHETIC_COMMANDS)
+            message = [
+                {"type": "at", "data": {"qq": self_id}},
+                {"type": "text", "data": {"text": f" {command}"}}
+            ]
+            raw_message = f"[CQ:at,qq={self_id}] {command}"
+        else:
+            text = rng.choice(SYNTHETIC_TEXTS)
+            message = [{"type": "text", "data": {"text": text}}]
+            raw_message = text
+        events.append({
+            "time": now,
+            "self_id": int(self_id) if str(self_id).isdigit() else self_id,
+            "post_type": "message",
+            "message_type": "group",
+            "sub_type": "normal",
+            "message_id": i + 1,
+            "group_id": group_id,
+            "user_id": user_id,
+            "message": message,
+            "raw_message": raw_message,
+            "font": 0,
+            "sender": {"user_id": user_id, "nickname": f"用户{user_id}", "card": "", "role": "member"}
+        })
+    return events
+
+def load_events(path: str) -> Tuple[List[Dict[str, Any]], Optional[List[float]]]:
+    """
+    加载录制的事件
+
+    参数:
+        path: 事件日志目录或文件(.jsonl.gz)，或每行一个事件的JSON Lines文件
+    返回:
+        (事件列表, 相对第一个事件的接收时间偏移列表)，JSON Lines文件没有时间信息，偏移为None
+    """
+    if os.path.isdir(path) or path.endswith(JOURNAL_SUFFIX):
+        events = []
+        offsets = []
+        first = None
+        for recorded_at, event in iter_journal(path):
+            if first is None:
+                first = recorded_at
+            events.append(event)
+            offsets.append(recorded_at - first)
+        return events, offsets
+
+    events = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                events.append(json.loads(line))
+    return events, None
+
+def collect_plugin_costs(bot) -> List[Dict[str, Any]]:
+    """汇总各插件的调用次数和耗时，按总耗时降序排列"""
+    costs: Dict[str, Dict[str, Any]] = {}
+    for plugin in bot.plugin_manager.plugins:
+        entry = {"plugin": plugin.name, "calls": 0, "total": 0.0, "errors": 0, "p95": 0.0, "max": 0.0}
+        for kind in ("message", "notice", "request"):
+            histogram = bot.metrics.get_histogram("lchbot_plugin_handler_seconds", plugin=plugin.name, kind=kind)
+            if histogram is not None:
+                entry["calls"] += histogram.count
+                entry["total"] += histogram.sum
+            entry["errors"] += int(bot.metrics.get_counter("lchbot_plugin_errors_total", plugin=plugin.name, kind=kind))
+        stats = bot.plugin_manager.get_handler_stats(plugin.name)
+        if stats is not None:
+            entry["p95"] = stats.percentiles(95)[0]
+            entry["max"] = stats.max_time
+        costs[plugin.name] = entry
+    return sorted(costs.values(), key=lambda x: x["total"], reverse=True)
+
+async def send_events(events: Iterable[Dict[str, Any]], rate: float,
+                      submit: Callable[[Dict[str, Any]], Awaitable[Any]],
+                      offsets: Optional[List[float]] = None) -> List[asyncio.Task]:
+    """
+    按固定速率或原始时间间隔发送事件
+
+    延迟从事件的计划发送时间开始计算，发送端落后时排队的时间也会计入延迟。
+
+    参数:
+        events: 事件序列
+        rate: 每秒事件数，0表示不限速；提供offsets时为回放倍速
+        submit: 提交单个事件的协程函数
+        offsets: 每个事件相对开始时间的偏移（秒），用于按原始时间回放
+    返回:
+        提交任务列表
+    """
+    interval = 1.0 / rate if rate > 0 else 0.0
+    tasks = []
+    start = time.perf_counter()
+    for i, event in enumerate(events):
+        event = dict(event)
+        if offsets is not None:
+            scheduled = start + (offsets[i] - offsets[0]) / (rate or 1.0)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            event[SENT_AT_KEY] = scheduled
+        elif interval:
+            scheduled = start + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            event[SENT_AT_KEY] = scheduled
+        else:
+            event[SENT_AT_KEY] = time.perf_counter()
+            if i % 100 == 99:
+                # 不限速时定期让出事件循环，避免任务无限堆积
+                await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(submit(event)))
+    return tasks
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """运行一次压测并返回结果"""
+    from main import LCHBot
+
+    stub = StubOneBotServer(latency=args.api_latency / 1000, member_count=args.members)
+    base_url = await stub.start()
+
+    bot = LCHBot(args.config)
+    bot.config.setdefault("llonebot", {}).setdefault("http_api", {})
+    bot.config["llonebot"]["http_api"]["base_url"] = base_url
+    bot.config["llonebot"]["http_api"]["token"] = ""
+    if args.plugins:
+        bot.config["plugins"]["enabled"] = args.plugins.split(",")
+    # 压测期间不启动事件循环监控和事件日志，避免后台任务影响结果
+    bot.loop_monitor = None
+    bot.event_journal = None
+    await bot.initialize()
+
+    self_id = str(bot.config.get("bot", {}).get("self_id", "123456"))
+    offsets = None
+    if args.input:
+        events, offsets = load_events(args.input)
+        if not args.original_timing:
+            offsets = None
+    else:
+        events = generate_events(args.events + args.warmup, self_id, groups=args.groups, users=args.users,
+                                 command_ratio=args.command_ratio, seed=args.seed)
+    warmup_events, events = events[:args.warmup], events[args.warmup:]
+    if offsets is not None:
+        offsets = offsets[args.warmup:]
+
+    recorder = LatencyRecorder()
+    # handle_event_http 通过 self.handle_event 调度事件，替换实例属性即可同时覆盖两种模式
+    bot.handle_event = recorder.wrap(bot.handle_event)
+
+    runner = None
+    client = None
+    if args.mode == "http":
+        app = web.Application()
+        app.router.add_post("/", bot.handle_event_http)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        await web.SockSite(runner, sock).start()
+        event_url = f"http://127.0.0.1:{sock.getsockname()[1]}/"
+        client = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.concurrency))
+
+        async def submit(event: Dict[str, Any]) -> None:
+            async with client.post(event_url, json=event) as response:
+                await response.read()
+    else:
+        submit = bot.handle_event
+
+    process = psutil.Process()
+    try:
+        # 预热：加载缓存、建立连接，结果不计入统计
+        if warmup_events:
+            recorder.reset(len(warmup_events))
+            await send_events(warmup_events, 0, submit)
+            await recorder.wait(args.timeout)
+
+        bot.metrics = MetricsRegistry(enabled=True)
+        bot.plugin_manager.handler_stats.clear()
+        stub.calls.clear()
+
+        gc.collect()
+        rss_before = process.memory_info().rss
+        if args.tracemalloc:
+            tracemalloc.start()
+
+        recorder.reset(len(events))
+        start = time.perf_counter()
+        if offsets is not None:
+            await send_events(events, args.speed, submit, offsets)
+        else:
+            await send_events(events, args.rate, submit)
+        finished = await recorder.wait(args.timeout)
+        elapsed = time.perf_counter() - start
+
+        traced_current = traced_peak = 0
+        if args.tracemalloc:
+            traced_current, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        gc.collect()
+        rss_after = process.memory_info().rss
+    finally:
+        if client is not None:
+            await client.close()
+        if runner is not None:
+            await runner.cleanup()
+        await bot.close()
+        await stub.stop()
+
+    ordered = sorted(recorder.samples)
+    return {
+        "mode": args.mode,
+        "rate": args.rate,
+        "replay_speed": args.speed if offsets is not None else None,
+        "events": len(events),
+        "completed": recorder.completed,
+        "errors": recorder.errors,
+        "timed_out": not finished,
+        "elapsed": elapsed,
+        "events_per_second": recorder.completed / elapsed if elapsed > 0 else 0.0,
+        "latency": {
+            "p50": percentile(ordered, 50),
+            "p90": percentile(ordered, 90),
+            "p99": percentile(ordered, 99),
+            "max": ordered[-1] if ordered else 0.0
+        },
+        "memory": {
+            "rss_before": rss_before,
+            "rss_after": rss_after,
+            "rss_growth": rss_after - rss_before,
+            "traced_current": traced_current,
+            "traced_peak": traced_peak
+        },
+        "api_calls": dict(stub.calls),
+        "plugins": collect_plugin_costs(bot)
+    }
+
+def format_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> str:
+    """格式化压测结果，提供基准结果时附带对比"""
+    mb = 1024 * 1024
+    latency = result["latency"]
+    memory = result["memory"]
+    rate = f"{result['rate']:g} 事件/秒" if result["rate"] else "不限速"
+    if result.get("replay_speed"):
+        rate = f"按原始时间 {result['replay_speed']:g} 倍速"
+
+    lines = ["【压测结果】"]
+    lines.append(f"模式: {result['mode']}  发送速率: {rate}")
+    lines.append(f"事件: {result['completed']}/{result['events']} 已处理，出错 {result['errors']}"
+                 + ("（等待超时）" if result["timed_out"] else ""))
+    lines.append(f"耗时: {result['elapsed']:.2f}s  吞吐量: {result['events_per_second']:.1f} 事件/秒")
+    lines.append(f"端到端延迟: p50 {latency['p50'] * 1000:.2f}ms / p90 {latency['p90'] * 1000:.2f}ms / "
+                 f"p99 {latency['p99'] * 1000:.2f}ms / 最大 {latency['max'] * 1000:.2f}ms")
+    lines.append(f"内存(RSS): {memory['rss_before'] / mb:.1f}MB -> {memory['rss_after'] / mb:.1f}MB "
+                 f"(增长 {memory['rss_growth'] / mb:+.1f}MB)")
+    if memory["traced_peak"]:
+        lines.append(f"Python分配(tracemalloc): 当前 {memory['traced_current'] / mb:.1f}MB  "
+                     f"峰值 {memory['traced_peak'] / mb:.1f}MB")
+
+    if result["api_calls"]:
+        calls = ", ".join(f"{name} {count}" for name, count in sorted(result["api_calls"].items()))
+        lines.append(f"API调用: {calls}")
+
+    lines.append("\n【插件耗时】")
+    lines.append(f"{'插件':<20} {'调用':>7} {'总耗时':>9} {'平均':>9} {'p95':>9} {'最大':>9} {'异常':>5}")
+    for entry in result["plugins"]:
+        if not entry["calls"]:
+            continue
+        average = entry["total"] / entry["calls"]
+        lines.append(f"{entry['plugin']:<20} {entry['calls']:>7} {entry['total'] * 1000:>7.1f}ms "
+                     f"{average * 1000:>7.3f}ms {entry['p95'] * 1000:>7.3f}ms {entry['max'] * 1000:>7.2f}ms "
+                     f"{entry['errors']:>5}")
+
+    if baseline:
+        def change(current: float, previous: float) -> str:
+            if not previous:
+                return "N/A"
+            return f"{(current - previous) / previous * 100:+.1f}%"
+
+        lines.append("\n【与基准对比】")
+        lines.append(f"吞吐量: {baseline['events_per_second']:.1f} -> {result['events_per_second']:.1f} 事件/秒 "
+                     f"({change(result['events_per_second'], baseline['events_per_second'])})")
+        for point in ("p50", "p99"):
+            before = baseline["latency"][point]
+            after = latency[point]
+            lines.append(f"{point} 延迟: {before * 1000:.2f}ms -> {after * 1000:.2f}ms ({change(after, before)})")
+        lines.append(f"内存增长: {baseline['memory']['rss_growth'] / mb:+.1f}MB -> {memory['rss_growth'] / mb:+.1f}MB")
+
+    return "\n".join(lines)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="LCHBot 事件回放与压测工具")
+    parser.add_argument("--config", default="config/config.yml", help="机器人配置文件")
+    parser.add_argument("--input", help="事件日志目录/文件或JSON Lines事件文件，不指定时使用合成事件")
+    parser.add_argument("--original-timing", action="store_true", help="按事件日志中的原始时间间隔回放")
+    parser.add_argument("--speed", type=float, default=1.0, help="按原始时间回放时的倍速")
+    parser.add_argument("--events", type=int, default=2000, help="合成事件数量")
+    parser.add_argument("--warmup", type=int, default=50, help="预热事件数量，不计入统计")
+    parser.add_argument("--rate", type=float, default=0, help="每秒发送事件数，0表示不限速")
+    parser.add_argument("--mode", choices=["direct", "http"], default="direct",
+                        help="direct 直接调用 handle_event，http 经由 handle_event_http 投递")
+    parser.add_argument("--concurrency", type=int, default=100, help="http模式下的最大并发连接数")
+    parser.add_argument("--groups", type=int, default=5, help="合成事件的群数量")
+    parser.add_argument("--users", type=int, default=1000, help="合成事件的用户数量")
+    parser.add_argument("--members", type=int, default=50, help="模拟群成员列表的成员数量")
+    parser.add_argument("--command-ratio", type=float, default=0.2, help="合成事件中@机器人命令的比例")
+    parser.add_argument("--seed", type=int, default=0, help="合成事件的随机种子")
+    parser.add_argument("--api-latency", type=float, default=0, help="模拟API延迟（毫秒）")
+    parser.add_argument("--plugins", help="只加载指定插件，逗号分隔")
+    parser.add_argument("--timeout", type=float, default=120, help="等待事件处理完毕的超时时间（秒）")
+    parser.add_argument("--tracemalloc", action="store_true", help="使用tracemalloc统计Python内存分配（会降低吞吐量）")
+    parser.add_argument("--in-place", action="store_true", help="直接使用项目的data目录，默认复制到临时目录以免污染数据")
+    parser.add_argument("--log-level", default="WARNING", help="压测期间的日志级别")
+    parser.add_argument("--output", help="将结果保存为JSON文件")
+    parser.add_argument("--compare", help="与之前保存的JSON结果对比")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    args = parse_args(argv)
+    # 与 main.py 一致，将项目根目录加入搜索路径，兼容使用 src. 前缀导入的插件
+    base_dir = os.path.dirname(current_dir)
+    if base_dir not in sys.path:
+        sys.path.insert(0, base_dir)
+    args.config = os.path.abspath(args.config)
+    for name in ("input", "output", "compare"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    workdir = None
+    if args.in_place:
+        os.chdir(base_dir)
+    else:
+        # 插件使用相对路径读写data目录，切换到临时目录运行以免压测数据写入正式数据
+        workdir = tempfile.mkdtemp(prefix="lchbot_bench_")
+        shutil.copytree(os.path.join(base_dir, "data"), os.path.join(workdir, "data"))
+        os.chdir(workdir)
+    os.makedirs("logs", exist_ok=True)
+
+    # 压测只输出控制台日志，不启动 main() 中的日志输出，压测日志不会写入 logs/bot.jsonl
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    try:
+        result = asyncio.run(run_benchmark(args))
+    finally:
+        os.chdir(base_dir)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(format_report(result, baseline))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.output}")
+    return 1 if result["timed_out"] or result["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
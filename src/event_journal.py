@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+事件日志模块，将收到的OneBot事件追加写入压缩日志文件，用于问题复现和压测回放
+
+- 每行一条记录: {"t": 接收时间戳, "event": 原始事件}
+- 事件先进入内存缓冲区，由后台任务批量压缩后在线程池中写入，不阻塞事件循环
+- 每批写入为一个独立的gzip成员，进程异常退出时最多丢失最后一批
+- 单个文件超过大小上限后切换到新文件，并删除超出数量上限的旧文件
+"""
+
+import os
+import gzip
+import json
+import time
+import random
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Callable, Iterator, AsyncIterator, Tuple
+
+logger = logging.getLogger("LCHBot")
+
+JOURNAL_PREFIX = "events-"
+JOURNAL_SUFFIX = ".jsonl.gz"
+
+# 脱敏函数: 接收事件字典，返回脱敏后的事件，返回None表示不记录该事件
+Redactor = Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+def make_field_redactor(fields: List[str], mask: str = "***") -> Redactor:
+    """
+    创建按字段路径脱敏的函数
+
+    参数:
+        fields: 字段路径列表，用点分隔嵌套字段，如 ["sender.card", "raw_message"]
+        mask: 替换后的内容
+    返回:
+        脱敏函数，不修改原事件
+    """
+    paths = [field.split(".") for field in fields if field]
+
+    def redact(event: Dict[str, Any]) -> Dict[str, Any]:
+        event = dict(event)
+        for path in paths:
+            target = event
+            for key in path[:-1]:
+                value = target.get(key)
+                if not isinstance(value, dict):
+                    target = None
+                    break
+                # 逐层复制，避免修改插件正在使用的事件
+                value = dict(value)
+                target[key] = value
+                target = value
+            if target is not None and path[-1] in target:
+                target[path[-1]] = mask
+        return event
+
+    return redact
+
+class EventJournal:
+    """只追加的事件日志写入器"""
+
+    def __init__(self, directory: str = "logs/journal", sample_rate: float = 1.0,
+                 max_file_size: int = 64 * 1024 * 1024, max_files: int = 20,
+                 batch_size: int = 500, flush_interval: float = 1.0,
+                 max_pending: int = 10000, redactor: Optional[Redactor] = None, metrics=None):
+        """
+        参数:
+            directory: 日志目录
+            sample_rate: 采样率，0~1，1表示记录全部事件
+            max_file_size: 单个文件大小上限（字节，压缩后）
+            max_files: 保留的文件数量上限
+            batch_size: 缓冲区达到该数量时立即写入
+            flush_interval: 定时写入间隔（秒）
+            max_pending: 缓冲区上限，写入跟不上时丢弃新事件
+            redactor: 脱敏函数
+            metrics: 运行指标注册表
+        """
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_file_size = max_file_size
+        self.max_files = max_files
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.redactor = redactor
+        self.metrics = metrics
+
+        self._buffer: List[str] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._current_file: Optional[str] = None
+
+        self.recorded = 0
+        self.dropped = 0
+
+    def set_redactor(self, redactor: Optional[Redactor]) -> None:
+        """设置脱敏函数，插件可以借此追加自己的脱敏规则"""
+        self.redactor = redactor
+
+    def start(self) -> None:
+        """启动后台写入任务，必须在事件循环中调用"""
+        if self._task is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info(f"事件日志已启用，目录: {self.directory}，采样率: {self.sample_rate}")
+
+    async def stop(self) -> None:
+        """停止后台任务并写入剩余事件"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+
+    def record(self, event: Dict[str, Any], raw: Optional[bytes] = None) -> bool:
+        """
+        记录一个事件
+
+        参数:
+            event: 解析后的事件
+            raw: 原始请求体，未设置脱敏函数时直接写入，省去重新序列化
+        返回:
+            事件是否进入了写入缓冲区
+        """
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self._count("sampled_out")
+            return False
+        if len(self._buffer) >= self.max_pending:
+            self.dropped += 1
+            self._count("dropped")
+            return False
+
+        if self.redactor is not None:
+            try:
+                event = self.redactor(event)
+            except Exception as e:
+                logger.error(f"事件脱敏出错，跳过该事件: {e}")
+                self._count("dropped")
+                return False
+            if event is None:
+                self._count("redacted")
+                return False
+            raw = None
+
+        if raw is not None and b"\n" not in raw:
+            payload = raw.decode("utf-8", errors="replace")
+        else:
+            payload = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+        self._buffer.append(f'{{"t":{time.time():.6f},"event":{payload}}}\n')
+        self.recorded += 1
+        self._count("recorded")
+
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def _count(self, result: str) -> None:
+        if self.metrics is not None:
+            self.metrics.inc("lchbot_journal_events_total", result=result)
+
+    async def _flush_loop(self) -> None:
+        """定时或缓冲区满时批量写入"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """将缓冲区中的事件写入文件"""
+        if not self._buffer:
+            return
+        lines = self._buffer
+        self._buffer = []
+        start = time.perf_counter()
+        success = True
+        try:
+            await asyncio.to_thread(self._write_batch, lines)
+        except Exception as e:
+            success = False
+            logger.error(f"写入事件日志失败，丢弃 {len(lines)} 条事件: {e}")
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_flush("event_journal", time.perf_counter() - start, success)
+
+    def _write_batch(self, lines: List[str]) -> None:
+        """在线程池中压缩并写入一批事件"""
+        path = self._current_file
+        if path is None or not os.path.exists(path) or os.path.getsize(path) >= self.max_file_size:
+            path = self._rotate()
+        data = gzip.compress("".join(lines).encode("utf-8"))
+        with open(path, "ab") as f:
+            f.write(data)
+
+    def _rotate(self) -> str:
+        """创建新的日志文件并清理旧文件"""
+        os.makedirs(self.directory, exist_ok=True)
+        # 文件名由时间和定长序号组成，按名称排序即为写入顺序
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        index = 0
+        while True:
+            path = os.path.join(self.directory, f"{JOURNAL_PREFIX}{stamp}-{index:04d}{JOURNAL_SUFFIX}")
+            if not os.path.exists(path):
+                break
+            index += 1
+        self._current_file = path
+
+        files = list_journal_files(self.directory)
+        for old in files[:max(0, len(files) - self.max_files + 1)]:
+            try:
+                os.remove(old)
+                logger.info(f"已删除旧的事件日志: {old}")
+            except OSError as e:
+                logger.warning(f"删除旧的事件日志失败: {old}, {e}")
+        return path
+
+    def format_status(self) -> Dict[str, str]:
+        """生成用于 /system 显示的状态信息"""
+        return {"事件日志": f"已记录 {self.recorded} 条，丢弃 {self.dropped} 条，待写入 {len(self._buffer)} 条"}
+
+def list_journal_files(path: str) -> List[str]:
+    """列出目录下的事件日志文件（按时间排序），传入文件时直接返回该文件"""
+    if os.path.isfile(path):
+        return [path]
+    if not os.path.isdir(path):
+        return []
+    names = [name for name in os.listdir(path) if name.startswith(JOURNAL_PREFIX) and name.endswith(JOURNAL_SUFFIX)]
+    return [os.path.join(path, name) for name in sorted(names)]
+
+def iter_journal(path: str) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    """
+    同步读取事件日志
+
+    参数:
+        path: 日志文件或目录
+    返回:
+        (接收时间戳, 事件) 的迭代器，损坏的行会被跳过
+    """
+    for file in list_journal_files(path):
+        try:
+            with gzip.open(file, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        yield record["t"], record["event"]
+                    except (ValueError, KeyError):
+                        continue
+        except (OSError, EOFError) as e:
+            # 进程异常退出时最后一个gzip成员可能不完整
+            logger.warning(f"读取事件日志 {file} 中断: {e}")
+
+async def read_journal(path: str, realtime: bool = False, speed: float = 1.0,
+                       chunk_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+    """
+    以异步生成器的方式回放事件日志
+
+    参数:
+        path: 日志文件或目录
+        realtime: 是否按原始时间间隔回放，否则以最快速度输出
+        speed: 按原始时间回放时的倍速
+        chunk_size: 每次在线程池中读取的事件数
+    返回:
+        事件的异步迭代器
+    """
+    iterator = iter_journal(path)
+
+    def next_chunk() -> List[Tuple[float, Dict[str, Any]]]:
+        chunk = []
+        for record in iterator:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                break
+        return chunk
+
+    first_time = None
+    started = time.monotonic()
+    while True:
+        chunk = await asyncio.to_thread(next_chunk)
+        if not chunk:
+            break
+        for recorded_at, event in chunk:
+            if realtime:
+                if first_time is None:
+                    first_time = recorded_at
+                delay = (recorded_at - first_time) / speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield event
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+日志输出
+
+- 事件循环中只创建日志记录并放入队列，格式化为JSON和写入文件、控制台都在后台线程中完成；
+  队列满时丢弃新记录并计数，不阻塞事件循环
+- 日志参数使用 %s 占位符延迟格式化：级别未启用或被采样丢弃的记录不会格式化，
+  较大的对象用 LazyJson 包装，只在需要输出时序列化
+- 文件为JSON Lines格式，每行一条记录，超过大小上限或到达时间间隔后轮转，保留若干个旧文件
+- 可以按子系统（logger名称，如 LCHBot.event、LCHBot.api）设置采样率，只对INFO及以下的记录采样，
+  警告和错误总是输出
+"""
+
+import os
+import sys
+import atexit
+import json
+import time
+import queue
+import random
+import logging
+import logging.handlers
+from typing import Dict, Any, Optional
+
+# 子系统的logger，高频日志使用这些logger，以便单独采样
+EVENT_LOGGER = "LCHBot.event"
+API_LOGGER = "LCHBot.api"
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+class LazyJson:
+    """在日志实际输出时才序列化为JSON的对象"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self) -> str:
+        try:
+            return json.dumps(self.value, ensure_ascii=False, default=str)
+        except (TypeError, ValueError):
+            return repr(self.value)
+
+class JsonLinesFormatter(logging.Formatter):
+    """把日志记录格式化为一行JSON"""
+
+    def __init__(self, shard: Optional[int] = None):
+        super().__init__()
+        self.shard = shard
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if self.shard is not None:
+            entry["shard"] = self.shard
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class SamplingFilter(logging.Filter):
+    """按子系统采样INFO及以下级别的日志"""
+
+    def __init__(self, rates: Dict[str, float]):
+        """
+        参数:
+            rates: {logger名称: 采样率}，子logger使用最近的上级设置
+        """
+        super().__init__()
+        self.rates = {name: float(rate) for name, rate in rates.items()}
+        self._resolved: Dict[str, float] = {}
+        self.dropped = 0
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.dropped += 1
+        return False
+
+class DropQueueHandler(logging.handlers.QueueHandler):
+    """
+    把日志记录放入队列，队列满时丢弃
+
+    与标准 QueueHandler 不同，放入队列前只展开消息参数和异常信息，JSON格式化由后台线程完成
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 参数可能在之后被修改，展开为字符串后再交给后台线程
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class RotatingJsonLinesHandler(logging.handlers.RotatingFileHandler):
+    """按大小或时间轮转的日志文件，旧文件编号为 .1 .2 ..."""
+
+    def __init__(self, path: str, max_bytes: int, backup_count: int, rotate_interval: float):
+        """
+        参数:
+            path: 日志文件路径
+            max_bytes: 单个文件大小上限（字节）
+            backup_count: 保留的旧文件数
+            rotate_interval: 轮转间隔（秒），0表示只按大小轮转
+        """
+        super().__init__(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        self.rotate_interval = rotate_interval
+        self.next_rotate = time.time() + rotate_interval if rotate_interval > 0 else 0.0
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.next_rotate and record.created >= self.next_rotate:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        if self.rotate_interval > 0:
+            self.next_rotate = time.time() + self.rotate_interval
+
+class LogPipeline:
+    """后台线程写入的日志输出"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, level: str = "INFO", shard: Optional[int] = None):
+        """
+        参数:
+            config: logging 配置
+            level: 日志级别
+            shard: 分片工作进程的分片序号，写入每条记录
+        """
+        config = config or {}
+        self.path = config.get("path", "logs/bot.jsonl")
+        if self.path and shard is not None:
+            # 各工作进程分别写入和轮转自己的文件
+            root, ext = os.path.splitext(self.path)
+            self.path = f"{root}.{shard}{ext}"
+        self.sampling = SamplingFilter(config.get("sampling", {}))
+        self.queue: queue.Queue = queue.Queue(maxsize=config.get("queue_size", 10000))
+        self.queue_handler = DropQueueHandler(self.queue)
+        self.queue_handler.addFilter(self.sampling)
+
+        handlers = []
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            file_handler = RotatingJsonLinesHandler(
+                self.path,
+                max_bytes=int(config.get("max_file_mb", 50) * 1024 * 1024),
+                backup_count=config.get("max_files", 10),
+                rotate_interval=config.get("rotate_hours", 24) * 3600
+            )
+            file_handler.setFormatter(JsonLinesFormatter(shard))
+            handlers.append(file_handler)
+        if config.get("console", True):
+            console = logging.StreamHandler(sys.stderr)
+            name = "%(name)s" if shard is None else f"%(name)s[{shard}]"
+            console.setFormatter(logging.Formatter(TEXT_FORMAT.replace("%(name)s", name)))
+            handlers.append(console)
+        self.handlers = handlers
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.level = logging.getLevelName(str(level).upper())
+        if not isinstance(self.level, int):
+            self.level = logging.INFO
+
+    def start(self) -> None:
+        """替换根logger的处理器并启动后台线程"""
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.queue_handler)
+        root.setLevel(self.level)
+        # 采样率为0的子系统提高logger级别，INFO及以下的调用不再创建日志记录
+        for name, rate in self.sampling.rates.items():
+            if rate <= 0:
+                logging.getLogger(name).setLevel(max(self.level, logging.WARNING))
+        self.listener.start()
+
+    def stop(self) -> None:
+        """写入队列中剩余的记录并停止后台线程"""
+        if self.listener._thread is None:
+            return
+        self.listener.stop()
+        for handler in self.handlers:
+            handler.close()
+
+    def format_status(self) -> Dict[str, str]:
+        """生成用于 /system 显示的状态信息"""
+        return {
+            "日志": f"级别 {logging.getLevelName(self.level)}，排队 {self.queue.qsize()} 条，"
+                    f"采样丢弃 {self.sampling.dropped} 条，队列满丢弃 {self.queue_handler.dropped} 条"
+        }
+
+def setup_logging(config: Dict[str, Any], shard: Optional[int] = None) -> LogPipeline:
+    """
+    按配置启动日志输出
+
+    参数:
+        config: 完整配置，读取 logging 段和 bot.log_level
+        shard: 分片工作进程的分片序号
+    返回:
+        已启动的日志输出，退出前调用 stop
+    """
+    level = config.get("logging", {}).get("level") or config.get("bot", {}).get("log_level", "INFO")
+    pipeline = LogPipeline(config.get("logging", {}), level, shard)
+    pipeline.start()
+    # 未正常关闭（如Ctrl+C中断事件循环）时，退出前仍写入队列中剩余的记录
+    atexit.register(pipeline.stop)
+    return pipeline
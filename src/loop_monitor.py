@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+事件循环健康监控模块
+
+- 在事件循环中定时休眠，用实际唤醒时间与预期时间之差衡量调度延迟
+- 使用看门狗线程检测事件循环被阻塞的情况，并抓取阻塞时事件循环线程的调用栈
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger("LCHBot")
+
+class LoopMonitor:
+    """事件循环延迟监控与阻塞检测"""
+
+    def __init__(self, bot, interval: float = 0.5, block_threshold: float = 0.2,
+                 stack_limit: int = 12, history_size: int = 10):
+        """
+        参数:
+            bot: 机器人实例
+            interval: 心跳间隔（秒）
+            block_threshold: 判定为阻塞的延迟阈值（秒）
+            stack_limit: 抓取调用栈的最大帧数
+            history_size: 保留的阻塞记录数量
+        """
+        self.bot = bot
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.stack_limit = stack_limit
+
+        # 最近的延迟样本（秒）
+        self.lag_samples = deque(maxlen=256)
+        self.max_lag = 0.0
+        self.blocked_count = 0
+        # 最近的阻塞记录 [{time, duration, stack}]
+        self.block_reports = deque(maxlen=history_size)
+
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.monotonic()
+        # 看门狗线程正在跟踪的阻塞记录，事件循环恢复后补充阻塞时长
+        self._pending_report: Optional[Dict[str, Any]] = None
+
+    def start(self) -> None:
+        """启动监控，必须在事件循环线程中调用"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="LoopWatchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"事件循环监控已启动，心跳间隔 {self.interval}s，阻塞阈值 {self.block_threshold * 1000:.0f}ms")
+
+    async def stop(self) -> None:
+        """停止监控"""
+        self._stop_event.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self.interval * 2)
+            self._watchdog = None
+
+    async def _heartbeat(self) -> None:
+        """定时唤醒并记录调度延迟"""
+        metrics = self.bot.metrics
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            lag = max(0.0, now - expected)
+            self.lag_samples.append(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+            metrics.observe("lchbot_loop_lag_seconds", lag)
+
+            # 看门狗线程在阻塞期间抓取的调用栈
+            report = self._pending_report
+            self._pending_report = None
+            if report is not None:
+                report["duration"] = lag
+
+            if lag > self.block_threshold:
+                self.blocked_count += 1
+                metrics.inc("lchbot_loop_blocked_total")
+                if report is not None:
+                    logger.warning(f"事件循环被阻塞 {lag * 1000:.0f}ms，阻塞位置:\n{report['stack']}")
+                else:
+                    logger.warning(f"事件循环调度延迟 {lag * 1000:.0f}ms")
+
+    def _watch(self) -> None:
+        """看门狗线程：心跳超时时抓取事件循环线程的调用栈"""
+        check_interval = min(self.interval, self.block_threshold) / 2
+        while not self._stop_event.wait(check_interval):
+            # 心跳本身需要 interval 秒，超过 interval + 阈值仍未更新即视为阻塞
+            stalled = time.monotonic() - self._last_beat - self.interval
+            if stalled <= self.block_threshold or self._pending_report is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame, limit=self.stack_limit)).rstrip()
+            report = {"time": time.time(), "duration": stalled, "stack": stack}
+            self._pending_report = report
+            self.block_reports.append(report)
+
+    def get_lag_percentiles(self) -> List[float]:
+        """获取最近延迟样本的 p50/p99（秒）"""
+        if not self.lag_samples:
+            return [0.0, 0.0]
+        ordered = sorted(self.lag_samples)
+        last = len(ordered) - 1
+        return [ordered[int(round(0.5 * last))], ordered[int(round(0.99 * last))]]
+
+    def get_last_block_location(self) -> Optional[str]:
+        """获取最近一次阻塞时调用栈最内层的位置"""
+        if not self.block_reports:
+            return None
+        stack = self.block_reports[-1]["stack"].strip().splitlines()
+        # 调用栈每帧两行: '  File "...", line N, in func' 和源码行
+        for line in reversed(stack):
+            line = line.strip()
+            if line.startswith("File "):
+                return line
+        return None
+
+    def format_status(self) -> Dict[str, str]:
+        """生成用于 /system 显示的状态信息"""
+        p50, p99 = self.get_lag_percentiles()
+        status = {
+            "事件循环延迟": f"p50 {p50 * 1000:.1f}ms / p99 {p99 * 1000:.1f}ms / 最大 {self.max_lag * 1000:.1f}ms",
+            "事件循环阻塞次数": str(self.blocked_count)
+        }
+        location = self.get_last_block_location()
+        if location:
+            last = self.block_reports[-1]
+            blocked_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(last["time"]))
+            status["最近阻塞"] = f"{blocked_at} {last['duration'] * 1000:.0f}ms {location}"
+        return status
@@ -6,6 +6,7 @@ import sys
 import logging
 import importlib
 import importlib.util
+import hashlib
 import yaml
 import json
 import asyncio
@@ -14,9 +15,10 @@ import time
 import platform
 import psutil
 import re
+import argparse
 from datetime import datetime, timedelta
 from collections import defaultdict, Counter
-from typing import List, Dict, Any, Optional, Union, Set
+from typing import List, Dict, Any, Optional, Union, Set, Tuple
 
 # 添加当前目录到模块搜索路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -26,19 +28,23 @@ if current_dir not in sys.path:
 from aiohttp import web
 
 # 导入插件系统和工具函数
-from plugin_system import Plugin, PluginManager
+from plugin_system import Plugin, PluginManager, LazyPlugin, read_plugin_meta, summarize_event
+from metrics import MetricsRegistry
+from loop_monitor import LoopMonitor
+from event_journal import EventJournal, make_field_redactor
+from sharding import ShardSupervisor, ShardWorkerLink
+from state_store import create_state_store
+from accounts import AccountRegistry
+from admission import AdmissionFilter
+from api_guard import ApiGuard, CLOSED, HALF_OPEN
+from log_pipeline import setup_logging, LazyJson, EVENT_LOGGER, API_LOGGER
 from plugins.utils import handle_at_command, extract_command, is_at_bot
 
-# 设置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("logs/bot.log", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
-)
+# 日志输出在 main() 中按配置启动
 logger = logging.getLogger("LCHBot")
+# 每条事件、每次API调用的日志，可以在配置中单独设置采样率
+event_logger = logging.getLogger(EVENT_LOGGER)
+api_logger = logging.getLogger(API_LOGGER)
 
 # 群组活跃度跟踪类
 class GroupActivityTracker:
@@ -159,8 +165,18 @@ class SystemCommandHandler:
         self.command_patterns = {
             'system': re.compile(r'^/system$'),
             'activity': re.compile(r'^/activity\s*(\d+)?$'),
-            'plugins': re.compile(r'^/plugins$')
+            'plugins': re.compile(r'^/plugins$'),
+            'profile': re.compile(r'^/profile\s+(start|stop)(?:\s+(\d+))?$'),
+            'reload': re.compile(r'^/reload(?:\s+(\S+))?$'),
+            'startup': re.compile(r'^/startup$')
         }
+        # 定时结束性能分析的任务
+        self.profile_task: Optional[asyncio.Task] = None
+        
+    def is_superuser(self, user_id: Any) -> bool:
+        """检查用户是否是超级用户"""
+        superusers = self.bot.config.get("bot", {}).get("superusers", [])
+        return str(user_id) in superusers
         
     async def handle_system_command(self, event: Dict[str, Any]) -> bool:
         """处理系统命令"""
@@ -168,7 +184,7 @@ class SystemCommandHandler:
         group_id = event.get('group_id') if message_type == 'group' else None
         
         # 获取机器人QQ号
-        bot_qq = str(self.bot.config.get("bot", {}).get("self_id", ""))
+        bot_qq = self.bot.self_id
         
         # 检查是否是@机器人的消息
         if not is_at_bot(event, bot_qq):
@@ -194,6 +210,28 @@ class SystemCommandHandler:
         if is_at_command and match:
             return await self._handle_plugin_list(event)
             
+        # 性能分析命令（仅超级用户）
+        is_at_command, match, _ = handle_at_command(event, self.bot, self.command_patterns['profile'])
+        if is_at_command and match and self.is_superuser(event.get('user_id')):
+            seconds = int(match.group(2)) if match.group(2) else 30
+            return await self._handle_profile(event, match.group(1), seconds)
+            
+        # 启动耗时报告
+        is_at_command, match, _ = handle_at_command(event, self.bot, self.command_patterns['startup'])
+        if is_at_command and match:
+            await self.bot.send_msg(
+                message_type=message_type,
+                user_id=event.get('user_id'),
+                group_id=group_id,
+                message=self.bot.format_startup_report()
+            )
+            return True
+            
+        # 插件重载命令（仅超级用户）
+        is_at_command, match, _ = handle_at_command(event, self.bot, self.command_patterns['reload'])
+        if is_at_command and match and self.is_superuser(event.get('user_id')):
+            return await self._handle_reload(event, match.group(1))
+            
         return False
             
     async def _handle_system_info(self, event: Dict[str, Any]) -> bool:
@@ -229,12 +267,37 @@ class SystemCommandHandler:
         # 获取机器人信息
         bot_info = {
             "名称": self.bot.config['bot']['name'],
-            "QQ号": self.bot.config.get("bot", {}).get("self_id", "未知"),
+            "QQ号": self.bot.self_id or "未知",
             "插件数量": len(self.bot.plugin_manager.get_all_plugins()),
             "活跃插件": len(self.bot.plugin_manager.get_active_plugins()),
             "HTTP服务": f"{self.bot.http_host}:{self.bot.http_port}"
         }
         
+        # 事件循环健康状态
+        if self.bot.loop_monitor:
+            bot_info.update(self.bot.loop_monitor.format_status())
+        
+        # 事件日志状态
+        if self.bot.event_journal:
+            bot_info.update(self.bot.event_journal.format_status())
+        
+        # 多账号状态
+        bot_info.update(self.bot.accounts.format_status())
+        
+        # LLOneBot接口熔断状态
+        bot_info.update(self.bot.api_guard.format_status())
+        
+        # 准入过滤状态
+        bot_info.update(self.bot.admission.format_status())
+        
+        # 日志输出状态
+        if self.bot.log_pipeline:
+            bot_info.update(self.bot.log_pipeline.format_status())
+        
+        # 分片状态
+        if self.bot.shard_link:
+            bot_info["分片"] = f"工作进程 {self.bot.shard_link.shard}（PID {os.getpid()}）"
+        
         # 构建响应消息
         response = "系统信息：\n"
         for key, value in system_info.items():
@@ -345,7 +408,8 @@ class SystemCommandHandler:
             # 活跃插件
             response += f"\n活跃插件 ({len(active_plugins)}):\n"
             for plugin in active_plugins:
-                response += f"- [{plugin.id}] {plugin.name}\n"
+                lazy = "（延迟加载，尚未使用）" if isinstance(plugin, LazyPlugin) else ""
+                response += f"- [{plugin.id}] {plugin.name}{lazy}{self._format_plugin_stats(plugin)}\n"
             
             # 禁用插件
             if disabled_plugins:
@@ -370,15 +434,112 @@ class SystemCommandHandler:
         )
         
         return True
+        
+    def _format_plugin_stats(self, plugin: Plugin) -> str:
+        """格式化插件的耗时统计，没有统计数据时返回空字符串"""
+        stats = self.bot.plugin_manager.get_handler_stats(plugin.name)
+        if not stats or not stats.calls:
+            return ""
+        p50, p95, p99 = stats.percentiles(50, 95, 99)
+        text = f" | {stats.calls}次 p50 {p50 * 1000:.1f}ms p95 {p95 * 1000:.1f}ms p99 {p99 * 1000:.1f}ms"
+        if stats.slow_calls:
+            text += f" 慢{stats.slow_calls}次"
+        return text
+        
+    async def _handle_profile(self, event: Dict[str, Any], action: str, seconds: int = 30) -> bool:
+        """处理性能分析命令"""
+        message_type = event.get('message_type', '')
+        user_id = event.get('user_id')
+        group_id = event.get('group_id') if message_type == 'group' else None
+        plugin_manager = self.bot.plugin_manager
+        
+        if action == "start":
+            # 限制分析时长
+            seconds = max(1, min(seconds, 600))
+            if not plugin_manager.start_profile():
+                response = "性能分析已在进行中，发送 /profile stop 可提前结束"
+            else:
+                response = f"已开始性能分析，将在 {seconds} 秒后自动结束"
+                self.profile_task = asyncio.create_task(self._finish_profile_later(event, seconds))
+        else:
+            if self.profile_task and not self.profile_task.done():
+                self.profile_task.cancel()
+            self.profile_task = None
+            result = plugin_manager.stop_profile()
+            response = f"【性能分析结果】\n{result}" if result else "当前没有正在进行的性能分析"
+            
+        await self.bot.send_msg(
+            message_type=message_type,
+            user_id=user_id,
+            group_id=group_id,
+            message=response
+        )
+        return True
+        
+    async def _handle_reload(self, event: Dict[str, Any], plugin_name: Optional[str]) -> bool:
+        """处理插件重载命令，指定插件时强制重载该插件，否则重载文件有变化的插件"""
+        message_type = event.get('message_type', '')
+        
+        if plugin_name:
+            _, response = await self.bot.reload_plugin(plugin_name)
+        else:
+            results = await self.bot.reload_changed_plugins()
+            response = "\n".join(results) if results else "没有插件文件发生变化"
+            
+        await self.bot.send_msg(
+            message_type=message_type,
+            user_id=event.get('user_id'),
+            group_id=event.get('group_id') if message_type == 'group' else None,
+            message=f"【插件重载】\n{response}"
+        )
+        return True
+        
+    async def _finish_profile_later(self, event: Dict[str, Any], seconds: int) -> None:
+        """等待指定时间后结束性能分析并发送结果"""
+        await asyncio.sleep(seconds)
+        self.profile_task = None
+        result = self.bot.plugin_manager.stop_profile()
+        if not result:
+            return
+        message_type = event.get('message_type', '')
+        await self.bot.send_msg(
+            message_type=message_type,
+            user_id=event.get('user_id'),
+            group_id=event.get('group_id') if message_type == 'group' else None,
+            message=f"【性能分析结果】\n{result}"
+        )
 
 class LCHBot:
     """LCHBot主类，用于管理机器人的生命周期和事件处理"""
     
-    def __init__(self, config_path: str = "config/config.yml"):
+    def __init__(self, config_path: str = "config/config.yml", worker_shard: Optional[int] = None,
+                 supervisor_address: Optional[str] = None):
+        """
+        参数:
+            config_path: 配置文件路径
+            worker_shard: 以分片工作进程运行时的分片序号
+            supervisor_address: 分片工作进程连接的前端进程地址
+        """
         # 加载配置
         self.config_path = config_path
         self.config = self._load_config()
         
+        # 分片模式：前端进程只接收和转发事件，插件运行在工作进程中
+        sharding_config = self.config.get("sharding", {})
+        self.shard_link: Optional[ShardWorkerLink] = None
+        self.supervisor: Optional[ShardSupervisor] = None
+        if worker_shard is not None:
+            self.shard_link = ShardWorkerLink(worker_shard, supervisor_address or "127.0.0.1:0",
+                                              handoff_timeout=sharding_config.get("handoff_timeout", 1.0))
+        elif sharding_config.get("enabled", False) and sharding_config.get("workers", 2) > 1:
+            self.supervisor = ShardSupervisor(
+                self,
+                workers=sharding_config.get("workers", 2),
+                max_pending=sharding_config.get("max_pending", 10000),
+                restart_delay=sharding_config.get("restart_delay", 1.0),
+                config_path=config_path
+            )
+        
         # 设置属性
         self.plugin_manager = PluginManager(self)
         self.session = None
@@ -404,8 +565,77 @@ class LCHBot:
         # 重载计数
         self.reload_count = 0
         
+        # 已加载的插件文件 {模块名: {path, mtime, hash, plugins}}，用于按文件重载
+        self.plugin_files: Dict[str, Dict[str, Any]] = {}
+        self.plugin_dir = os.path.join(os.path.dirname(__file__), "plugins")
+        
+        # 启动耗时 {阶段: 秒}，各插件的导入和初始化耗时 {模块名: {deferred, import, init}}
+        self.startup_phases: Dict[str, float] = {}
+        self.plugin_timings: Dict[str, Dict[str, Any]] = {}
+        
+        # 运行指标
+        metrics_config = self.config.get("metrics", {})
+        self.metrics = MetricsRegistry(enabled=metrics_config.get("enabled", True))
+        self.metrics_path = metrics_config.get("path", "/metrics")
+        self.metrics.register_collector(
+            "lchbot_asyncio_tasks", "事件循环中未完成的任务数",
+            lambda: [({}, len(asyncio.all_tasks()))]
+        )
+        
+        # 机器人账号，多账号模式下按事件的 self_id 选择发送API调用的账号
+        self.accounts = AccountRegistry(self.config, self.metrics)
+        
+        # LLOneBot API调用的熔断、自适应超时和延迟发送
+        self.api_guard = ApiGuard(self.config.get("api_guard", {}), self.metrics)
+        self._deferred_task: Optional[asyncio.Task] = None
+        
+        # 日志输出，由 main() 启动后设置，/system 显示其状态
+        self.log_pipeline = None
+        
+        # 共享状态存储，多个进程（分片工作进程或多个机器人实例）共用拉黑、积分等数据
+        self.state_store = create_state_store(self.config.get("state_store", {}), self.metrics)
+        
+        # 消息准入过滤，屏蔽、黑名单和访问限制的名单由对应插件注册
+        admission_config = self.config.get("admission", {})
+        self.admission = AdmissionFilter(
+            refresh_interval=admission_config.get("refresh_interval", 30.0),
+            metrics=self.metrics
+        )
+        
+        # 事件循环健康监控
+        loop_config = self.config.get("loop_monitor", {})
+        self.loop_monitor = None
+        if loop_config.get("enabled", True):
+            self.loop_monitor = LoopMonitor(
+                self,
+                interval=loop_config.get("interval", 0.5),
+                block_threshold=loop_config.get("block_threshold", 0.2)
+            )
+        
+        # 事件日志，用于复现问题和压测回放
+        journal_config = self.config.get("event_journal", {})
+        self.event_journal = None
+        # 分片模式下只由前端进程记录
+        if journal_config.get("enabled", False) and self.shard_link is None:
+            redact_fields = journal_config.get("redact_fields", [])
+            self.event_journal = EventJournal(
+                directory=journal_config.get("directory", "logs/journal"),
+                sample_rate=journal_config.get("sample_rate", 1.0),
+                max_file_size=int(journal_config.get("max_file_mb", 64) * 1024 * 1024),
+                max_files=journal_config.get("max_files", 20),
+                batch_size=journal_config.get("batch_size", 500),
+                flush_interval=journal_config.get("flush_interval", 1.0),
+                redactor=make_field_redactor(redact_fields) if redact_fields else None,
+                metrics=self.metrics
+            )
+        
         logger.info(f"LCHBot初始化完成，使用配置文件: {config_path}")
     
+    @property
+    def self_id(self) -> str:
+        """当前事件所属账号的QQ号，插件判断是否@机器人时使用"""
+        return self.accounts.current().self_id
+    
     def _load_config(self) -> Dict[str, Any]:
         """加载配置文件"""
         try:
@@ -444,8 +674,16 @@ class LCHBot:
 
     async def initialize(self):
         """初始化机器人"""
-        # 创建HTTP会话
-        self.session = aiohttp.ClientSession()
+        start = time.perf_counter()
+        # 创建各账号的HTTP会话
+        await self.accounts.open()
+        self.session = self.accounts.default.session
+        
+        # 分片模式的前端进程不加载插件
+        if self.supervisor:
+            self.inline_debug_plugin = None
+            self.startup_phases["初始化"] = time.perf_counter() - start
+            return
         
         # 加载插件
         await self.load_plugins()
@@ -454,14 +692,18 @@ class LCHBot:
         self.inline_debug_plugin = InlineDebugPlugin(self)
         logger.info(f"内联调试插件已初始化")
         
+        self.startup_phases["初始化"] = time.perf_counter() - start
         logger.info(f"{self.config['bot']['name']} ({self.config['bot']['name']}) 初始化完成")
 
     async def load_plugins(self):
         """加载插件"""
         # 清空插件管理器
         self.plugin_manager = PluginManager(self)
+        self.plugin_files = {}
+        self.plugin_timings = {}
+        load_start = time.perf_counter()
         
-        plugin_dir = os.path.join(os.path.dirname(__file__), "plugins")
+        plugin_dir = self.plugin_dir
         logger.debug(f"插件目录: {plugin_dir}")
         
         # 打印更多调试信息
@@ -475,6 +717,8 @@ class LCHBot:
             
         enabled_plugins = self.config["plugins"]["enabled"]
         disabled_plugins = self.config["plugins"]["disabled"]
+        # 延迟加载：声明了 plugin_meta 的插件在第一次收到匹配的事件时才导入
+        lazy_load = self.config["plugins"].get("lazy_load", False)
         
         logger.debug(f"启用的插件: {enabled_plugins}")
         logger.debug(f"禁用的插件: {disabled_plugins}")
@@ -499,73 +743,314 @@ class LCHBot:
                 logger.info(f"跳过未启用的插件: {plugin_name}")
                 continue
             
+            plugin_path = os.path.join(plugin_dir, filename)
+            if lazy_load:
+                meta = read_plugin_meta(plugin_path)
+                if meta:
+                    placeholder = LazyPlugin(self, plugin_name, meta, self._load_lazy_plugin)
+                    self.plugin_manager.register_plugin(placeholder)
+                    self.plugin_timings[plugin_name] = {"deferred": True}
+                    logger.info(f"已注册延迟加载插件: {placeholder.name} (ID: {placeholder.id})")
+                    continue
+                
             try:
                 # 导入插件模块
+                start = time.perf_counter()
                 try:
-                    # 使用spec方法直接从文件导入
-                    plugin_path = os.path.join(plugin_dir, filename)
-                    module_name = f"plugins.{plugin_name}"
-                    spec = importlib.util.spec_from_file_location(module_name, plugin_path)
-                    if not spec or not spec.loader:
-                        logger.error(f"无法为插件 {plugin_name} 创建模块规格")
-                        continue
-                    
-                    module = importlib.util.module_from_spec(spec)
-                    sys.modules[module_name] = module
-                    spec.loader.exec_module(module)
+                    module = self._import_plugin_module(plugin_name, plugin_path)
                     logger.debug(f"成功导入插件模块: {plugin_name}")
-                    
                 except Exception as e:
                     logger.error(f"导入插件模块 {plugin_name} 失败: {e}", exc_info=True)
                     continue
+                import_seconds = time.perf_counter() - start
                 
-                # 查找插件类
-                plugin_found = False
-                if hasattr(module, 'plugin_class'):
-                    # 优先查找 plugin_class 变量
-                    try:
-                        plugin_class = getattr(module, 'plugin_class')
-                        logger.debug(f"找到plugin_class: {plugin_class}")
-                        logger.debug(f"plugin_class类型: {type(plugin_class)}")
-                        logger.debug(f"是否是类型: {isinstance(plugin_class, type)}")
-                        
-                        # 使用类名比较而不是类型比较
-                        if (isinstance(plugin_class, type) and 
-                            hasattr(plugin_class, "__name__") and
-                            plugin_class.__name__ != "Plugin"):
-                            # 实例化插件
-                            plugin_instance = plugin_class(self)
-                            self.plugin_manager.register_plugin(plugin_instance)
-                            logger.info(f"已加载插件: {plugin_instance.name} (ID: {plugin_instance.id})")
-                            plugin_found = True
-                    except Exception as e:
-                        logger.error(f"通过 plugin_class 加载插件 {plugin_name} 失败: {e}", exc_info=True)
-                
-                # 如果没有 plugin_class 变量或加载失败，则尝试查找类定义
-                if not plugin_found:
-                    for attr_name in dir(module):
-                        attr = getattr(module, attr_name)
-                        # 检查是否为类，是否继承自Plugin，不是Plugin本身，且在当前模块中定义
-                        if (isinstance(attr, type) and 
-                            issubclass(attr, Plugin) and 
-                            attr != Plugin):
-                            try:
-                                # 实例化插件
-                                plugin_instance = attr(self)
-                                self.plugin_manager.register_plugin(plugin_instance)
-                                logger.info(f"已加载插件: {plugin_instance.name} (ID: {plugin_instance.id})")
-                                plugin_found = True
-                            except Exception as e:
-                                logger.error(f"实例化插件 {attr_name} 失败: {e}", exc_info=True)
+                start = time.perf_counter()
+                instances = self._create_plugin_instances(module, plugin_name)
+                self.plugin_timings[plugin_name] = {
+                    "deferred": False,
+                    "import": import_seconds,
+                    "init": time.perf_counter() - start
+                }
+                for plugin_instance in instances:
+                    self.plugin_manager.register_plugin(plugin_instance)
+                    logger.info(f"已加载插件: {plugin_instance.name} (ID: {plugin_instance.id})")
                 
-                if not plugin_found:
+                if instances:
+                    self._record_plugin_file(plugin_name, plugin_path, [p.name for p in instances])
+                else:
                     logger.warning(f"在模块 {plugin_name} 中没有找到有效的插件类")
                     
             except Exception as e:
                 logger.error(f"加载插件 {plugin_name} 失败: {e}", exc_info=True)
+        
+        self.startup_phases["加载插件"] = time.perf_counter() - load_start
+
+    def _load_lazy_plugin(self, placeholder: LazyPlugin) -> Optional[Plugin]:
+        """导入延迟加载的插件并替换占位实例，失败时返回None"""
+        plugin_name = placeholder.module_name
+        plugin_path = os.path.join(self.plugin_dir, f"{plugin_name}.py")
+        start = time.perf_counter()
+        try:
+            module = self._import_plugin_module(plugin_name, plugin_path)
+        except Exception as e:
+            logger.error(f"延迟导入插件模块 {plugin_name} 失败: {e}", exc_info=True)
+            return None
+        import_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        instances = self._create_plugin_instances(module, plugin_name)
+        init_seconds = time.perf_counter() - start
+        if not instances:
+            logger.warning(f"在模块 {plugin_name} 中没有找到有效的插件类")
+            return None
+        
+        plugin = next((p for p in instances if p.name == placeholder.name), instances[0])
+        if placeholder.status == "disabled":
+            plugin.disable(placeholder.error_message)
+        self.plugin_manager.replace_plugin(placeholder, plugin)
+        for other in instances:
+            if other is not plugin:
+                self.plugin_manager.register_plugin(other)
+        self._record_plugin_file(plugin_name, plugin_path, [p.name for p in instances])
+        self.plugin_timings[plugin_name] = {
+            "deferred": True,
+            "import": import_seconds,
+            "init": init_seconds,
+            "loaded_at": time.time()
+        }
+        logger.info(f"已延迟加载插件: {plugin.name} (ID: {plugin.id})，导入 {import_seconds * 1000:.1f}ms，"
+                    f"初始化 {init_seconds * 1000:.1f}ms")
+        return plugin
+        
+    def format_startup_report(self) -> str:
+        """生成启动耗时报告"""
+        lines = ["【启动耗时】"]
+        for phase, seconds in self.startup_phases.items():
+            lines.append(f"- {phase}: {seconds * 1000:.1f}ms")
+        
+        loaded = [(name, t) for name, t in self.plugin_timings.items() if "import" in t]
+        pending = sorted(name for name, t in self.plugin_timings.items() if "import" not in t)
+        loaded.sort(key=lambda item: item[1]["import"] + item[1]["init"], reverse=True)
+        lines.append(f"\n插件 (已加载 {len(loaded)} 个，延迟未加载 {len(pending)} 个):")
+        for name, t in loaded:
+            note = "，首次使用时加载" if t["deferred"] else ""
+            lines.append(f"- {name}: 导入 {t['import'] * 1000:.1f}ms，初始化 {t['init'] * 1000:.1f}ms{note}")
+        if pending:
+            lines.append(f"- 尚未使用: {', '.join(pending)}")
+        return "\n".join(lines)
+
+    def _import_plugin_module(self, plugin_name: str, plugin_path: str):
+        """
+        从文件导入插件模块，导入失败时恢复之前的同名模块
+        
+        参数:
+            plugin_name: 插件模块名（文件名去掉.py）
+            plugin_path: 插件文件路径
+        返回:
+            模块对象
+        """
+        # 使用spec方法直接从文件导入
+        module_name = f"plugins.{plugin_name}"
+        spec = importlib.util.spec_from_file_location(module_name, plugin_path)
+        if not spec or not spec.loader:
+            raise ImportError(f"无法为插件 {plugin_name} 创建模块规格")
+        
+        module = importlib.util.module_from_spec(spec)
+        previous = sys.modules.get(module_name)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            if previous is not None:
+                sys.modules[module_name] = previous
+            else:
+                sys.modules.pop(module_name, None)
+            raise
+        return module
+        
+    def _create_plugin_instances(self, module, plugin_name: str) -> List[Plugin]:
+        """实例化模块中的插件类，优先使用 plugin_class 变量"""
+        if hasattr(module, 'plugin_class'):
+            try:
+                plugin_class = getattr(module, 'plugin_class')
+                logger.debug(f"找到plugin_class: {plugin_class}")
+                
+                # 使用类名比较而不是类型比较
+                if (isinstance(plugin_class, type) and 
+                    hasattr(plugin_class, "__name__") and
+                    plugin_class.__name__ != "Plugin"):
+                    return [plugin_class(self)]
+            except Exception as e:
+                logger.error(f"通过 plugin_class 加载插件 {plugin_name} 失败: {e}", exc_info=True)
+        
+        # 如果没有 plugin_class 变量或加载失败，则尝试查找类定义
+        instances = []
+        for attr_name in dir(module):
+            attr = getattr(module, attr_name)
+            # 检查是否为类，是否继承自Plugin，不是Plugin本身
+            if (isinstance(attr, type) and 
+                issubclass(attr, Plugin) and 
+                attr != Plugin):
+                try:
+                    instances.append(attr(self))
+                except Exception as e:
+                    logger.error(f"实例化插件 {attr_name} 失败: {e}", exc_info=True)
+        return instances
+        
+    def _record_plugin_file(self, plugin_name: str, plugin_path: str, plugin_names: List[str]) -> None:
+        """记录插件文件的修改时间和内容哈希，用于判断是否需要重载"""
+        with open(plugin_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self.plugin_files[plugin_name] = {
+            "path": plugin_path,
+            "mtime": os.path.getmtime(plugin_path),
+            "hash": digest,
+            "plugins": plugin_names
+        }
+        
+    def _resolve_plugin_module(self, name: str) -> Optional[str]:
+        """根据模块名或插件类名查找已加载的插件模块名"""
+        if name in self.plugin_files:
+            return name
+        for plugin_name, info in self.plugin_files.items():
+            if name in info["plugins"] or name.lower() in (n.lower() for n in info["plugins"]):
+                return plugin_name
+        return None
+        
+    async def reload_plugin(self, name: str, force: bool = True) -> Tuple[bool, str]:
+        """
+        重新加载单个插件模块，不影响其他插件
+        
+        新实例初始化成功后接收旧实例导出的内存状态，再替换分发列表中的旧实例；
+        正在处理中的事件由旧实例继续完成。导入或初始化失败时保留旧实例。
+        
+        参数:
+            name: 插件模块名或插件类名
+            force: 为False时文件内容未变化则跳过
+        返回:
+            (是否重载, 结果说明)
+        """
+        plugin_name = self._resolve_plugin_module(name)
+        if plugin_name is None:
+            return False, f"插件 {name} 未加载"
+        info = self.plugin_files[plugin_name]
+        plugin_path = info["path"]
+        
+        try:
+            with open(plugin_path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        except OSError as e:
+            return False, f"读取插件文件失败: {e}"
+        if not force and digest == info["hash"]:
+            return False, f"插件 {plugin_name} 未修改"
+        
+        old_plugins = [self.plugin_manager.get_plugin_by_name(n) for n in info["plugins"]]
+        old_plugins = [p for p in old_plugins if p is not None]
+        module_name = f"plugins.{plugin_name}"
+        previous_module = sys.modules.get(module_name)
+        start = time.perf_counter()
+        
+        try:
+            module = self._import_plugin_module(plugin_name, plugin_path)
+        except Exception as e:
+            logger.error(f"重载插件模块 {plugin_name} 失败: {e}", exc_info=True)
+            return False, f"导入插件 {plugin_name} 失败，继续使用旧版本: {e}"
+        
+        new_plugins = self._create_plugin_instances(module, plugin_name)
+        if not new_plugins:
+            if previous_module is not None:
+                sys.modules[module_name] = previous_module
+            return False, f"插件 {plugin_name} 初始化失败，继续使用旧版本"
+        
+        # 交接内存状态，失败时放弃本次重载
+        old_by_name = {p.name: p for p in old_plugins}
+        try:
+            for plugin in new_plugins:
+                old = old_by_name.get(plugin.name)
+                if old is not None:
+                    plugin.import_state(old.export_state())
+                    if old.status == "disabled":
+                        plugin.disable(old.error_message)
+        except Exception as e:
+            logger.error(f"插件 {plugin_name} 交接状态失败: {e}", exc_info=True)
+            if previous_module is not None:
+                sys.modules[module_name] = previous_module
+            return False, f"插件 {plugin_name} 交接状态失败，继续使用旧版本: {e}"
+        
+        # 替换分发列表中的实例
+        for plugin in new_plugins:
+            old = old_by_name.pop(plugin.name, None)
+            if old is None or not self.plugin_manager.replace_plugin(old, plugin):
+                self.plugin_manager.register_plugin(plugin)
+        for old in old_by_name.values():
+            self.plugin_manager.unregister_plugin(old.id)
+        
+        # 停止旧实例的后台任务，启动新实例的后台任务
+        for old in old_plugins:
+            shutdown = getattr(old, "_shutdown_plugin", None)
+            if shutdown is not None:
+                try:
+                    await shutdown()
+                except Exception as e:
+                    logger.error(f"关闭旧插件 {old.name} 出错: {e}", exc_info=True)
+        for plugin in new_plugins:
+            init = getattr(plugin, "_init_plugin", None)
+            if init is not None:
+                try:
+                    await init()
+                except Exception as e:
+                    logger.error(f"启动插件 {plugin.name} 出错: {e}", exc_info=True)
+        
+        self._record_plugin_file(plugin_name, plugin_path, [p.name for p in new_plugins])
+        self.reload_count += 1
+        elapsed = time.perf_counter() - start
+        logger.info(f"插件 {plugin_name} 已重载，耗时 {elapsed * 1000:.1f}ms")
+        return True, f"插件 {plugin_name} 已重载 ({', '.join(p.name for p in new_plugins)})，耗时 {elapsed * 1000:.1f}ms"
+        
+    async def reload_changed_plugins(self) -> List[str]:
+        """重载文件有变化的插件（先比较修改时间，再比较内容哈希），返回结果说明列表"""
+        results = []
+        for plugin_name, info in list(self.plugin_files.items()):
+            try:
+                mtime = os.path.getmtime(info["path"])
+            except OSError:
+                continue
+            if mtime == info["mtime"]:
+                continue
+            try:
+                with open(info["path"], 'rb') as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+            except OSError:
+                continue
+            if digest == info["hash"]:
+                # 只是修改时间变化，内容未变
+                info["mtime"] = mtime
+                continue
+            _, message = await self.reload_plugin(plugin_name)
+            results.append(message)
+        return results
 
     async def handle_event(self, event: Dict[str, Any]):
-        """处理事件"""
+        """处理事件，并记录处理耗时"""
+        event_type = event.get("post_type", "unknown")
+        # 找到处理事件的账号，重复或未配置账号的事件直接丢弃
+        if self.accounts.route(event) is None:
+            return
+        # 被屏蔽、拉黑或限制的用户的消息在分发前丢弃，只查一次准入表
+        rule = self.admission.check(event)
+        if rule is not None:
+            await self.admission.notify(event, rule)
+            return
+        self.metrics.add_gauge("lchbot_events_in_flight", 1)
+        start = time.perf_counter()
+        try:
+            await self._dispatch_event(event)
+        finally:
+            self.metrics.add_gauge("lchbot_events_in_flight", -1)
+            self.metrics.observe("lchbot_event_handle_seconds", time.perf_counter() - start, post_type=event_type)
+
+    async def _dispatch_event(self, event: Dict[str, Any]):
+        """按事件类型分发事件"""
         event_type = event.get("post_type")
         
         if event_type == "message":
@@ -574,7 +1059,7 @@ class LCHBot:
             user_id = event.get("user_id", "未知ID")
             raw_message = event.get("raw_message", "")
             message_content = event.get("message", "")
-            logger.info(f"收到{message_type}消息 - 来自: {sender}({user_id}) - 内容: {raw_message}")
+            event_logger.info("收到%s消息 - 来自: %s(%s) - 内容: %s", message_type, sender, user_id, raw_message)
             
             # 如果是群消息，记录活跃度数据
             if message_type == 'group' and 'group_id' in event:
@@ -618,9 +1103,10 @@ class LCHBot:
                 log_msg += f", 用户ID: {user_id}"
                 
             # 检测邀请事件
-            if "invit" in str(event).lower() or "邀请" in str(event).lower():
+            event_text = str(event)
+            if "invit" in event_text.lower() or "邀请" in event_text:
                 # 专门处理邀请相关事件
-                logger.info(f"检测到可能的邀请事件: {json.dumps(event, ensure_ascii=False)}")
+                event_logger.info("检测到可能的邀请事件: %s", LazyJson(event))
                 
                 # 检查新版邀请事件格式
                 templ_id = event.get('templId')
@@ -630,41 +1116,82 @@ class LCHBot:
                     invitee = templ_param.get('invitee', '未知')
                     logger.info(f"收到新人被邀请进群消息: 邀请人={invitor}, 被邀请人={invitee}, 群ID={group_id}")
             else:
-                logger.info(log_msg)
+                event_logger.info(log_msg)
             
             # 使用插件系统处理通知
             await self.plugin_manager.dispatch_notice(event)
         
         elif event_type == "request":
             request_type = event.get("request_type", "unknown")
-            logger.info(f"收到请求事件: {request_type}, 详情: {json.dumps(event, ensure_ascii=False)}")
+            event_logger.info("收到请求事件: %s, 详情: %s", request_type, LazyJson(event))
             await self.plugin_manager.dispatch_request(event)
         
         else:
-            logger.warning(f"未知的事件类型: {event_type}, 详情: {json.dumps(event, ensure_ascii=False)}")
+            event_logger.warning("未知的事件类型: %s, 详情: %s", event_type, LazyJson(event))
 
     async def handle_event_http(self, request: web.Request) -> web.Response:
         """HTTP事件处理函数"""
         try:
-            event_data = await request.json()
-            # 打印完整的事件数据以便调试
-            logger.debug(f"收到HTTP事件: {json.dumps(event_data, ensure_ascii=False, indent=2)}")
+            body = await request.read()
+            event_data = json.loads(body)
+            self.metrics.inc("lchbot_events_received_total", post_type=event_data.get("post_type", "unknown"))
+            # 完整事件由事件日志记录，调试日志只输出摘要
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"收到HTTP事件: {summarize_event(event_data)}")
+            if self.event_journal:
+                self.event_journal.record(event_data, raw=body)
             
-            # 异步处理事件，避免阻塞响应
-            asyncio.create_task(self.handle_event(event_data))
+            # 分片模式下按群号转发给工作进程，否则异步处理事件，避免阻塞响应
+            if self.supervisor:
+                self.supervisor.dispatch(event_data)
+            else:
+                asyncio.create_task(self.handle_event(event_data))
             
             # 返回空对象表示成功接收
             return web.json_response({})
         except Exception as e:
             logger.error(f"处理HTTP事件时出错: {e}")
+            self.metrics.inc("lchbot_events_received_total", post_type="invalid")
             return web.json_response({"status": "failed", "error": str(e)})
 
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        """导出Prometheus格式的运行指标"""
+        return web.Response(
+            text=self.metrics.render(),
+            content_type="text/plain",
+            charset="utf-8",
+            headers={"X-Content-Type-Options": "nosniff"}
+        )
+
     async def run(self):
         """运行机器人"""
         await self.initialize()
         
+        # 启动事件循环监控
+        if self.loop_monitor:
+            self.loop_monitor.start()
+        
+        # 分片工作进程不监听HTTP端口，从前端进程接收事件
+        if self.shard_link:
+            await self.shard_link.connect()
+            await self.shard_link.run(self.handle_event)
+            return
+        
+        # 启动分片工作进程
+        if self.supervisor:
+            await self.supervisor.start()
+        
+        # 启动事件日志写入
+        if self.event_journal:
+            self.event_journal.start()
+        
+        # 启动延迟消息的补发
+        self._deferred_task = asyncio.create_task(self._send_deferred_loop())
+        
         # 设置HTTP路由
         self.app.router.add_post("/", self.handle_event_http)
+        if self.metrics.enabled:
+            self.app.router.add_get(self.metrics_path, self.handle_metrics)
         
         # 启动HTTP服务器
         runner = web.AppRunner(self.app)
@@ -674,6 +1201,13 @@ class LCHBot:
         try:
             await site.start()
             logger.info(f"HTTP事件服务器已启动，监听地址: http://{self.http_host}:{self.http_port}/")
+            try:
+                self.startup_phases["进程启动到开始监听"] = time.time() - psutil.Process().create_time()
+            except Exception:
+                pass
+            logger.info(self.format_startup_report())
+            if self.metrics.enabled:
+                logger.info(f"运行指标地址: http://{self.http_host}:{self.http_port}{self.metrics_path}")
             
             # 保持运行
             while True:
@@ -688,92 +1222,187 @@ class LCHBot:
 
     async def close(self):
         """关闭机器人"""
+        if self.supervisor:
+            await self.supervisor.stop()
+        if self.shard_link:
+            await self.shard_link.close()
+        if self.loop_monitor:
+            await self.loop_monitor.stop()
+        if self.event_journal:
+            await self.event_journal.stop()
+        if self._deferred_task:
+            self._deferred_task.cancel()
+            self._deferred_task = None
+        # 停止插件的后台任务并保存未写入的数据
+        for plugin in self.plugin_manager.plugins:
+            shutdown = getattr(plugin, "_shutdown_plugin", None)
+            if shutdown is not None:
+                try:
+                    await shutdown()
+                except Exception as e:
+                    logger.error(f"关闭插件 {plugin.name} 出错: {e}", exc_info=True)
         if self.session:
-            await self.session.close()
+            await self.accounts.close()
             logger.info("HTTP会话已关闭")
+        self.state_store.close()
     
     def reload_plugins(self):
-        """重新加载插件"""
+        """重新加载有变化的插件，未修改的插件保持运行"""
         async def _reload():
-            logger.info("正在重新加载插件...")
-            await self.load_plugins()
-            logger.info("插件重新加载完成")
+            logger.info("正在检查需要重新加载的插件...")
+            results = await self.reload_changed_plugins()
+            logger.info(f"插件重新加载完成: {'; '.join(results) if results else '没有插件变化'}")
             
         # 创建异步任务
         asyncio.create_task(_reload())
         return True
 
-    async def _call_api(self, url: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        """调用LLOneBot API"""
-        if not self.session:
+    async def _call_api(self, url: str, data: Dict[str, Any], deferrable: bool = False) -> Dict[str, Any]:
+        """调用LLOneBot API，并记录调用次数、重试次数和耗时
+        
+        参数:
+            url: 接口地址
+            data: 参数
+            deferrable: 是否为不重要的调用，接口不可用时放入延迟队列，恢复后补发
+        """
+        # 分片工作进程的API调用由前端进程统一发送
+        if self.shard_link:
+            return await self.shard_link.call_api(url, data, self.self_id, deferrable)
+        result, _ = await self._send_api(url, data, deferrable)
+        return result
+
+    async def _send_api(self, url: str, data: Dict[str, Any], deferrable: bool = False) -> Tuple[Dict[str, Any], bool]:
+        """
+        通过当前账号调用LLOneBot API并记录指标
+        
+        返回:
+            (结果, 是否为接口不可用导致的失败)
+        """
+        endpoint = url.strip("/")
+        start = time.perf_counter()
+        result, transient = await self._call_api_with_retry(url, endpoint, data)
+        if transient and deferrable:
+            self.api_guard.defer(self.accounts.current().self_id, url, data)
+            result = {"status": "queued", "error": result.get("error")}
+        status = result.get("status", "ok") if isinstance(result, dict) else "ok"
+        self.metrics.inc("lchbot_api_calls_total", endpoint=endpoint, status=status)
+        self.metrics.observe("lchbot_api_latency_seconds", time.perf_counter() - start, endpoint=endpoint)
+        return result, transient
+
+    async def _call_api_with_retry(self, url: str, endpoint: str, data: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """
+        调用LLOneBot API，超时或连接失败时按熔断器的状态重试
+        
+        返回:
+            (结果, 是否为接口不可用导致的失败)
+        """
+        account = self.accounts.current()
+        if not account.session:
             logger.error("HTTP会话未初始化")
-            return {"status": "failed", "error": "HTTP会话未初始化"}
+            return {"status": "failed", "error": "HTTP会话未初始化"}, False
+        if not account.base_url:
+            logger.error("未配置LLOneBot API地址")
+            return {"status": "failed", "error": "未配置LLOneBot API地址"}, False
             
         # 记录API调用信息
-        logger.info(f"API调用: {url} - 参数: {json.dumps(data, ensure_ascii=False)[:100]}...")
-            
-        # 重试设置
-        max_retries = 3
-        retry_delay = 1.0  # 初始重试延迟（秒）
+        api_logger.info("API调用: %s - 参数: %.100s...", url, LazyJson(data))
+        
+        guard = self.api_guard
+        breaker = guard.breaker(account.self_id, endpoint)
+        full_url = f"{account.base_url}{url}"
         attempt = 0
+        error = "未知错误，API调用失败"
             
-        while attempt < max_retries:
+        while attempt < guard.max_retries:
+            # 熔断期间直接失败，不等待超时
+            if not breaker.allow(time.monotonic()):
+                if attempt == 0:
+                    logger.warning(f"LLOneBot接口 {endpoint} 熔断中，跳过本次调用")
+                    return {"status": "failed", "error": "LLOneBot服务暂时不可用，请稍后再试"}, True
+                break
+            # 半开状态下放行的是探测调用，调用被取消时也要结束探测，否则之后的调用会一直被拒绝
+            probe = breaker.state == HALF_OPEN
+            
+            # 超时时间根据该接口最近的耗时计算
+            total = guard.timeout(breaker)
+            timeout = aiohttp.ClientTimeout(total=total, connect=min(5.0, total))
+            api_logger.debug("调用API: %s, 超时: %.1fs, 数据: %s", full_url, total, LazyJson(data))
+            start = time.monotonic()
             try:
-                api_base_url = self.config.get("llonebot", {}).get("http_api", {}).get("base_url", "")
-                if not api_base_url:
-                    logger.error("未配置LLOneBot API地址")
-                    return {"status": "failed", "error": "未配置LLOneBot API地址"}
-                    
-                token = self.config.get("llonebot", {}).get("http_api", {}).get("token", "")
-                headers = {"Authorization": f"Bearer {token}"} if token else {}
-                
-                full_url = f"{api_base_url}{url}"
-                logger.debug(f"调用API: {full_url}, 数据: {json.dumps(data, ensure_ascii=False)}")
-                
-                # 添加超时设置
-                timeout = aiohttp.ClientTimeout(total=10, connect=5)
-                
-                async with self.session.post(full_url, json=data, headers=headers, timeout=timeout) as response:
+                async with account.session.post(full_url, json=data, headers=account.headers, timeout=timeout) as response:
                     result = await response.json()
+                guard.record_success(breaker, time.monotonic() - start)
                     
-                    if isinstance(result, dict) and result.get("status") == "failed":
-                        logger.error(f"API调用失败: {result.get('error')}")
-                    else:
-                        logger.info(f"API调用成功: {url} - 响应: {json.dumps(result, ensure_ascii=False)[:100]}...")
-                        
-                    return result
+                if isinstance(result, dict) and result.get("status") == "failed":
+                    logger.error(f"API调用失败: {result.get('error')}")
+                else:
+                    api_logger.info("API调用成功: %s - 响应: %.100s...", url, LazyJson(result))
+                    
+                return result, False
             except asyncio.TimeoutError:
-                attempt += 1
-                if attempt >= max_retries:
-                    logger.error(f"API调用超时，已重试{max_retries}次")
-                    return {"status": "failed", "error": "连接超时，请检查LLOneBot服务是否正常运行"}
-                logger.warning(f"API调用超时，正在重试({attempt}/{max_retries})...")
-                await asyncio.sleep(retry_delay * attempt)  # 指数退避策略
+                error = "连接超时，请检查LLOneBot服务是否正常运行"
+                logger.warning(f"API调用 {endpoint} 超时（{total:.1f}s）")
             except aiohttp.ClientConnectorError:
-                attempt += 1
-                if attempt >= max_retries:
-                    logger.error(f"无法连接到LLOneBot服务器，已重试{max_retries}次")
-                    return {"status": "failed", "error": "无法连接到LLOneBot服务器，请确保服务已启动"}
-                logger.warning(f"连接LLOneBot服务器失败，正在重试({attempt}/{max_retries})...")
-                await asyncio.sleep(retry_delay * attempt)
+                error = "无法连接到LLOneBot服务器，请确保服务已启动"
+                logger.warning(f"连接LLOneBot服务器失败: {endpoint}")
             except aiohttp.ServerDisconnectedError:
-                attempt += 1
-                if attempt >= max_retries:
-                    logger.error(f"服务器断开连接，已重试{max_retries}次")
-                    return {"status": "failed", "error": "服务器断开连接，请检查LLOneBot服务是否稳定"}
-                logger.warning(f"服务器断开连接，正在重试({attempt}/{max_retries})...")
-                await asyncio.sleep(retry_delay * attempt)
+                error = "服务器断开连接，请检查LLOneBot服务是否稳定"
+                logger.warning(f"服务器断开连接: {endpoint}")
             except Exception as e:
+                guard.record_failure(breaker)
                 logger.error(f"调用API出错: {e}")
-                return {"status": "failed", "error": str(e)}
+                return {"status": "failed", "error": str(e)}, False
+            finally:
+                if probe:
+                    breaker.end_probe()
+            
+            guard.record_failure(breaker)
+            attempt += 1
+            if attempt < guard.max_retries and breaker.state == CLOSED:
+                self.metrics.inc("lchbot_api_retries_total", endpoint=endpoint)
+                delay = guard.backoff(attempt)
+                logger.warning(f"{delay:.2f}秒后重试({attempt}/{guard.max_retries})...")
+                await asyncio.sleep(delay)
+            else:
+                break
         
-        # 如果所有重试都失败但没有触发特定异常，确保返回一个字典
-        return {"status": "failed", "error": "未知错误，API调用失败"}
+        logger.error(f"API调用 {endpoint} 失败，已尝试{attempt}次: {error}")
+        return {"status": "failed", "error": error}, True
+
+    async def _send_deferred_loop(self, interval: float = 1.0) -> None:
+        """接口恢复后按顺序补发延迟队列中的调用"""
+        guard = self.api_guard
+        while True:
+            await asyncio.sleep(interval)
+            while True:
+                item = guard.next_deferred()
+                if item is None:
+                    break
+                _, self_id, url, data = item
+                account = self.accounts.get(self_id)
+                if account is not None:
+                    self.accounts.activate(account)
+                try:
+                    result, transient = await self._send_api(url, data)
+                except Exception as e:
+                    logger.error(f"补发延迟的API调用出错: {e}", exc_info=True)
+                    continue
+                # 补发仍因超时、连接失败或熔断而失败时放回队首，等待下一轮
+                if transient:
+                    guard.requeue(item)
+                    break
+                if isinstance(result, dict) and result.get("status") == "failed":
+                    # 接口返回了错误，重发也不会成功
+                    guard.deferred_dropped += 1
+                    self.metrics.inc("lchbot_api_deferred_total", result="failed")
+                    continue
+                guard.deferred_sent += 1
+                self.metrics.inc("lchbot_api_deferred_total", result="sent")
 
     async def send_msg(self, message_type: str, user_id: Optional[int] = None, 
                      group_id: Optional[int] = None, message: Union[str, List[Dict[str, Any]]] = "",
-                     auto_escape: bool = False) -> Dict[str, Any]:
-        """发送消息"""
+                     auto_escape: bool = False, deferrable: bool = False) -> Dict[str, Any]:
+        """发送消息，deferrable 的消息（提示、推送等）在LLOneBot不可用时延迟补发"""
         data = {
             "message_type": message_type,
             "message": message,
@@ -782,13 +1411,13 @@ class LCHBot:
         
         if user_id is not None:
             data["user_id"] = user_id
-            logger.info(f"发送{message_type}消息 - 目标用户: {user_id} - 内容: {message}")
+            api_logger.info("发送%s消息 - 目标用户: %s - 内容: %s", message_type, user_id, message)
             
         if group_id is not None:
             data["group_id"] = group_id
-            logger.info(f"发送{message_type}消息 - 目标群组: {group_id} - 内容: {message}")
+            api_logger.info("发送%s消息 - 目标群组: %s - 内容: %s", message_type, group_id, message)
             
-        return await self._call_api("/send_msg", data)
+        return await self._call_api("/send_msg", data, deferrable)
         
     async def get_group_member_info(self, group_id: int, user_id: int) -> Dict[str, Any]:
         """获取群成员信息"""
@@ -798,7 +1427,7 @@ class LCHBot:
         }
         
         result = await self._call_api("/get_group_member_info", data)
-        logger.info(f"获取群{group_id}成员{user_id}信息: {json.dumps(result, ensure_ascii=False)[:100]}...")
+        api_logger.info("获取群%s成员%s信息: %.100s...", group_id, user_id, LazyJson(result))
         return result
         
     async def set_group_kick(self, group_id: int, user_id: int, reject_add_request: bool = False) -> Dict[str, Any]:
@@ -810,7 +1439,7 @@ class LCHBot:
         }
         
         result = await self._call_api("/set_group_kick", data)
-        logger.info(f"将用户{user_id}踢出群{group_id}: {json.dumps(result, ensure_ascii=False)[:100]}...")
+        api_logger.info("将用户%s踢出群%s: %.100s...", user_id, group_id, LazyJson(result))
         return result
 
     # 其他API方法保持不变...
@@ -833,7 +1462,7 @@ class InlineDebugPlugin(Plugin):
         group_id = event.get('group_id') if message_type == 'group' else None
         
         # 获取机器人QQ号
-        bot_qq = str(self.bot.config.get("bot", {}).get("self_id", ""))
+        bot_qq = self.bot.self_id
         
         # 检查是否是@机器人的消息
         if not is_at_bot(event, bot_qq):
@@ -878,11 +1507,27 @@ class InlineDebugPlugin(Plugin):
         return False
 
 # 主程序逻辑
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="LCHBot")
+    parser.add_argument("--config", default="config/config.yml", help="配置文件路径")
+    parser.add_argument("--worker", type=int, default=None, help="以分片工作进程运行，指定分片序号（由前端进程传入）")
+    parser.add_argument("--supervisor", default=None, help="分片工作进程连接的前端进程地址 host:port")
+    return parser.parse_args()
+
 async def main():
     """主函数"""
+    args = parse_args()
     # 确保日志目录存在
     os.makedirs('logs', exist_ok=True)
     
+    # 先按配置启动日志输出，分片工作进程的日志带上分片序号
+    try:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+    except Exception:
+        config = {}
+    log_pipeline = setup_logging(config, shard=args.worker)
+    
     # 确保能正确导入src目录下的模块
     src_dir = os.path.dirname(os.path.abspath(__file__))  # src目录
     base_dir = os.path.dirname(src_dir)  # 项目根目录
@@ -899,7 +1544,8 @@ async def main():
     
     try:
         # 实例化并运行机器人
-        bot = LCHBot("config/config.yml")
+        bot = LCHBot(args.config, worker_shard=args.worker, supervisor_address=args.supervisor)
+        bot.log_pipeline = log_pipeline
         await bot.run()
     except KeyboardInterrupt:
         logger.info("收到退出信号，正在关闭...")
@@ -907,6 +1553,7 @@ async def main():
         logger.error(f"运行时错误: {e}", exc_info=True)
     finally:
         await bot.close()
+        log_pipeline.stop()
 
 if __name__ == "__main__":
     # 创建日志目录
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+运行指标模块，提供计数器、仪表和直方图，并以Prometheus文本格式导出
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple, Optional, Callable, Iterator
+
+# 默认延迟直方图分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 预定义的指标: {名称: (类型, 说明)}
+METRIC_DEFINITIONS = {
+    "lchbot_events_received_total": ("counter", "接收到的OneBot事件数"),
+    "lchbot_events_in_flight": ("gauge", "正在处理中的事件数"),
+    "lchbot_event_handle_seconds": ("histogram", "单个事件从接收到处理完毕的耗时"),
+    "lchbot_plugin_calls_total": ("counter", "插件处理函数调用次数"),
+    "lchbot_plugin_handled_total": ("counter", "插件成功处理（返回True）的事件数"),
+    "lchbot_plugin_errors_total": ("counter", "插件处理函数抛出异常的次数"),
+    "lchbot_plugin_handler_seconds": ("histogram", "插件处理函数耗时"),
+    "lchbot_api_calls_total": ("counter", "调用LLOneBot API的次数"),
+    "lchbot_api_retries_total": ("counter", "调用LLOneBot API的重试次数"),
+    "lchbot_api_latency_seconds": ("histogram", "调用LLOneBot API的耗时（含重试）"),
+    "lchbot_persistence_flushes_total": ("counter", "数据文件写入次数"),
+    "lchbot_persistence_flush_seconds": ("histogram", "数据文件写入耗时"),
+    "lchbot_cache_requests_total": ("counter", "缓存查询次数"),
+    "lchbot_loop_lag_seconds": ("histogram", "事件循环调度延迟"),
+    "lchbot_loop_blocked_total": ("counter", "事件循环被阻塞（延迟超过阈值）的次数"),
+    "lchbot_llm_jobs_total": ("counter", "聊天插件大模型请求数，按结果状态区分"),
+    "lchbot_llm_job_seconds": ("histogram", "聊天插件大模型请求从提交到得到结果的耗时"),
+    "lchbot_chat_summary_seconds": ("histogram", "聊天插件生成对话摘要的耗时"),
+    "lchbot_chat_retrieval_seconds": ("histogram", "聊天插件检索资料段落的耗时"),
+    "lchbot_journal_events_total": ("counter", "事件日志处理的事件数，按结果（写入/采样跳过/丢弃/脱敏过滤）区分"),
+    "lchbot_shard_events_total": ("counter", "分片模式下前端进程转发给各工作进程的事件数，按结果区分"),
+    "lchbot_shard_restarts_total": ("counter", "分片模式下工作进程退出后被重启的次数"),
+    "lchbot_account_events_total": ("counter", "多账号模式下各账号收到的事件数，按处理、重复丢弃和未配置账号区分"),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    """将标签字典转换为可哈希的有序元组"""
+    if not labels:
+        return ()
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape_label_value(value: str) -> str:
+    """转义Prometheus标签值中的特殊字符"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    """格式化标签为 {a="1",b="2"} 形式"""
+    items = list(key)
+    if extra is not None:
+        items.append(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in items) + "}"
+
+def _format_value(value: float) -> str:
+    """格式化数值，整数不带小数点"""
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+class Histogram:
+    """固定分桶的直方图，只保存每个桶的计数、总和与样本数"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个桶为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """记录一个样本"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    所有写操作都是简单的字典更新，开销足够低，可以在生产环境中常开。
+    导出时才进行格式化。
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.started_at = time.time()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        # 导出时动态计算的仪表 {名称: (说明, 回调)}，回调返回 [(标签字典, 数值), ...]
+        self._collectors: Dict[str, Tuple[str, Callable[[], List[Tuple[Dict[str, Any], float]]]]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """计数器加值"""
+        if not self.enabled:
+            return
+        series = self._counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """设置仪表数值"""
+        if not self.enabled:
+            return
+        self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def add_gauge(self, name: str, delta: float, **labels) -> None:
+        """仪表加减值"""
+        if not self.enabled:
+            return
+        series = self._gauges.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + delta
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """直方图记录一个样本"""
+        if not self.enabled:
+            return
+        series = self._histograms.setdefault(name, {})
+        key = _label_key(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """计时上下文管理器，结束时将耗时记录到直方图"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def record_flush(self, file: str, seconds: float, success: bool = True) -> None:
+        """记录一次数据文件写入"""
+        self.inc("lchbot_persistence_flushes_total", file=file, status="ok" if success else "failed")
+        self.observe("lchbot_persistence_flush_seconds", seconds, file=file)
+
+    def record_cache(self, cache: str, hit: bool) -> None:
+        """记录一次缓存查询"""
+        self.inc("lchbot_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+    def register_collector(self, name: str, help_text: str,
+                           callback: Callable[[], List[Tuple[Dict[str, Any], float]]]) -> None:
+        """注册一个导出时才计算的仪表，例如队列长度"""
+        self._collectors[name] = (help_text, callback)
+
+    def get_counter(self, name: str, **labels) -> float:
+        """读取计数器当前值"""
+        return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def get_histogram(self, name: str, **labels) -> Optional[Histogram]:
+        """读取直方图"""
+        return self._histograms.get(name, {}).get(_label_key(labels))
+
+    def _cache_hit_ratios(self) -> List[Tuple[LabelKey, float]]:
+        """根据缓存查询计数计算命中率"""
+        totals: Dict[str, List[float]] = {}
+        for key, value in self._counters.get("lchbot_cache_requests_total", {}).items():
+            labels = dict(key)
+            entry = totals.setdefault(labels.get("cache", ""), [0, 0])
+            if labels.get("result") == "hit":
+                entry[0] += value
+            entry[1] += value
+        return [((("cache", cache),), hits / total) for cache, (hits, total) in totals.items() if total]
+
+    def render(self) -> str:
+        """以Prometheus文本格式导出所有指标"""
+        lines: List[str] = []
+
+        def header(name: str, metric_type: str, help_text: Optional[str] = None) -> None:
+            if help_text is None:
+                help_text = METRIC_DEFINITIONS.get(name, (metric_type, name))[1]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        header("lchbot_uptime_seconds", "gauge", "机器人运行时间")
+        lines.append(f"lchbot_uptime_seconds {_format_value(round(time.time() - self.started_at, 3))}")
+
+        for name, series in sorted(self._counters.items()):
+            header(name, "counter")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+        for name, series in sorted(self._gauges.items()):
+            header(name, "gauge")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+        ratios = self._cache_hit_ratios()
+        if ratios:
+            header("lchbot_cache_hit_ratio", "gauge", "缓存命中率")
+            for key, value in ratios:
+                lines.append(f"lchbot_cache_hit_ratio{_format_labels(key)} {_format_value(round(value, 4))}")
+
+        for name, (help_text, callback) in sorted(self._collectors.items()):
+            try:
+                samples = callback()
+            except Exception:
+                continue
+            header(name, "gauge", help_text)
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(_label_key(labels))} {_format_value(value)}")
+
+        for name, series in sorted(self._histograms.items()):
+            header(name, "histogram")
+            for key, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', repr(bound)))} {cumulative}")
+                cumulative += histogram.counts[-1]
+                lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(round(histogram.sum, 6))}")
+                lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
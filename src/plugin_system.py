@@ -1,9 +1,17 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import io
+import os
+import re
+import ast
+import time
 import logging
 import hashlib
-from typing import Dict, Any, Optional, List
+import cProfile
+import pstats
+from collections import deque
+from typing import Dict, Any, Optional, List, Callable
 
 logger = logging.getLogger("LCHBot")
 
@@ -72,6 +80,183 @@ class Plugin:
         self.status = "error"
         self.error_message = error_message
         logger.error(f"插件 {self.name} (ID: {self.id}) 出错: {error_message}")
+        
+    def export_state(self) -> Dict[str, Any]:
+        """导出需要在热重载时保留的内存状态，由新版本插件的 import_state 接收
+        
+        返回的对象会被新实例直接引用而不是复制，重载期间仍在处理事件的旧实例修改的仍是同一份数据
+        """
+        return {}
+        
+    def import_state(self, state: Dict[str, Any]) -> None:
+        """接收旧版本插件导出的内存状态，在新实例初始化完成后、开始处理事件前调用"""
+        pass
+
+# 插件元数据变量，启用延迟加载时不导入模块，直接从源码中读取
+PLUGIN_META_PATTERN = re.compile(r'^plugin_meta\s*=', re.MULTILINE)
+
+def read_plugin_meta(plugin_path: str) -> Optional[Dict[str, Any]]:
+    """
+    从插件源码中读取 plugin_meta 字典，不执行模块代码
+    
+    参数:
+        plugin_path: 插件文件路径
+    返回:
+        元数据字典，没有声明或不是字面量时返回None
+    """
+    try:
+        with open(plugin_path, 'r', encoding='utf-8') as f:
+            source = f.read()
+    except OSError:
+        return None
+    match = PLUGIN_META_PATTERN.search(source)
+    if not match:
+        return None
+    # 只解析从 plugin_meta 开始到字典结束的几行，不解析整个文件
+    lines = source[match.start():].splitlines()
+    for end, line in enumerate(lines, 1):
+        if "}" not in line:
+            continue
+        try:
+            tree = ast.parse("\n".join(lines[:end]))
+        except SyntaxError:
+            continue
+        try:
+            meta = ast.literal_eval(tree.body[0].value)
+        except (ValueError, IndexError, AttributeError):
+            break
+        return meta if isinstance(meta, dict) and meta.get("class") else None
+    logger.warning(f"插件 {plugin_path} 的 plugin_meta 不是字典字面量，无法延迟加载")
+    return None
+
+class LazyPlugin(Plugin):
+    """延迟加载插件的占位实例
+    
+    按插件声明的元数据注册到插件管理器，第一次收到匹配的事件（或被其他插件按名称获取）时
+    才导入模块并创建真正的插件实例，随后用真正的实例替换自己
+    """
+    
+    def __init__(self, bot, module_name: str, meta: Dict[str, Any],
+                 loader: Callable[["LazyPlugin"], Optional[Plugin]]):
+        """
+        参数:
+            bot: 机器人实例
+            module_name: 插件模块名（文件名去掉.py）
+            meta: 插件元数据，class 为插件类名，events 为处理的事件类别，
+                  triggers 为触发加载的正则表达式列表（在 raw_message 中搜索，为空时任何消息都会触发）
+            loader: 导入并创建真正插件实例的函数，失败时返回None
+        """
+        # 不调用基类初始化，名称和ID与真正的插件一致
+        self.bot = bot
+        self.name = meta["class"]
+        self.id = generate_plugin_id(self.name)
+        self.status = "active"
+        self.error_message = None
+        self.priority = meta.get("priority", 0)
+        
+        self.module_name = module_name
+        self.meta = meta
+        self.events = set(meta.get("events", ["message"]))
+        self.triggers = [re.compile(pattern) for pattern in meta.get("triggers") or []]
+        self._loader = loader
+        self.instance: Optional[Plugin] = None
+        self._failed = False
+        
+    def matches(self, kind: str, event: Dict[str, Any]) -> bool:
+        """事件是否需要加载插件"""
+        if kind not in self.events:
+            return False
+        if kind != "message" or not self.triggers:
+            return True
+        raw_message = event.get("raw_message", "")
+        return any(pattern.search(raw_message) for pattern in self.triggers)
+        
+    def load(self) -> Optional[Plugin]:
+        """导入并创建真正的插件实例，只尝试一次"""
+        if self.instance is None and not self._failed:
+            self.instance = self._loader(self)
+            if self.instance is None:
+                self._failed = True
+                self.set_error("延迟加载失败")
+        return self.instance
+        
+    async def _delegate(self, kind: str, event: Dict[str, Any]) -> bool:
+        if not self.matches(kind, event):
+            return False
+        plugin = self.load()
+        if plugin is None:
+            return False
+        return await getattr(plugin, f"handle_{kind}")(event)
+        
+    async def handle_message(self, event: Dict[str, Any]) -> bool:
+        return await self._delegate("message", event)
+        
+    async def handle_notice(self, event: Dict[str, Any]) -> bool:
+        return await self._delegate("notice", event)
+        
+    async def handle_request(self, event: Dict[str, Any]) -> bool:
+        return await self._delegate("request", event)
+
+def summarize_event(event: Dict[str, Any], max_length: int = 50) -> str:
+    """
+    生成事件的简短描述，用于日志
+    
+    参数:
+        event: 事件数据
+        max_length: 消息内容的最大长度
+    返回:
+        事件摘要字符串
+    """
+    post_type = event.get("post_type", "unknown")
+    sub_type = (event.get("message_type") or event.get("notice_type") or 
+                event.get("request_type") or "unknown")
+    summary = f"{post_type}/{sub_type}"
+    if event.get("group_id"):
+        summary += f" 群:{event['group_id']}"
+    if event.get("user_id"):
+        summary += f" 用户:{event['user_id']}"
+    raw_message = event.get("raw_message")
+    if raw_message:
+        if len(raw_message) > max_length:
+            raw_message = raw_message[:max_length] + "..."
+        summary += f" 内容:{raw_message}"
+    return summary
+
+# 插件处理耗时统计
+class HandlerStats:
+    """记录单个插件最近若干次处理耗时，用于计算滚动分位数"""
+    
+    __slots__ = ("samples", "calls", "slow_calls", "max_time")
+    
+    def __init__(self, window_size: int = 512):
+        self.samples = deque(maxlen=window_size)  # 最近的耗时样本（秒）
+        self.calls = 0  # 总调用次数
+        self.slow_calls = 0  # 超过阈值的调用次数
+        self.max_time = 0.0  # 历史最大耗时
+        
+    def add(self, elapsed: float, slow: bool) -> None:
+        """添加一个耗时样本"""
+        self.samples.append(elapsed)
+        self.calls += 1
+        if slow:
+            self.slow_calls += 1
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+            
+    def percentiles(self, *points: float) -> List[float]:
+        """
+        计算滚动窗口内的分位数
+        
+        参数:
+            points: 分位点，如 50, 95, 99
+        返回:
+            对应分位点的耗时（秒），没有样本时返回0
+        """
+        if not self.samples:
+            return [0.0 for _ in points]
+        ordered = sorted(self.samples)
+        last = len(ordered) - 1
+        return [ordered[min(last, int(round(p / 100 * last)))] for p in points]
 
 # 插件管理器
 class PluginManager:
@@ -82,6 +267,17 @@ class PluginManager:
         self.inline_plugins: List[Plugin] = []  # 专门用于存储内联插件
         self.bot = bot  # 保存机器人实例引用
         
+        # 插件耗时统计配置
+        profiling_config = bot.config.get("profiling", {}) if bot is not None else {}
+        self.profiling_enabled = profiling_config.get("enabled", True)
+        self.slow_handler_threshold = profiling_config.get("slow_handler_threshold", 0.5)  # 慢处理阈值（秒）
+        self.stats_window_size = profiling_config.get("window_size", 512)
+        # 插件耗时统计 {plugin_name: HandlerStats}
+        self.handler_stats: Dict[str, HandlerStats] = {}
+        # 按需开启的cProfile分析器
+        self.profiler: Optional[cProfile.Profile] = None
+        self.profile_started_at = 0.0
+        
     def register_plugin(self, plugin: Plugin) -> None:
         """注册一个插件"""
         self.plugins.append(plugin)
@@ -108,8 +304,24 @@ class PluginManager:
                 return True
         return False
         
+    def replace_plugin(self, old: Plugin, new: Plugin) -> bool:
+        """用新实例替换已注册的插件，保持其在列表中的位置
+        
+        替换时生成新的列表，正在进行的分发仍使用旧实例完成处理
+        """
+        for attr in ("inline_plugins", "plugins"):
+            plugins = getattr(self, attr)
+            for i, plugin in enumerate(plugins):
+                if plugin is old:
+                    updated = list(plugins)
+                    updated[i] = new
+                    setattr(self, attr, updated)
+                    logger.info(f"插件 {old.name} (ID: {old.id}) 已替换为新实例")
+                    return True
+        return False
+        
     def get_plugin_by_id(self, plugin_id: int) -> Optional[Plugin]:
-        """根据ID获取插件"""
+        """根据ID获取插件，尚未加载的延迟插件会在此时加载"""
         # 先检查内联插件
         for plugin in self.inline_plugins:
             if plugin.id == plugin_id:
@@ -118,11 +330,11 @@ class PluginManager:
         # 再检查普通插件
         for plugin in self.plugins:
             if plugin.id == plugin_id:
-                return plugin
+                return self._resolve_lazy(plugin)
         return None
         
     def get_plugin_by_name(self, name: str) -> Optional[Plugin]:
-        """根据名称获取插件"""
+        """根据名称获取插件，尚未加载的延迟插件会在此时加载"""
         # 先检查内联插件
         for plugin in self.inline_plugins:
             if plugin.name == name:
@@ -131,9 +343,15 @@ class PluginManager:
         # 再检查普通插件
         for plugin in self.plugins:
             if plugin.name == name:
-                return plugin
+                return self._resolve_lazy(plugin)
         return None
         
+    def _resolve_lazy(self, plugin: Plugin) -> Plugin:
+        """其他插件需要调用插件的方法时，把占位实例换成真正的插件"""
+        if isinstance(plugin, LazyPlugin):
+            return plugin.load() or plugin
+        return plugin
+        
     def get_active_plugins(self) -> List[Plugin]:
         """获取所有活跃的插件"""
         return ([p for p in self.inline_plugins if p.status == "active"] + 
@@ -143,6 +361,103 @@ class PluginManager:
         """获取所有插件"""
         return self.inline_plugins.copy() + self.plugins.copy()
         
+    async def _invoke(self, plugin: Plugin, kind: str, event: Dict[str, Any]) -> bool:
+        """调用插件的处理函数并记录调用次数、耗时和异常
+        
+        参数:
+            plugin: 插件实例
+            kind: 事件类别，message、notice 或 request
+            event: 事件数据
+            
+        返回:
+            插件是否处理了该事件，异常会在记录后继续抛出
+        """
+        handler = getattr(plugin, f"handle_{kind}")
+        metrics = getattr(self.bot, "metrics", None)
+        if self.bot is not None and hasattr(self.bot, "plugin_calls"):
+            self.bot.plugin_calls[plugin.id] += 1
+        if metrics is None and not self.profiling_enabled:
+            return await handler(event)
+            
+        start = time.perf_counter()
+        try:
+            handled = await handler(event)
+        except Exception:
+            if metrics is not None:
+                metrics.inc("lchbot_plugin_errors_total", plugin=plugin.name, kind=kind)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if metrics is not None:
+                metrics.inc("lchbot_plugin_calls_total", plugin=plugin.name, kind=kind)
+                metrics.observe("lchbot_plugin_handler_seconds", elapsed, plugin=plugin.name, kind=kind)
+            if self.profiling_enabled:
+                self._record_timing(plugin, kind, elapsed, event)
+        if handled and metrics is not None:
+            metrics.inc("lchbot_plugin_handled_total", plugin=plugin.name, kind=kind)
+        return handled
+        
+    def _record_timing(self, plugin: Plugin, kind: str, elapsed: float, event: Dict[str, Any]) -> None:
+        """记录插件处理耗时，超过阈值时输出警告"""
+        stats = self.handler_stats.get(plugin.name)
+        if stats is None:
+            stats = self.handler_stats[plugin.name] = HandlerStats(self.stats_window_size)
+        slow = elapsed > self.slow_handler_threshold
+        stats.add(elapsed, slow)
+        if slow:
+            logger.warning(f"插件 {plugin.name} (ID: {plugin.id}) 处理{kind}事件耗时 {elapsed * 1000:.1f}ms，"
+                           f"超过阈值 {self.slow_handler_threshold * 1000:.0f}ms - {summarize_event(event)}")
+                           
+    def get_handler_stats(self, plugin_name: str) -> Optional[HandlerStats]:
+        """获取插件的耗时统计"""
+        return self.handler_stats.get(plugin_name)
+        
+    def start_profile(self) -> bool:
+        """开始cProfile分析，已在分析中时返回False"""
+        if self.profiler is not None:
+            return False
+        self.profiler = cProfile.Profile()
+        self.profile_started_at = time.time()
+        self.profiler.enable()
+        logger.info("已开始性能分析")
+        return True
+        
+    def stop_profile(self, limit: int = 15, dump_dir: Optional[str] = "logs") -> Optional[str]:
+        """
+        停止cProfile分析并返回结果
+        
+        参数:
+            limit: 输出的函数数量
+            dump_dir: 完整分析数据(.prof)的保存目录，为None时不保存
+        返回:
+            按累计耗时排序的分析结果，没有正在进行的分析时返回None
+        """
+        if self.profiler is None:
+            return None
+        profiler = self.profiler
+        self.profiler = None
+        profiler.disable()
+        duration = time.time() - self.profile_started_at
+        
+        lines = [f"分析时长: {duration:.1f}秒", "累计耗时 | 自身耗时 | 调用次数 | 函数"]
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        for (filename, line, func_name), (_, ncalls, tottime, cumtime, _) in rows[:limit]:
+            location = f"{os.path.basename(filename)}:{line}" if line else filename
+            lines.append(f"{cumtime * 1000:.1f}ms | {tottime * 1000:.1f}ms | {ncalls} | {func_name} ({location})")
+            
+        if dump_dir:
+            try:
+                os.makedirs(dump_dir, exist_ok=True)
+                dump_file = os.path.join(dump_dir, f"profile_{int(self.profile_started_at)}.prof")
+                profiler.dump_stats(dump_file)
+                lines.append(f"完整数据已保存到: {dump_file}")
+            except Exception as e:
+                logger.error(f"保存性能分析数据失败: {e}")
+                
+        logger.info(f"性能分析已结束，持续 {duration:.1f} 秒")
+        return "\n".join(lines)
+        
     async def dispatch_message(self, event: Dict[str, Any]) -> bool:
         """分发消息事件到插件"""
         # 首先尝试使用内联插件处理消息
@@ -153,7 +468,7 @@ class PluginManager:
         for plugin in sorted_inline_plugins:
             try:
                 logger.debug(f"尝试使用内联插件 {plugin.name} (ID: {plugin.id}, 优先级: {plugin.priority}) 处理消息")
-                if await plugin.handle_message(event):
+                if await self._invoke(plugin, "message", event):
                     logger.info(f"消息已被内联插件 {plugin.name} (ID: {plugin.id}) 处理")
                     return True
             except Exception as e:
@@ -168,7 +483,7 @@ class PluginManager:
         for plugin in active_plugins:
             try:
                 logger.debug(f"尝试使用插件 {plugin.name} (ID: {plugin.id}, 优先级: {plugin.priority}) 处理消息")
-                if await plugin.handle_message(event):
+                if await self._invoke(plugin, "message", event):
                     logger.info(f"消息已被插件 {plugin.name} (ID: {plugin.id}) 处理")
                     return True
             except Exception as e:
@@ -188,7 +503,7 @@ class PluginManager:
         
         for plugin in active_plugins:
             try:
-                if await plugin.handle_notice(event):
+                if await self._invoke(plugin, "notice", event):
                     logger.info(f"通知已被插件 {plugin.name} (ID: {plugin.id}) 处理")
                     return True
             except Exception as e:
@@ -208,7 +523,7 @@ class PluginManager:
         
         for plugin in active_plugins:
             try:
-                if await plugin.handle_request(event):
+                if await self._invoke(plugin, "request", event):
                     logger.info(f"请求已被插件 {plugin.name} (ID: {plugin.id}) 处理")
                     return True
             except Exception as e:
@@ -52,7 +52,7 @@ class AdminMenu(Plugin):
         user_id = event.get('user_id')
         group_id = event.get('group_id') if message_type == 'group' else None
         message = event.get('raw_message', '')
-        bot_qq = str(self.bot.config.get("bot", {}).get("self_id", ""))
+        bot_qq = self.bot.self_id
         
         # 只有特定命令需要@机器人
         at_required_cmds = ["admin", "set_name", "set_card", "set_avatar"]
@@ -288,7 +288,7 @@ class AdminMenu(Plugin):
         """设置机器人群名片"""
         try:
             # 获取机器人QQ号
-            bot_qq = self.bot.config.get("bot", {}).get("self_id", "")
+            bot_qq = self.bot.self_id
             
             # 调用API
             api_url = "/set_group_card"
@@ -19,9 +19,15 @@ from typing import Dict, Any, List, Tuple, Optional, Union
 # 导入Plugin基类和工具函数
 from src.plugin_system import Plugin
 from src.plugins.utils import handle_at_command, extract_command, is_at_bot
+from src.state_store import import_legacy_file
 
 logger = logging.getLogger("LCHBot")
 
+# 插件数据在共享状态存储中的命名空间，只有一条 data 记录
+BILIBILI_NAMESPACE = "bilibili"
+# 订阅检查间隔（秒）
+CHECK_INTERVAL = 30 * 60
+
 class BilibiliPlugin(Plugin):
     """
     哔哩哔哩专属插件
@@ -69,11 +75,13 @@ class BilibiliPlugin(Plugin):
             'help': re.compile(r'^/bili\.admin$'),  # 显示管理员帮助信息
         }
         
-        # 数据文件路径
+        # 旧版本的数据文件路径，首次运行时导入共享状态存储
         self.data_file = "data/bilibili_data.json"
         
         # 加载数据
-        self.data = self.load_json(self.data_file, {
+        self.store = self.bot.state_store
+        import_legacy_file(self.store, BILIBILI_NAMESPACE, self.data_file, lambda data: {"data": data})
+        self.data = self.store.get(BILIBILI_NAMESPACE, "data", {
             "bindings": {},  # {qq_id: {uid: xxx, username: xxx, ...}}
             "subscriptions": {},  # {qq_id: [{up_uid: xxx, up_name: xxx}, ...]}
             "members": [],  # 会员QQ号列表
@@ -106,35 +114,9 @@ class BilibiliPlugin(Plugin):
         if "last_check" not in self.data:
             self.data["last_check"] = {}
             
-    def load_json(self, file_path: str, default_value: Any) -> Dict:
-        """从文件加载JSON数据，如果文件不存在则返回默认值"""
-        if not os.path.exists(file_path):
-            # 创建目录（如果不存在）
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            # 写入默认值
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(default_value, f, ensure_ascii=False, indent=2)
-            return default_value
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            logger.error(f"加载JSON文件 {file_path} 失败: {e}")
-            return default_value
-            
     def save_json(self) -> None:
-        """保存数据到JSON文件"""
-        try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-            
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
-                
-            logger.debug(f"B站插件数据保存成功")
-        except Exception as e:
-            logger.error(f"保存JSON文件 {self.data_file} 失败: {e}")
+        """保存数据到共享状态存储"""
+        self.store.set(BILIBILI_NAMESPACE, "data", self.data)
     
     def is_member(self, user_id: str) -> bool:
         """检查用户是否是会员"""
@@ -158,7 +140,7 @@ class BilibiliPlugin(Plugin):
             return await self._handle_bilibili_card(event)
         
         # 获取机器人QQ号
-        bot_qq = str(self.bot.config.get("bot", {}).get("self_id", ""))
+        bot_qq = self.bot.self_id
         
         # 检查是否是@机器人的消息
         if not is_at_bot(event, bot_qq):
@@ -1790,7 +1772,16 @@ class BilibiliPlugin(Plugin):
         """定期检查订阅的UP主更新和直播状态"""
         try:
             while True:
+                # 多个机器人进程共用数据时，只由持有租约的进程检查，避免重复推送
+                if not self.store.acquire_lease("bilibili_subscriptions", CHECK_INTERVAL * 1.5):
+                    logger.debug("其他进程正在检查B站订阅更新")
+                    await asyncio.sleep(CHECK_INTERVAL)
+                    continue
+                    
                 logger.debug("开始检查B站订阅更新")
+                # 重新读取数据，包含其他进程添加的订阅
+                self.data = self.store.get(BILIBILI_NAMESPACE, "data", self.data)
+                self._check_data_structure()
                 all_subs = {}
                 
                 # 收集所有订阅的UP主
@@ -1811,7 +1802,7 @@ class BilibiliPlugin(Plugin):
                     await asyncio.sleep(5)
                 
                 # 每30分钟检查一次
-                await asyncio.sleep(30 * 60)
+                await asyncio.sleep(CHECK_INTERVAL)
         except asyncio.CancelledError:
             logger.info("B站订阅检查任务已取消")
         except Exception as e:
@@ -1918,7 +1909,8 @@ class BilibiliPlugin(Plugin):
                 await self.bot.send_msg(
                     message_type="private",
                     user_id=int(user_id),
-                    message=message
+                    message=message,
+                    deferrable=True
                 )
             except Exception as e:
                 logger.error(f"向用户 {user_id} 发送私聊通知失败: {e}")
@@ -1935,7 +1927,8 @@ class BilibiliPlugin(Plugin):
                         await self.bot.send_msg(
                             message_type="group",
                             group_id=int(group_id),
-                            message=group_message
+                            message=group_message,
+                            deferrable=True
                         )
                         # 每个通知只在一个群发送，避免刷屏
                         break
@@ -2030,7 +2023,7 @@ class BilibiliPlugin(Plugin):
         group_id = str(event.get('group_id', 0)) if message_type == 'group' else '0'
         
         # 获取机器人QQ号
-        bot_qq = str(self.bot.config.get("bot", {}).get("self_id", ""))
+        bot_qq = self.bot.self_id
         
         # 检查是否是@机器人的消息，管理员命令必须@机器人
         if not is_at_bot(event, bot_qq):
@@ -2140,5 +2133,15 @@ class BilibiliPlugin(Plugin):
                 
         return False 
 
+# 插件元数据，用于延迟加载
+plugin_meta = {
+    "class": "BilibiliPlugin",
+    "events": ["message"],
+    "triggers": [
+        r"/bili\.",
+        r"com\.tencent\.miniapp_01"
+    ]
+}
+
 # 导出插件类，确保插件加载器能找到它
 plugin_class = BilibiliPlugin 
\ No newline at end of file
@@ -2,8 +2,6 @@
 # -*- coding: utf-8 -*-
 
 import re
-import os
-import json
 import logging
 import time
 from datetime import datetime, timedelta
@@ -12,13 +10,20 @@ from typing import Dict, Any, List, Optional, Union, Set
 # 导入Plugin基类和工具函数
 from plugin_system import Plugin
 from plugins.utils import handle_at_command, extract_command, is_at_bot
+from state_store import import_legacy_file
+from admission import BLACKLISTED, USER, Rule, make_key
 
 logger = logging.getLogger("LCHBot")
 
+# 黑名单在共享状态存储中的命名空间
+BLACKLIST_NAMESPACE = "blacklist"
+
 class Blacklist(Plugin):
     """
     全局黑名单插件：管理禁止使用机器人的用户
     
+    黑名单注册到机器人的准入过滤中，黑名单用户的消息在分发给插件之前丢弃
+    
     管理员命令：
     - @机器人 /blacklist add <@用户|QQ号> [原因] - 将用户添加到全局黑名单
     - @机器人 /blacklist remove <@用户|QQ号> - 将用户从全局黑名单中移除
@@ -40,94 +45,71 @@ class Blacklist(Plugin):
             'check_blacklist': re.compile(r'^/blacklist\s+check\s+(?:\[CQ:at,qq=(\d+)[^\]]*\]|(\d+))$'),
         }
         
-        # 数据文件路径
-        self.blacklist_file = "data/global_blacklist.json"
-        
-        # 黑名单数据结构：{
-        #   "users": {
-        #     "QQ号": {
-        #       "added_by": "管理员QQ号",
-        #       "added_time": 添加时间戳,
-        #       "reason": "原因"
-        #     }
-        #   }
+        # 黑名单保存在共享状态存储中，多个机器人进程共用，每个用户一条记录：
+        # {
+        #   "added_by": "管理员QQ号",
+        #   "added_time": 添加时间戳,
+        #   "reason": "原因"
         # }
-        self.blacklist_data = self.load_blacklist_data()
+        self.store = self.bot.state_store
+        # 首次运行时导入旧的黑名单文件
+        import_legacy_file(self.store, BLACKLIST_NAMESPACE, "data/global_blacklist.json",
+                           lambda data: data.get("users", {}))
+        # 注册到准入过滤，其他进程修改的黑名单按准入过滤的刷新间隔生效
+        self.bot.admission.set_source(BLACKLIST_NAMESPACE, self._load_rules(), loader=self._load_rules)
+        self.bot.admission.set_notifier(BLACKLISTED, self._notify_blacklisted)
         
         logger.info(f"插件 {self.name} (ID: {self.id}) 已初始化")
         
-    def load_blacklist_data(self) -> Dict[str, Any]:
-        """加载黑名单数据"""
-        if not os.path.exists(self.blacklist_file):
-            # 创建目录（如果不存在）
-            os.makedirs(os.path.dirname(self.blacklist_file), exist_ok=True)
-            # 创建默认黑名单数据
-            default_data = {"users": {}}
-            with open(self.blacklist_file, 'w', encoding='utf-8') as f:
-                json.dump(default_data, f, ensure_ascii=False, indent=2)
-            return default_data
-        
-        try:
-            with open(self.blacklist_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            logger.error(f"加载黑名单数据失败: {e}")
-            return {"users": {}}
-            
-    def save_blacklist_data(self) -> None:
-        """保存黑名单数据"""
-        try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(self.blacklist_file), exist_ok=True)
-            
-            with open(self.blacklist_file, 'w', encoding='utf-8') as f:
-                json.dump(self.blacklist_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存黑名单数据失败: {e}")
-    
     def is_admin(self, user_id: int) -> bool:
         """检查用户是否是管理员"""
         superusers = self.bot.config.get("bot", {}).get("superusers", [])
         return str(user_id) in superusers
         
+    def _load_rules(self) -> Dict[Any, Rule]:
+        """从状态存储读取黑名单，生成准入规则"""
+        rules = {}
+        for user_id, info in self.store.items(BLACKLIST_NAMESPACE).items():
+            key = make_key(USER, user_id)
+            if key is not None:
+                rules[key] = Rule(BLACKLISTED, BLACKLIST_NAMESPACE, data=info.get("reason", "未提供原因"))
+        return rules
+        
+    async def _notify_blacklisted(self, event: Dict[str, Any], rule: Rule) -> None:
+        """黑名单用户在群聊中@机器人时回复提示，其他消息静默丢弃"""
+        if event.get('message_type') != 'group' or not is_at_bot(event, self.bot.self_id):
+            return
+        await self.bot.send_msg(
+            message_type='group',
+            group_id=event.get('group_id'),
+            message=f"[CQ:reply,id={event.get('message_id', 0)}]您已被列入机器人全局黑名单，无法使用任何功能。\n原因：{rule.data}\n如有疑问请联系管理员。",
+            deferrable=True
+        )
+        
     def is_blacklisted(self, user_id: str) -> bool:
         """检查用户是否在黑名单中"""
-        return user_id in self.blacklist_data.get("users", {})
+        return self.store.get(BLACKLIST_NAMESPACE, user_id) is not None
         
     def add_to_blacklist(self, user_id: str, admin_id: str, reason: Optional[str] = None) -> bool:
-        """添加用户到黑名单"""
-        if "users" not in self.blacklist_data:
-            self.blacklist_data["users"] = {}
-            
-        if user_id in self.blacklist_data["users"]:
-            # 更新已存在的黑名单记录
-            self.blacklist_data["users"][user_id].update({
-                "added_by": admin_id,
-                "added_time": int(time.time()),
-                "reason": reason or self.blacklist_data["users"][user_id].get("reason", "未提供原因")
-            })
-        else:
-            # 创建新的黑名单记录
-            self.blacklist_data["users"][user_id] = {
+        """添加用户到黑名单，已存在时更新记录（未提供原因时保留原来的原因）"""
+        def _add(info):
+            return {
                 "added_by": admin_id,
                 "added_time": int(time.time()),
-                "reason": reason or "未提供原因"
+                "reason": reason or (info or {}).get("reason", "未提供原因")
             }
-            
-        self.save_blacklist_data()
+        info = self.store.update(BLACKLIST_NAMESPACE, user_id, _add)
+        self.bot.admission.add(BLACKLIST_NAMESPACE, make_key(USER, user_id), BLACKLISTED, data=info["reason"])
         return True
         
     def remove_from_blacklist(self, user_id: str) -> bool:
         """从黑名单移除用户"""
-        if user_id in self.blacklist_data.get("users", {}):
-            del self.blacklist_data["users"][user_id]
-            self.save_blacklist_data()
-            return True
-        return False
+        self.bot.admission.remove(BLACKLIST_NAMESPACE, make_key(USER, user_id))
+        return self.store.delete(BLACKLIST_NAMESPACE, user_id)
         
     def get_blacklist_info(self, user_id: str) -> Optional[Dict[str, Any]]:
         """获取黑名单中用户的信息"""
-        return self.blacklist_data.get("users", {}).get(user_id)
+        return self.store.get(BLACKLIST_NAMESPACE, user_id)
         
     def format_blacklist_info(self, user_id: str) -> str:
         """格式化黑名单信息"""
@@ -145,14 +127,15 @@ class Blacklist(Plugin):
                 
     def format_blacklist(self) -> str:
         """格式化黑名单列表"""
-        if not self.blacklist_data.get("users"):
+        users = self.store.items(BLACKLIST_NAMESPACE)
+        if not users:
             return "黑名单为空"
             
         lines = ["📋 全局黑名单列表:"]
         
         # 为了方便阅读，按添加时间排序
         sorted_users = sorted(
-            self.blacklist_data["users"].items(),
+            users.items(),
             key=lambda x: x[1].get("added_time", 0),
             reverse=True  # 最近添加的排在前面
         )
@@ -174,23 +157,7 @@ class Blacklist(Plugin):
         # 构建回复CQ码
         reply_code = f"[CQ:reply,id={message_id}]"
         
-        # 优先检查发送者是否在黑名单中
-        if self.is_blacklisted(str(user_id)):
-            # 如果是在群聊中，有一定概率回复（避免刷屏）
-            if message_type == 'group' and is_at_bot(event, self.bot):
-                # 获取黑名单信息
-                info = self.get_blacklist_info(str(user_id))
-                reason = info.get("reason", "未提供原因") if info else "未知原因"
-                
-                await self.bot.send_msg(
-                    message_type=message_type,
-                    group_id=group_id,
-                    message=f"{reply_code}您已被列入机器人全局黑名单，无法使用任何功能。\n原因：{reason}\n如有疑问请联系管理员。"
-                )
-                
-            # 拦截消息，不让其他插件处理
-            return True
-            
+        # 黑名单用户的消息已由准入过滤丢弃，这里只处理管理命令
         # 只有管理员可以使用黑名单管理命令
         if not self.is_admin(user_id):
             return False
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+聊天插件的回复缓存
+
+- 以 (人格, 上下文指纹) 为范围，按归一化后的用户消息缓存回复
+- 先精确匹配，未命中时用字符二元组的MinHash分桶查找相似消息，再按Jaccard相似度确认
+- 缓存条目超过有效期后失效，超出数量上限时淘汰最久未使用的条目
+- 各群可以单独关闭缓存，设置保存到文件
+"""
+
+import os
+import re
+import json
+import time
+import zlib
+import random
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Set, Tuple, FrozenSet
+
+logger = logging.getLogger("LCHBot")
+
+# 归一化时去除的标点、空白和下划线
+STRIP_PATTERN = re.compile(r'[\W_]+')
+
+# MinHash使用的大素数
+MERSENNE_PRIME = (1 << 31) - 1
+
+def normalize(text: str) -> str:
+    """归一化消息：转小写，去除标点和空白"""
+    return STRIP_PATTERN.sub("", text.lower())
+
+def shingles(text: str, n: int = 2) -> FrozenSet[str]:
+    """将归一化的文本切分为字符n元组集合，短于n的文本整体作为一个元素"""
+    if len(text) <= n:
+        return frozenset((text,))
+    return frozenset(text[i:i + n] for i in range(len(text) - n + 1))
+
+class CacheEntry:
+    """一条缓存的回复"""
+
+    __slots__ = ("scope", "text", "shingles", "bands", "reply", "expires_at")
+
+    def __init__(self, scope: str, text: str, shingle_set: FrozenSet[str], bands: List[Tuple[int, ...]],
+                 reply: str, expires_at: float):
+        self.scope = scope
+        self.text = text  # 归一化后的消息
+        self.shingles = shingle_set
+        self.bands = bands  # MinHash签名的分段
+        self.reply = reply
+        self.expires_at = expires_at
+
+class ResponseCache:
+    """精确匹配加MinHash相似匹配的回复缓存"""
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 2000, threshold: float = 0.8,
+                 max_length: int = 50, num_perm: int = 32, bands: int = 8, ngram: int = 2,
+                 data_file: str = "data/chat_cache_groups.json", metrics=None):
+        """
+        参数:
+            ttl: 缓存有效期（秒）
+            max_entries: 缓存条目上限
+            threshold: 相似匹配的Jaccard相似度下限
+            max_length: 只缓存归一化后不超过该长度的消息，长消息很少重复
+            num_perm: MinHash签名长度
+            bands: 签名分段数，相似度越接近阈值越依赖分段数
+            ngram: 字符n元组长度
+            data_file: 关闭缓存的群列表保存文件
+            metrics: 运行指标注册表
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.max_length = max_length
+        self.ngram = ngram
+        self.num_bands = bands
+        self.rows = max(1, num_perm // bands)
+        self.data_file = data_file
+        self.metrics = metrics
+
+        # 固定种子生成哈希参数，保证重启后签名一致
+        rng = random.Random(20240601)
+        self._params = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+                        for _ in range(self.num_bands * self.rows)]
+
+        # {(范围, 归一化消息): CacheEntry}，按最近使用排序
+        self.entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        # 分桶索引 {(范围, 分段序号, 分段值): {(范围, 归一化消息), ...}}
+        self.buckets: Dict[Tuple[str, int, Tuple[int, ...]], Set[Tuple[str, str]]] = {}
+
+        # 关闭缓存的群
+        self.disabled_groups: Set[str] = set()
+        self.load()
+
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    def _bands(self, shingle_set: FrozenSet[str]) -> List[Tuple[int, ...]]:
+        """计算MinHash签名并分段"""
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingle_set]
+        signature = [min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in self._params]
+        return [tuple(signature[i:i + self.rows]) for i in range(0, len(signature), self.rows)]
+
+    def enabled(self, group_id: Any) -> bool:
+        """群是否启用了缓存"""
+        return str(group_id) not in self.disabled_groups
+
+    def get(self, scope: str, text: str) -> Optional[str]:
+        """
+        查找缓存的回复
+
+        参数:
+            scope: 缓存范围（人格和上下文指纹）
+            text: 用户消息
+        返回:
+            缓存的回复，未命中时返回None
+        """
+        normalized = normalize(text)
+        if not normalized or len(normalized) > self.max_length:
+            return None
+        now = time.time()
+
+        key = (scope, normalized)
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry.expires_at > now:
+                self.entries.move_to_end(key)
+                self._count(True)
+                self.hits += 1
+                return entry.reply
+            self._remove(key)
+
+        shingle_set = shingles(normalized, self.ngram)
+        best: Optional[CacheEntry] = None
+        best_score = self.threshold
+        candidates: Set[Tuple[str, str]] = set()
+        for index, band in enumerate(self._bands(shingle_set)):
+            candidates.update(self.buckets.get((scope, index, band), ()))
+        for candidate in candidates:
+            entry = self.entries.get(candidate)
+            if entry is None:
+                continue
+            if entry.expires_at <= now:
+                self._remove(candidate)
+                continue
+            score = len(shingle_set & entry.shingles) / len(shingle_set | entry.shingles)
+            if score >= best_score:
+                best, best_score = entry, score
+        if best is not None:
+            self.entries.move_to_end((best.scope, best.text))
+            self._count(True)
+            self.hits += 1
+            self.fuzzy_hits += 1
+            logger.debug(f"回复缓存相似命中: {normalized} -> {best.text} ({best_score:.2f})")
+            return best.reply
+
+        self._count(False)
+        self.misses += 1
+        return None
+
+    def put(self, scope: str, text: str, reply: str) -> None:
+        """缓存回复，消息不适合缓存时忽略"""
+        normalized = normalize(text)
+        if not normalized or len(normalized) > self.max_length or not reply:
+            return
+        key = (scope, normalized)
+        if key in self.entries:
+            self._remove(key)
+        shingle_set = shingles(normalized, self.ngram)
+        bands = self._bands(shingle_set)
+        self.entries[key] = CacheEntry(scope, normalized, shingle_set, bands, reply, time.time() + self.ttl)
+        for index, band in enumerate(bands):
+            self.buckets.setdefault((scope, index, band), set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for index, band in enumerate(entry.bands):
+            bucket_key = (entry.scope, index, band)
+            bucket = self.buckets.get(bucket_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[bucket_key]
+
+    def clear(self) -> int:
+        """清空缓存，返回清除的条目数"""
+        count = len(self.entries)
+        self.entries.clear()
+        self.buckets.clear()
+        return count
+
+    def _count(self, hit: bool) -> None:
+        if self.metrics is not None:
+            self.metrics.record_cache("chat_response", hit)
+
+    def set_enabled(self, group_id: Any, enabled: bool) -> None:
+        """开启或关闭群的缓存并保存"""
+        if enabled:
+            self.disabled_groups.discard(str(group_id))
+        else:
+            self.disabled_groups.add(str(group_id))
+        self.save()
+
+    def load(self) -> None:
+        """加载关闭缓存的群列表"""
+        if not os.path.exists(self.data_file):
+            return
+        try:
+            with open(self.data_file, 'r', encoding='utf-8') as f:
+                self.disabled_groups = {str(group_id) for group_id in json.load(f).get("disabled_groups", [])}
+        except Exception as e:
+            logger.error(f"加载回复缓存设置失败: {e}")
+
+    def save(self) -> None:
+        """保存关闭缓存的群列表"""
+        try:
+            os.makedirs(os.path.dirname(self.data_file) or ".", exist_ok=True)
+            temp_file = f"{self.data_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({"disabled_groups": sorted(self.disabled_groups)}, f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, self.data_file)
+        except Exception as e:
+            logger.error(f"保存回复缓存设置失败: {e}")
+
+    def format_status(self) -> str:
+        """生成缓存状态描述"""
+        total = self.hits + self.misses
+        ratio = f"{self.hits / total:.1%}" if total else "无"
+        return (f"{len(self.entries)}/{self.max_entries} 条，命中 {self.hits}（相似 {self.fuzzy_hits}），"
+                f"未命中 {self.misses}，命中率 {ratio}")
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+聊天插件的群聊上下文管理
+
+- 用本地规则估算token数，按预算保留最近的对话
+- 超出预算的旧对话先进入待压缩列表，累计超过阈值后才在后台压缩进滚动摘要，避免每轮对话都调用一次模型；
+  请求时以一条系统消息附带摘要，尚未压缩的旧对话以截取的形式附在摘要后
+- 上下文延迟批量保存到文件，重启后恢复
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Deque
+
+logger = logging.getLogger("LCHBot")
+
+# 中日韩字符大致每个字符一个token，其余字符大致每4个一个token
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af\uff00-\uffef]')
+
+# 每条消息的角色、分隔符等额外开销
+MESSAGE_OVERHEAD = 4
+
+# 摘要函数: 接收 (群号字符串, 已有摘要, 需要压缩的消息列表)，返回新的摘要，失败时返回None
+Summarizer = Callable[[str, str, List[Dict[str, str]]], Awaitable[Optional[str]]]
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数"""
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def truncate_tokens(text: str, budget: int, keep_tail: bool = True) -> str:
+    """
+    截断文本使其不超过token预算
+
+    参数:
+        text: 文本
+        budget: token预算
+        keep_tail: 保留末尾（较新的内容），否则保留开头
+    返回:
+        截断后的文本
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    cost = 0.0
+    count = 0
+    for char in (reversed(text) if keep_tail else text):
+        cost += 1 if CJK_PATTERN.match(char) else 0.25
+        if cost > budget:
+            break
+        count += 1
+    return text[len(text) - count:] if keep_tail else text[:count]
+
+class GroupContext:
+    """单个群的对话上下文"""
+
+    __slots__ = ("summary", "turns", "tokens", "pending", "pending_tokens", "summarizing")
+
+    def __init__(self):
+        self.summary = ""  # 滚动摘要
+        self.turns: Deque[Dict[str, Any]] = deque()  # [{role, content, tokens}]
+        self.tokens = 0  # turns的token总数
+        self.pending: List[Dict[str, str]] = []  # 等待压缩进摘要的旧消息
+        self.pending_tokens = 0  # pending的token总数
+        self.summarizing = False
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+class ContextManager:
+    """按token预算管理各群的对话上下文"""
+
+    def __init__(self, data_file: str = "data/chat_context.json", token_budget: int = 1500,
+                 summary_budget: int = 300, max_messages: int = 10, summary_threshold: int = 400,
+                 summarizer: Optional[Summarizer] = None, save_delay: float = 5.0, metrics=None):
+        """
+        参数:
+            data_file: 上下文保存文件
+            token_budget: 保留的对话消息token预算（不含摘要）
+            summary_budget: 滚动摘要的token上限
+            max_messages: 保留的对话消息条数上限
+            summary_threshold: 待压缩的旧消息累计超过多少token时才生成一次摘要
+            summarizer: 摘要函数，为None或失败时使用截取式摘要
+            save_delay: 上下文变更后延迟保存的时间（秒），期间的多次变更合并为一次写入
+            metrics: 运行指标注册表
+        """
+        self.data_file = data_file
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.max_messages = max_messages
+        self.summary_threshold = summary_threshold
+        self.summarizer = summarizer
+        self.save_delay = save_delay
+        self.metrics = metrics
+
+        # {群号字符串: GroupContext}
+        self.groups: Dict[str, GroupContext] = {}
+        self._save_task: Optional[asyncio.Task] = None
+        self.load()
+
+    def get(self, group_id: Any) -> GroupContext:
+        """获取群上下文，不存在时创建"""
+        key = str(group_id)
+        context = self.groups.get(key)
+        if context is None:
+            context = self.groups[key] = GroupContext()
+        return context
+
+    def has(self, group_id: Any) -> bool:
+        """群是否有上下文"""
+        context = self.groups.get(str(group_id))
+        return context is not None and (len(context) > 0 or bool(context.summary))
+
+    def build_messages(self, group_id: Any) -> List[Dict[str, str]]:
+        """
+        生成发送给模型的上下文消息
+
+        返回:
+            摘要（如有）作为系统消息在前，其后是最近的对话消息
+        """
+        context = self.groups.get(str(group_id))
+        if context is None:
+            return []
+        messages = []
+        summary = context.summary
+        if context.pending:
+            # 尚未压缩的旧对话先以截取的形式附在摘要后
+            summary = truncate_tokens(self._extractive_summary(summary, context.pending),
+                                      self.summary_budget + self.summary_threshold)
+        if summary:
+            messages.append({"role": "system", "content": f"此前的对话摘要：{summary}"})
+        messages.extend({"role": turn["role"], "content": turn["content"]} for turn in context.turns)
+        return messages
+
+    def add_exchange(self, group_id: Any, user_message: str, reply: str) -> None:
+        """添加一轮用户消息和回复"""
+        context = self.get(group_id)
+        for role, content in (("user", user_message), ("assistant", reply)):
+            tokens = estimate_tokens(content) + MESSAGE_OVERHEAD
+            context.turns.append({"role": role, "content": content, "tokens": tokens})
+            context.tokens += tokens
+        self._compact(str(group_id), context)
+        self.schedule_save()
+
+    def clear(self, group_id: Any) -> int:
+        """清除群上下文（包括摘要），返回清除的消息数"""
+        context = self.groups.pop(str(group_id), None)
+        if context is None:
+            return 0
+        self.schedule_save()
+        return len(context)
+
+    def _compact(self, key: str, context: GroupContext) -> None:
+        """将超出预算的旧消息移入待压缩列表，累计超过阈值时启动后台摘要"""
+        while len(context.turns) > 2 and (context.tokens > self.token_budget or
+                                          len(context.turns) > self.max_messages):
+            turn = context.turns.popleft()
+            context.tokens -= turn["tokens"]
+            context.pending.append({"role": turn["role"], "content": turn["content"]})
+            context.pending_tokens += turn["tokens"]
+
+        if context.pending_tokens >= self.summary_threshold and not context.summarizing:
+            context.summarizing = True
+            asyncio.create_task(self._summarize(key, context))
+
+    async def _summarize(self, key: str, context: GroupContext) -> None:
+        """后台把待压缩的消息合并进滚动摘要"""
+        try:
+            while context.pending_tokens >= self.summary_threshold:
+                batch = context.pending
+                context.pending = []
+                context.pending_tokens = 0
+                summary = None
+                if self.summarizer is not None:
+                    start = time.perf_counter()
+                    try:
+                        summary = await self.summarizer(key, context.summary, batch)
+                    except Exception as e:
+                        logger.error(f"生成群 {key} 的对话摘要出错: {e}", exc_info=True)
+                    if self.metrics is not None:
+                        self.metrics.observe("lchbot_chat_summary_seconds", time.perf_counter() - start)
+                if not summary:
+                    summary = self._extractive_summary(context.summary, batch)
+                context.summary = truncate_tokens(summary.strip(), self.summary_budget)
+                logger.debug(f"群 {key} 的对话摘要已更新，约 {estimate_tokens(context.summary)} tokens")
+        finally:
+            context.summarizing = False
+            self.schedule_save()
+
+    def _extractive_summary(self, summary: str, messages: List[Dict[str, str]]) -> str:
+        """截取式摘要：在已有摘要后追加每条消息的开头部分"""
+        names = {"user": "用户", "assistant": "我"}
+        parts = [summary] if summary else []
+        for message in messages:
+            content = message["content"].replace("\n", " ")
+            parts.append(f"{names.get(message['role'], message['role'])}: {truncate_tokens(content, 30, keep_tail=False)}")
+        return "；".join(parts)
+
+    def load(self) -> None:
+        """从文件加载上下文"""
+        if not os.path.exists(self.data_file):
+            return
+        try:
+            with open(self.data_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"加载聊天上下文失败: {e}")
+            return
+        for key, item in data.items():
+            context = self.get(key)
+            context.summary = item.get("summary", "")
+            for turn in item.get("turns", []):
+                tokens = estimate_tokens(turn.get("content", "")) + MESSAGE_OVERHEAD
+                context.turns.append({"role": turn.get("role", "user"), "content": turn.get("content", ""),
+                                      "tokens": tokens})
+                context.tokens += tokens
+            # 配置的预算变小时，多出的旧消息直接截取进摘要
+            while len(context.turns) > 2 and (context.tokens > self.token_budget or
+                                              len(context.turns) > self.max_messages):
+                turn = context.turns.popleft()
+                context.tokens -= turn["tokens"]
+                context.summary = truncate_tokens(self._extractive_summary(context.summary, [turn]),
+                                                  self.summary_budget)
+        logger.info(f"已加载 {len(self.groups)} 个群的聊天上下文")
+
+    def schedule_save(self) -> None:
+        """延迟保存，合并短时间内的多次变更"""
+        if self._save_task is not None and not self._save_task.done():
+            return
+        try:
+            self._save_task = asyncio.create_task(self._save_later())
+        except RuntimeError:
+            # 没有运行中的事件循环时直接保存
+            self.save()
+
+    async def _save_later(self) -> None:
+        await asyncio.sleep(self.save_delay)
+        data = self._snapshot()
+        await asyncio.to_thread(self._write, data)
+
+    def _snapshot(self) -> Dict[str, Any]:
+        """生成可序列化的上下文快照（待压缩的消息也一并保存）"""
+        data = {}
+        for key, context in self.groups.items():
+            turns = list(context.pending) + [{"role": t["role"], "content": t["content"]} for t in context.turns]
+            if turns or context.summary:
+                data[key] = {"summary": context.summary, "turns": turns}
+        return data
+
+    def save(self) -> None:
+        """立即保存上下文"""
+        self._write(self._snapshot())
+
+    def _write(self, data: Dict[str, Any]) -> None:
+        start = time.perf_counter()
+        success = True
+        try:
+            os.makedirs(os.path.dirname(self.data_file) or ".", exist_ok=True)
+            temp_file = f"{self.data_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, self.data_file)
+        except Exception as e:
+            success = False
+            logger.error(f"保存聊天上下文失败: {e}")
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_flush(os.path.basename(self.data_file), time.perf_counter() - start, success)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+聊天插件的人格注册表
+
+- 人格设定保存在人格目录下的YAML文件中，文件名（不含扩展名）即人格标识
+- 启动时只扫描文件名，人格首次被使用时才解析文件并缓存
+- 文件修改时间变化后，下次使用时重新解析该文件
+- 各群分别记录使用的人格，保存到文件
+"""
+
+import os
+import json
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+import yaml
+
+logger = logging.getLogger("LCHBot")
+
+PERSONA_SUFFIXES = (".yml", ".yaml")
+
+class Persona:
+    """解析后的人格设定"""
+
+    __slots__ = ("key", "name", "prompt", "fallback_responses", "thinking_responses", "mtime")
+
+    def __init__(self, key: str, name: str, prompt: str, fallback_responses: List[str],
+                 thinking_responses: List[str], mtime: float):
+        self.key = key
+        self.name = name  # 显示名称
+        self.prompt = prompt  # 系统提示词
+        self.fallback_responses = fallback_responses  # 调用失败时的备用回复
+        self.thinking_responses = thinking_responses  # 等待回复时的临时回复
+        self.mtime = mtime  # 解析时文件的修改时间
+
+class PersonaRegistry:
+    """从人格目录按需加载人格设定"""
+
+    def __init__(self, directory: str, scan_interval: float = 5.0):
+        """
+        参数:
+            directory: 人格目录
+            scan_interval: 重新扫描目录的最小间隔（秒）
+        """
+        self.directory = directory
+        self.scan_interval = scan_interval
+
+        # {人格标识: 文件路径}
+        self.files: Dict[str, str] = {}
+        # {人格标识: Persona}
+        self.cache: Dict[str, Persona] = {}
+        self._scanned_at = 0.0
+        self.scan()
+
+    def scan(self) -> None:
+        """扫描人格目录中的文件名"""
+        self._scanned_at = time.monotonic()
+        files = {}
+        try:
+            for name in os.listdir(self.directory):
+                key, ext = os.path.splitext(name)
+                if ext.lower() in PERSONA_SUFFIXES:
+                    files[key.lower()] = os.path.join(self.directory, name)
+        except OSError as e:
+            logger.error(f"扫描人格目录 {self.directory} 失败: {e}")
+        self.files = files
+        # 文件已删除的人格不再保留缓存
+        for key in list(self.cache):
+            if key not in files:
+                del self.cache[key]
+
+    def _maybe_scan(self) -> None:
+        if time.monotonic() - self._scanned_at >= self.scan_interval:
+            self.scan()
+
+    def names(self) -> List[str]:
+        """可用的人格标识列表"""
+        self._maybe_scan()
+        return sorted(self.files)
+
+    def get(self, key: str) -> Optional[Persona]:
+        """
+        获取人格设定，首次使用或文件修改后重新解析
+
+        参数:
+            key: 人格标识
+        返回:
+            人格设定，不存在或解析失败时返回None（解析失败时保留之前的缓存）
+        """
+        key = key.lower()
+        path = self.files.get(key)
+        if path is None:
+            self.scan()
+            path = self.files.get(key)
+            if path is None:
+                return None
+
+        cached = self.cache.get(key)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            self.scan()
+            return None
+        if cached is not None and cached.mtime == mtime:
+            return cached
+
+        persona = self._parse(key, path, mtime)
+        if persona is None:
+            return cached
+        self.cache[key] = persona
+        logger.info(f"已{'重新' if cached else ''}加载人格「{persona.name}」: {path}")
+        return persona
+
+    def _parse(self, key: str, path: str, mtime: float) -> Optional[Persona]:
+        """解析人格文件"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data: Dict[str, Any] = yaml.safe_load(f) or {}
+            prompt = str(data.get("prompt", "")).strip()
+            if not prompt:
+                raise ValueError("缺少 prompt")
+            return Persona(
+                key=key,
+                name=str(data.get("name", key)),
+                prompt=prompt,
+                fallback_responses=[str(r) for r in data.get("fallback_responses") or []] or ["……"],
+                thinking_responses=[str(r) for r in data.get("thinking_responses") or []] or ["……"],
+                mtime=mtime
+            )
+        except Exception as e:
+            logger.error(f"解析人格文件 {path} 失败: {e}")
+            return None
+
+class GroupPersonas:
+    """各群使用的人格，未设置的群使用默认人格"""
+
+    def __init__(self, data_file: str = "data/chat_personas.json", default: str = "ailixiya"):
+        """
+        参数:
+            data_file: 保存文件
+            default: 默认人格标识
+        """
+        self.data_file = data_file
+        self.default = default
+        # {群号字符串: 人格标识}
+        self.groups: Dict[str, str] = {}
+        self.load()
+
+    def get(self, group_id: Any) -> str:
+        """获取群使用的人格标识"""
+        return self.groups.get(str(group_id), self.default)
+
+    def set(self, group_id: Any, key: str) -> None:
+        """设置群使用的人格并保存"""
+        if key == self.default:
+            self.groups.pop(str(group_id), None)
+        else:
+            self.groups[str(group_id)] = key
+        self.save()
+
+    def load(self) -> None:
+        """从文件加载"""
+        if not os.path.exists(self.data_file):
+            return
+        try:
+            with open(self.data_file, 'r', encoding='utf-8') as f:
+                self.groups = {str(k): str(v) for k, v in json.load(f).items()}
+        except Exception as e:
+            logger.error(f"加载群人格设置失败: {e}")
+
+    def save(self) -> None:
+        """保存到文件"""
+        try:
+            os.makedirs(os.path.dirname(self.data_file) or ".", exist_ok=True)
+            temp_file = f"{self.data_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.groups, f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, self.data_file)
+        except Exception as e:
+            logger.error(f"保存群人格设置失败: {e}")
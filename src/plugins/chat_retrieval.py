@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+聊天插件的本地资料检索
+
+- 将人格和世界观资料文本切分为段落块
+- 中日韩文本按字的二元组切词，其余文本按单词切词，建立BM25倒排索引
+- 每次请求只把与用户消息最相关的几个段落附加到提示词中
+- 索引保存到文件，资料文件未变化时启动直接加载
+"""
+
+import os
+import re
+import json
+import math
+import time
+import heapq
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger("LCHBot")
+
+# 索引文件格式版本，切词或分块规则变化时需要递增
+INDEX_VERSION = 1
+
+# 连续的中日韩字符，或连续的字母数字
+TOKEN_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+|[a-z0-9]+')
+CJK_START = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]')
+
+def tokenize(text: str) -> List[str]:
+    """
+    切词：中日韩字符串切为相邻两字的组合（单字串保留单字），字母数字按单词切分
+
+    参数:
+        text: 文本
+    返回:
+        词列表
+    """
+    tokens = []
+    for run in TOKEN_PATTERN.findall(text.lower()):
+        if CJK_START.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+def split_chunks(text: str, chunk_size: int = 300, min_line_length: int = 4) -> List[str]:
+    """
+    按行把文本合并为不超过指定长度的段落块
+
+    参数:
+        text: 文本
+        chunk_size: 每块的最大字符数，单行超过时单独成块并截断
+        min_line_length: 短于该长度的行（导航、按钮等）会被丢弃
+    返回:
+        段落块列表
+    """
+    chunks = []
+    current: List[str] = []
+    length = 0
+    for line in text.splitlines():
+        line = line.strip()
+        if len(line) < min_line_length:
+            continue
+        if length + len(line) > chunk_size and current:
+            chunks.append("\n".join(current))
+            current = []
+            length = 0
+        current.append(line[:chunk_size])
+        length += min(len(line), chunk_size)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+class LoreIndex:
+    """资料段落的BM25倒排索引"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks: List[str] = []  # 段落文本
+        self.sources: List[str] = []  # 段落来源文件名
+        self.lengths: List[int] = []  # 段落词数
+        # 倒排表 {词: [[段落序号, 词频], ...]}
+        self.postings: Dict[str, List[List[int]]] = {}
+        self.idf: Dict[str, float] = {}
+        self.avg_length = 0.0
+
+    def add(self, chunk: str, source: str) -> None:
+        """添加一个段落"""
+        doc_id = len(self.chunks)
+        counts = Counter(tokenize(chunk))
+        self.chunks.append(chunk)
+        self.sources.append(source)
+        self.lengths.append(sum(counts.values()))
+        for token, tf in counts.items():
+            self.postings.setdefault(token, []).append([doc_id, tf])
+
+    def finalize(self) -> None:
+        """计算平均长度和逆文档频率"""
+        total = len(self.chunks)
+        self.avg_length = sum(self.lengths) / total if total else 0.0
+        self.idf = {
+            token: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for token, docs in self.postings.items()
+        }
+
+    def search(self, query: str, top_k: int = 3, sources: Optional[List[str]] = None,
+               min_score: float = 0.0) -> List[Tuple[float, str, str]]:
+        """
+        检索与查询最相关的段落
+
+        参数:
+            query: 查询文本
+            top_k: 返回的段落数
+            sources: 只在这些来源文件中检索，为None时检索全部
+            min_score: 最低得分
+        返回:
+            [(得分, 来源文件名, 段落文本), ...]，按得分降序
+        """
+        allowed = set(sources) if sources is not None else None
+        scores: Dict[int, float] = {}
+        for token in set(tokenize(query)):
+            docs = self.postings.get(token)
+            if not docs:
+                continue
+            idf = self.idf[token]
+            for doc_id, tf in docs:
+                if allowed is not None and self.sources[doc_id] not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / self.avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(score, self.sources[doc_id], self.chunks[doc_id]) for doc_id, score in best if score > min_score]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"chunks": self.chunks, "sources": self.sources, "lengths": self.lengths, "postings": self.postings}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LoreIndex":
+        index = cls()
+        index.chunks = data["chunks"]
+        index.sources = data["sources"]
+        index.lengths = data["lengths"]
+        index.postings = data["postings"]
+        index.finalize()
+        return index
+
+class LoreRetriever:
+    """按需构建并查询资料索引"""
+
+    def __init__(self, files: List[str], index_file: str = "data/lore_index.json",
+                 chunk_size: int = 300, metrics=None):
+        """
+        参数:
+            files: 资料文件路径列表
+            index_file: 索引保存文件，资料文件未变化时直接加载
+            chunk_size: 段落块的最大字符数
+            metrics: 运行指标注册表
+        """
+        self.files = files
+        self.index_file = index_file
+        self.chunk_size = chunk_size
+        self.metrics = metrics
+        self.index: Optional[LoreIndex] = None
+        self._lock = asyncio.Lock()
+
+    def _fingerprint(self) -> Dict[str, Any]:
+        """资料文件的大小和修改时间，用于判断索引是否过期"""
+        files = {}
+        for path in self.files:
+            try:
+                stat = os.stat(path)
+                files[os.path.basename(path)] = [stat.st_size, int(stat.st_mtime)]
+            except OSError:
+                continue
+        return {"version": INDEX_VERSION, "chunk_size": self.chunk_size, "files": files}
+
+    def load_or_build(self) -> LoreIndex:
+        """加载索引文件，过期或不存在时重新构建并保存（同步执行，耗时较长）"""
+        start = time.perf_counter()
+        fingerprint = self._fingerprint()
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("fingerprint") == fingerprint:
+                    index = LoreIndex.from_dict(data["index"])
+                    logger.info(f"已加载资料索引: {len(index.chunks)} 个段落，耗时 {time.perf_counter() - start:.2f}s")
+                    return index
+            except Exception as e:
+                logger.warning(f"加载资料索引失败，将重新构建: {e}")
+
+        index = LoreIndex()
+        for path in self.files:
+            try:
+                with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                    text = f.read()
+            except OSError as e:
+                logger.warning(f"读取资料文件 {path} 失败: {e}")
+                continue
+            for chunk in split_chunks(text, self.chunk_size):
+                index.add(chunk, os.path.basename(path))
+        index.finalize()
+        logger.info(f"已构建资料索引: {len(self.files)} 个文件，{len(index.chunks)} 个段落，"
+                    f"耗时 {time.perf_counter() - start:.2f}s")
+
+        try:
+            os.makedirs(os.path.dirname(self.index_file) or ".", exist_ok=True)
+            with open(self.index_file, 'w', encoding='utf-8') as f:
+                json.dump({"fingerprint": fingerprint, "index": index.to_dict()}, f, ensure_ascii=False)
+        except Exception as e:
+            logger.warning(f"保存资料索引失败: {e}")
+        return index
+
+    async def ensure_loaded(self) -> LoreIndex:
+        """首次使用时在线程池中加载或构建索引"""
+        if self.index is None:
+            async with self._lock:
+                if self.index is None:
+                    self.index = await asyncio.to_thread(self.load_or_build)
+        return self.index
+
+    async def search(self, query: str, top_k: int = 3, sources: Optional[List[str]] = None) -> List[str]:
+        """
+        检索与查询最相关的段落
+
+        参数:
+            query: 查询文本
+            top_k: 返回的段落数
+            sources: 只在这些文件名中检索
+        返回:
+            段落文本列表
+        """
+        index = await self.ensure_loaded()
+        start = time.perf_counter()
+        results = index.search(query, top_k, sources)
+        if self.metrics is not None:
+            self.metrics.observe("lchbot_chat_retrieval_seconds", time.perf_counter() - start)
+        return [chunk for _, _, chunk in results]
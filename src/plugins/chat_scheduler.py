@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+聊天插件的大模型请求调度器
+
+- 限制全局和单个群同时进行的请求数
+- 各群的请求轮流调度，避免一个群占满上游容量
+- 同一用户连续@机器人时，尚未开始的旧请求合并到新请求中
+- 请求超过截止时间后不再调用或放弃等待，避免过时的回复
+- 对话摘要等后台请求优先级最低：只在没有可以启动的用户请求时才占用空闲容量，同样受并发上限和截止时间限制
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, Optional, Callable, Awaitable, Deque
+
+logger = logging.getLogger("LCHBot")
+
+# 请求结果状态
+STATUS_OK = "ok"  # 调用成功
+STATUS_FAILED = "failed"  # 调用出错
+STATUS_MERGED = "merged"  # 被同一用户的新请求合并
+STATUS_EXPIRED = "expired"  # 超过截止时间
+STATUS_REJECTED = "rejected"  # 群内排队已满
+
+class LLMJob:
+    """一次大模型请求"""
+
+    __slots__ = ("group_id", "user_id", "message_id", "text", "created_at", "deadline",
+                 "future", "started", "merged_count", "func")
+
+    def __init__(self, group_id: Any, user_id: Any, message_id: Any, text: str, deadline: float,
+                 func: Optional[Callable[[], Awaitable[Any]]] = None):
+        self.group_id = group_id
+        self.user_id = user_id
+        self.message_id = message_id
+        self.text = text
+        self.func = func  # 后台请求执行的协程函数，用户请求为None
+        self.created_at = time.monotonic()
+        self.deadline = deadline
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.started = False
+        self.merged_count = 0  # 合并进来的旧请求数量
+
+    def resolve(self, status: str, value: Any = None) -> None:
+        """设置请求结果，重复设置时忽略"""
+        if not self.future.done():
+            self.future.set_result((status, value))
+
+class LLMScheduler:
+    """按群公平调度的大模型请求队列"""
+
+    def __init__(self, runner: Callable[[LLMJob], Awaitable[Any]], max_concurrency: int = 4,
+                 group_concurrency: int = 1, max_queue_per_group: int = 5,
+                 deadline: float = 60.0, merge_superseded: bool = True, metrics=None):
+        """
+        参数:
+            runner: 执行请求的协程函数，返回None视为调用失败
+            max_concurrency: 全局同时进行的请求数上限
+            group_concurrency: 单个群同时进行的请求数上限
+            max_queue_per_group: 单个群排队请求数上限
+            deadline: 请求从提交到得到结果的最长时间（秒）
+            merge_superseded: 是否合并同一用户尚未开始的旧请求
+            metrics: 运行指标注册表
+        """
+        self.runner = runner
+        self.max_concurrency = max_concurrency
+        self.group_concurrency = group_concurrency
+        self.max_queue_per_group = max_queue_per_group
+        self.deadline = deadline
+        self.merge_superseded = merge_superseded
+        self.metrics = metrics
+
+        # 各群的排队请求 {group_id: deque([LLMJob, ...])}
+        self.queues: Dict[Any, Deque[LLMJob]] = {}
+        # 有排队请求的群，按轮询顺序排列
+        self.ready_groups: Deque[Any] = deque()
+        # 各群正在进行的请求数
+        self.group_running: Dict[Any, int] = {}
+        self.running = 0
+        # 低优先级的后台请求，不计入各群的并发数
+        self.background: Deque[LLMJob] = deque()
+
+        # 按结果状态统计的请求数
+        self.counts: Dict[str, int] = {}
+
+    def submit(self, group_id: Any, user_id: Any, message_id: Any, text: str) -> LLMJob:
+        """
+        提交请求
+
+        参数:
+            group_id: 群号
+            user_id: 用户QQ号
+            message_id: 触发请求的消息ID
+            text: 用户消息
+        返回:
+            请求对象，通过 wait(job) 获取结果；排队已满时结果立即为 rejected
+        """
+        job = LLMJob(group_id, user_id, message_id, text, time.monotonic() + self.deadline)
+        queue = self.queues.get(group_id)
+        if queue is None:
+            queue = self.queues[group_id] = deque()
+
+        # 同一用户尚未开始的旧请求合并到新请求中，旧请求不再单独回复
+        if self.merge_superseded:
+            for old in list(queue):
+                if old.user_id == user_id:
+                    queue.remove(old)
+                    job.text = f"{old.text}\n{job.text}"
+                    job.merged_count += old.merged_count + 1
+                    self._finish(old, STATUS_MERGED)
+
+        if len(queue) >= self.max_queue_per_group:
+            self._finish(job, STATUS_REJECTED)
+            return job
+
+        queue.append(job)
+        if group_id not in self.ready_groups:
+            self.ready_groups.append(group_id)
+        self._schedule()
+        return job
+
+    def submit_background(self, group_id: Any, func: Callable[[], Awaitable[Any]]) -> LLMJob:
+        """
+        提交低优先级的后台请求（如对话摘要）
+
+        参数:
+            group_id: 请求所属的群号，只用于日志
+            func: 执行请求的协程函数，返回None视为调用失败
+        返回:
+            请求对象，通过 wait(job) 获取结果
+        """
+        job = LLMJob(group_id, None, None, "", time.monotonic() + self.deadline, func)
+        self.background.append(job)
+        self._schedule()
+        return job
+
+    async def wait(self, job: LLMJob):
+        """
+        等待请求结果
+
+        参数:
+            job: submit 返回的请求对象
+        返回:
+            (状态, 结果)，排队超过截止时间的请求会被移出队列并返回 expired
+        """
+        remaining = job.deadline - time.monotonic()
+        try:
+            return await asyncio.wait_for(asyncio.shield(job.future), timeout=max(remaining, 0))
+        except asyncio.TimeoutError:
+            if not job.started and not job.future.done():
+                queue = self.background if job.func is not None else self.queues.get(job.group_id)
+                if queue is not None and job in queue:
+                    queue.remove(job)
+                    if not queue and job.func is None:
+                        del self.queues[job.group_id]
+                logger.info(f"群 {job.group_id} 用户 {job.user_id} 的请求排队超时，已放弃")
+                self._finish(job, STATUS_EXPIRED)
+            # 已开始的请求会在 _run 中按同一截止时间取消
+            return await job.future
+
+    def _schedule(self) -> None:
+        """在容量允许时按群轮流启动排队的请求"""
+        skipped = 0
+        while self.ready_groups and self.running < self.max_concurrency and skipped < len(self.ready_groups):
+            group_id = self.ready_groups.popleft()
+            queue = self.queues.get(group_id)
+            if not queue:
+                self.queues.pop(group_id, None)
+                continue
+            if self.group_running.get(group_id, 0) >= self.group_concurrency:
+                # 该群已达到并发上限，留在轮询队列末尾等待
+                self.ready_groups.append(group_id)
+                skipped += 1
+                continue
+            skipped = 0
+
+            job = queue.popleft()
+            if queue:
+                self.ready_groups.append(group_id)
+            else:
+                del self.queues[group_id]
+
+            if time.monotonic() >= job.deadline:
+                logger.info(f"群 {group_id} 用户 {job.user_id} 的请求排队超时，已放弃")
+                self._finish(job, STATUS_EXPIRED)
+                continue
+
+            self.running += 1
+            self.group_running[group_id] = self.group_running.get(group_id, 0) + 1
+            job.started = True
+            asyncio.create_task(self._run(job))
+
+        # 没有可以启动的用户请求时，用剩余容量执行后台请求
+        while self.background and self.running < self.max_concurrency and \
+                (not self.ready_groups or skipped >= len(self.ready_groups)):
+            job = self.background.popleft()
+            if time.monotonic() >= job.deadline:
+                self._finish(job, STATUS_EXPIRED)
+                continue
+            self.running += 1
+            job.started = True
+            asyncio.create_task(self._run(job))
+
+    async def _run(self, job: LLMJob) -> None:
+        """执行请求，超过截止时间时放弃等待"""
+        try:
+            remaining = job.deadline - time.monotonic()
+            call = job.func() if job.func is not None else self.runner(job)
+            result = await asyncio.wait_for(call, timeout=max(remaining, 0.001))
+            self._finish(job, STATUS_OK if result is not None else STATUS_FAILED, result)
+        except asyncio.TimeoutError:
+            logger.warning(f"群 {job.group_id} 用户 {job.user_id} 的请求超过截止时间，已取消")
+            self._finish(job, STATUS_EXPIRED)
+        except Exception as e:
+            logger.error(f"执行大模型请求出错: {e}", exc_info=True)
+            self._finish(job, STATUS_FAILED)
+        finally:
+            self.running -= 1
+            if job.func is None:
+                remaining_running = self.group_running.get(job.group_id, 1) - 1
+                if remaining_running > 0:
+                    self.group_running[job.group_id] = remaining_running
+                else:
+                    self.group_running.pop(job.group_id, None)
+            self._schedule()
+
+    def _finish(self, job: LLMJob, status: str, value: Any = None) -> None:
+        job.resolve(status, value)
+        self.counts[status] = self.counts.get(status, 0) + 1
+        if self.metrics is not None:
+            self.metrics.inc("lchbot_llm_jobs_total", status=status)
+            if status != STATUS_REJECTED:
+                self.metrics.observe("lchbot_llm_job_seconds", time.monotonic() - job.created_at, status=status)
+
+    def queued(self, group_id: Any = None) -> int:
+        """排队中的请求数，指定群号时只统计该群"""
+        if group_id is not None:
+            return len(self.queues.get(group_id, ()))
+        return sum(len(queue) for queue in self.queues.values())
+
+    def format_status(self) -> str:
+        """生成调度器状态描述"""
+        counts = "，".join(f"{status} {count}" for status, count in sorted(self.counts.items())) or "无"
+        return (f"进行中 {self.running}/{self.max_concurrency}，排队 {self.queued()}，"
+                f"排队的群 {len(self.queues)}，后台排队 {len(self.background)}，累计: {counts}")
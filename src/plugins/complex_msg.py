@@ -34,10 +34,10 @@ class ComplexMsg(Plugin):
         group_id = event.get('group_id') if message_type == 'group' else None
         
         # 获取机器人的QQ号
-        bot_qq = str(self.bot.config.get("bot", {}).get("self_id", ""))
+        bot_qq = self.bot.self_id
         
         # 检查是否是@机器人的消息
-        bot_qq = str(self.bot.config.get("bot", {}).get("self_id", ""))
+        bot_qq = self.bot.self_id
         
         # 提取命令
         is_at = handle_at_command(event, self.bot, re.compile(r'^/'))[0]
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+签到插件的抽奖引擎
+
+- 奖池权重和池内物品权重合并为一张别名表（Vose 别名法），每次抽取为O(1)，
+  与奖池和物品的数量无关
+- 别名表按抽奖配置的内容缓存，配置变化后自动重建
+- 一次批量抽取N次，只返回结果列表，积分和背包的修改由调用方在一个事务中完成
+"""
+
+import json
+import random
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+class AliasTable:
+    """按权重抽样的别名表，构建O(n)，每次抽样O(1)"""
+
+    __slots__ = ("size", "prob", "alias")
+
+    def __init__(self, weights: List[float]):
+        """
+        参数:
+            weights: 各项的权重，不能全部为0
+        """
+        total = float(sum(weights))
+        if not weights or total <= 0:
+            raise ValueError("权重列表为空或总权重不为正数")
+        self.size = len(weights)
+        self.prob = [0.0] * self.size
+        self.alias = [0] * self.size
+
+        scaled = [w * self.size / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+        # 剩余项的概率为1（浮点误差导致的残留也按1处理）
+        for i in large + small:
+            self.prob[i] = 1.0
+
+    def sample(self, rng=random) -> int:
+        """抽取一项，返回其索引"""
+        u = rng.random() * self.size
+        i = int(u)
+        return i if u - i < self.prob[i] else self.alias[i]
+
+    def sample_many(self, count: int, rng=random) -> List[int]:
+        """批量抽取 count 项"""
+        size, prob, alias, uniform = self.size, self.prob, self.alias, rng.random
+        result = []
+        append = result.append
+        for _ in range(count):
+            u = uniform() * size
+            i = int(u)
+            append(i if u - i < prob[i] else alias[i])
+        return result
+
+class DrawEngine:
+    """根据抽奖配置构建别名表并批量抽取"""
+
+    def __init__(self, draw_config: Dict[str, Any]):
+        """
+        参数:
+            draw_config: 抽奖配置，格式同 SignPoints.draw_config
+        """
+        self._signature: Optional[str] = None
+        self.entries: List[Tuple[str, Dict[str, Any]]] = []  # [(奖池名, 物品配置), ...]
+        self.probabilities: List[float] = []
+        self.table: Optional[AliasTable] = None
+        self.refresh(draw_config)
+
+    def refresh(self, draw_config: Dict[str, Any]) -> None:
+        """配置内容变化时重建别名表"""
+        signature = json.dumps(draw_config, sort_keys=True, ensure_ascii=False)
+        if signature == self._signature:
+            return
+        entries, weights = [], []
+        pools = draw_config.get("pools", {})
+        pool_total = sum(pool.get("weight", 0) for pool in pools.values())
+        for pool_name, pool in pools.items():
+            items = pool.get("items", [])
+            item_total = sum(item.get("weight", 0) for item in items)
+            if pool_total <= 0 or item_total <= 0:
+                continue
+            for item in items:
+                # 物品的实际概率 = 奖池概率 × 物品在池内的概率
+                weight = pool.get("weight", 0) / pool_total * item.get("weight", 0) / item_total
+                if weight > 0:
+                    entries.append((pool_name, item))
+                    weights.append(weight)
+        total = sum(weights)
+        self.entries = entries
+        self.probabilities = [w / total for w in weights] if total > 0 else []
+        self.table = AliasTable(weights) if entries else None
+        self._signature = signature
+
+    def draw(self, count: int, rng=random) -> List[Dict[str, Any]]:
+        """
+        批量抽取
+
+        参数:
+            count: 抽取次数
+            rng: 随机数生成器
+        返回:
+            [物品结果, ...]，每项为物品配置的副本，附带 pool，经验卡类物品附带 bonus_points
+        """
+        if self.table is None or count <= 0:
+            return []
+        results = []
+        for index in self.table.sample_many(count, rng):
+            pool_name, item = self.entries[index]
+            result = dict(item)
+            result["pool"] = pool_name
+            if "min_points" in item and "max_points" in item:
+                bonus_points = rng.randint(item["min_points"], item["max_points"])
+                result["bonus_points"] = bonus_points
+                result["description"] = f"获得{bonus_points}积分的经验卡"
+            results.append(result)
+        return results
+
+    def simulate(self, count: int, rng=None) -> Dict[str, Any]:
+        """
+        蒙特卡洛模拟，检查实际抽取频率与配置的概率是否一致（同步执行，大量次数时应放到线程池中）
+
+        参数:
+            count: 模拟次数
+            rng: 随机数生成器，默认使用新的独立实例
+        返回:
+            {"count": 次数, "items": [(奖池名, 物品名, 配置概率, 实际频率), ...],
+             "bonus_points": 平均每次获得的积分, "expected_bonus_points": 平均每次获得积分的期望}
+        """
+        rng = rng or random.Random()
+        if self.table is None or count <= 0:
+            return {"count": 0, "items": [], "bonus_points": 0.0, "expected_bonus_points": 0.0}
+        counts = Counter(self.table.sample_many(count, rng))
+        bonus_total = 0
+        expected_bonus = 0.0
+        items = []
+        for index, (pool_name, item) in enumerate(self.entries):
+            hits = counts.get(index, 0)
+            if "min_points" in item and "max_points" in item:
+                low, high = item["min_points"], item["max_points"]
+                bonus_total += sum(rng.randint(low, high) for _ in range(hits))
+                expected_bonus += self.probabilities[index] * (low + high) / 2
+            items.append((pool_name, item["name"], self.probabilities[index], hits / count))
+        return {
+            "count": count,
+            "items": items,
+            "bonus_points": bonus_total / count,
+            "expected_bonus_points": expected_bonus
+        }
@@ -49,5 +49,14 @@ class Echo(Plugin):
             
         return False  # 未处理该消息
 
+# 插件元数据，用于延迟加载
+plugin_meta = {
+    "class": "Echo",
+    "events": ["message"],
+    "triggers": [
+        r"/echo\s"
+    ]
+}
+
 # 导出插件类，确保插件加载器能找到它
 plugin_class = Echo 
\ No newline at end of file
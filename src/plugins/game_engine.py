@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+文字游戏的房间状态和回合调度
+
+- 每个群最多一个游戏房间，房间和玩家状态使用 __slots__ 保存
+- 各游戏类型在各阶段的处理函数登记在一张调度表中，键为 (游戏类型, 阶段)；
+  群消息先按群号查找房间（没有游戏的群只有这一次字典查找），再直接找到当前阶段的处理函数
+- 房间超时由定时器触发，收到消息时只更新最后活动时间，定时器到期时再按剩余时间重新设置
+"""
+
+import time
+import random
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
+
+logger = logging.getLogger("LCHBot")
+
+# 房间阶段
+WAITING = "waiting"  # 等待玩家加入
+START = "start"      # 房主开始游戏（只在开始时调用一次）
+RUNNING = "running"  # 游戏中
+ENDED = "ended"      # 已结束
+
+# 子弹类型
+BLANK_BULLET = 1  # 空包弹
+LIVE_BULLET = 2   # 实弹
+
+class Player:
+    """房间中的一名玩家"""
+
+    __slots__ = ("user_id", "name", "health", "items", "effects", "eliminated")
+
+    def __init__(self, user_id: int, name: str, health: int = 0):
+        self.user_id = user_id
+        self.name = name
+        self.health = health        # 血量（恶魔轮盘）
+        self.items: List[str] = []  # 持有的道具（恶魔轮盘）
+        self.effects = set()        # 生效中的状态: shield(护盾), evasion(闪避), defense(防弹衣)
+        self.eliminated = False     # 是否已被淘汰
+
+class GameRoom:
+    """一个群的游戏房间"""
+
+    __slots__ = ("game_type", "group_id", "status", "host_id", "host_name", "players", "members",
+                 "max_players", "create_time", "start_time", "last_activity", "round", "data",
+                 "current_player_index", "mentioned_player_id", "current_bullet_type",
+                 "skip_next_player", "bullets", "timer")
+
+    def __init__(self, game_type: str, host_id: int, host_name: str, group_id: int,
+                 max_players: int = 8, health: int = 0):
+        """
+        参数:
+            game_type: 游戏类型
+            host_id: 房主QQ号，房主自动加入
+            host_name: 房主昵称
+            group_id: 群号
+            max_players: 玩家人数上限
+            health: 玩家初始血量
+        """
+        self.game_type = game_type
+        self.group_id = group_id
+        self.status = WAITING
+        self.host_id = host_id
+        self.host_name = host_name
+        self.players: List[int] = []            # 玩家行动顺序
+        self.members: Dict[int, Player] = {}    # {QQ号: 玩家}
+        self.max_players = max_players
+        self.create_time = int(time.time())
+        self.start_time = 0
+        self.last_activity = time.monotonic()
+        self.round = 0
+        self.data: Dict[str, Any] = {}          # 游戏特定数据
+        self.current_player_index = 0
+        self.mentioned_player_id: Optional[int] = None  # 当前消息中被@的玩家
+        self.current_bullet_type = 0            # 当前子弹类型，0为未装填
+        self.skip_next_player: Optional[int] = None     # 跳过下一个回合的玩家
+        self.bullets: List[int] = []            # 本回合剩余的子弹
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.add_player(host_id, host_name, health)
+
+    def add_player(self, player_id: int, player_name: str, health: int = 0) -> bool:
+        """添加玩家，已在房间中或房间已满时返回False"""
+        if player_id in self.members or len(self.players) >= self.max_players:
+            return False
+        self.players.append(player_id)
+        self.members[player_id] = Player(player_id, player_name, health)
+        self.update_activity()
+        return True
+
+    def start_game(self) -> bool:
+        """开始游戏，随机打乱玩家顺序"""
+        if self.status != WAITING or len(self.players) < 2:
+            return False
+        self.status = RUNNING
+        self.start_time = int(time.time())
+        self.update_activity()
+        self.round = 1
+        random.shuffle(self.players)
+        self.current_player_index = 0
+        return True
+
+    def update_activity(self) -> None:
+        self.last_activity = time.monotonic()
+
+    def idle_time(self) -> float:
+        """距最后活动的秒数"""
+        return time.monotonic() - self.last_activity
+
+    def is_host(self, user_id: int) -> bool:
+        return user_id == self.host_id
+
+    def is_player(self, user_id: int) -> bool:
+        return user_id in self.members
+
+    def player(self, user_id: int) -> Optional[Player]:
+        return self.members.get(user_id)
+
+    def name_of(self, user_id: int) -> str:
+        member = self.members.get(user_id)
+        return member.name if member is not None else str(user_id)
+
+    def alive_players(self) -> List[int]:
+        """未被淘汰的玩家，按行动顺序"""
+        return [pid for pid in self.players if not self.members[pid].eliminated]
+
+    def get_player_count(self) -> int:
+        return len(self.players)
+
+    def get_player_list_text(self) -> str:
+        return "\n".join(
+            f"{'👑 ' if player_id == self.host_id else '🎮 '}{member.name}"
+            for player_id, member in self.members.items()
+        )
+
+    def format_room_info(self) -> str:
+        """格式化房间信息"""
+        status_text = "等待中" if self.status == WAITING else "游戏中" if self.status == RUNNING else "已结束"
+        join_hint = "🎮 输入「加入游戏」参与\n⏱️ 人数满2人后，房主可发送「开始游戏」" if self.status == WAITING else ""
+        return (
+            f"【{self.game_type}】房间信息\n"
+            f"状态: {status_text}\n"
+            f"房主: {self.host_name}\n"
+            f"玩家数: {len(self.players)}/{self.max_players}\n\n"
+            f"玩家列表:\n{self.get_player_list_text()}\n\n"
+            f"{join_hint}"
+        )
+
+    def get_current_player_id(self) -> int:
+        if not self.players:
+            return 0
+        return self.players[self.current_player_index]
+
+    def get_current_player_name(self) -> str:
+        return self.name_of(self.get_current_player_id())
+
+    def next_player(self) -> int:
+        """切换到下一个未淘汰的玩家，跳过被【跳过】道具指定的玩家一次，返回新的玩家QQ号"""
+        if not self.players:
+            return 0
+        for _ in range(len(self.players)):
+            self.current_player_index = (self.current_player_index + 1) % len(self.players)
+            next_player_id = self.get_current_player_id()
+            if self.members[next_player_id].eliminated:
+                continue
+            if self.skip_next_player == next_player_id:
+                self.skip_next_player = None
+                continue
+            return next_player_id
+        # 没有其他可行动的玩家（游戏应在只剩一名玩家时结束）
+        return self.get_current_player_id()
+
+    def load_bullet(self) -> int:
+        """随机装填一发子弹（空包弹和实弹各50%），返回子弹类型"""
+        self.current_bullet_type = random.choice((BLANK_BULLET, LIVE_BULLET))
+        return self.current_bullet_type
+
+    def generate_bullets(self, count: int) -> List[int]:
+        """生成本回合的子弹"""
+        self.bullets = [random.choice((BLANK_BULLET, LIVE_BULLET)) for _ in range(count)]
+        return self.bullets
+
+    def get_bullet_name(self) -> str:
+        return {BLANK_BULLET: "空包弹", LIVE_BULLET: "实弹"}.get(self.current_bullet_type, "未知")
+
+    def get_bullet_emoji(self) -> str:
+        return {BLANK_BULLET: "🎭", LIVE_BULLET: "🔴"}.get(self.current_bullet_type, "❓")
+
+# 阶段处理函数: (房间, 事件, 消息文本) -> 是否已处理
+Handler = Callable[[GameRoom, Dict[str, Any], str], Awaitable[bool]]
+
+class GameEngine:
+    """管理各群的游戏房间，把群消息分发给房间当前阶段的处理函数"""
+
+    def __init__(self, on_timeout: Callable[[GameRoom], Awaitable[None]],
+                 waiting_timeout: float = 300, running_timeout: float = 600):
+        """
+        参数:
+            on_timeout: 房间超时关闭后调用，用于发送提示
+            waiting_timeout: 等待玩家阶段的超时时间（秒）
+            running_timeout: 游戏中无人回应的超时时间（秒）
+        """
+        self.on_timeout = on_timeout
+        self.waiting_timeout = waiting_timeout
+        self.running_timeout = running_timeout
+        # {群号: 房间}
+        self.rooms: Dict[int, GameRoom] = {}
+        # 调度表 {(游戏类型, 阶段): 处理函数}
+        self.handlers: Dict[Tuple[str, str], Handler] = {}
+
+    def register(self, game_type: str, phase: str, handler: Handler) -> None:
+        self.handlers[(game_type, phase)] = handler
+
+    def get(self, group_id: int) -> Optional[GameRoom]:
+        """获取群中未结束的房间"""
+        room = self.rooms.get(group_id)
+        if room is not None and room.status == ENDED:
+            self.close(group_id)
+            return None
+        return room
+
+    def open(self, room: GameRoom) -> None:
+        """登记新房间并开始计时"""
+        self.close(room.group_id)
+        self.rooms[room.group_id] = room
+        self._arm(room, self._timeout_for(room))
+
+    def close(self, group_id: int) -> Optional[GameRoom]:
+        """移除房间并取消计时"""
+        room = self.rooms.pop(group_id, None)
+        if room is not None and room.timer is not None:
+            room.timer.cancel()
+            room.timer = None
+        return room
+
+    def close_all(self) -> None:
+        """取消全部房间的计时并移除房间（插件卸载时调用）"""
+        for group_id in list(self.rooms):
+            self.close(group_id)
+
+    def release(self) -> Dict[int, GameRoom]:
+        """交出全部房间（热重载时调用），取消计时后由新版本插件的 adopt 接收"""
+        rooms = self.rooms
+        self.rooms = {}
+        for room in rooms.values():
+            if room.timer is not None:
+                room.timer.cancel()
+                room.timer = None
+        return rooms
+
+    def adopt(self, rooms: Dict[int, Any]) -> None:
+        """接收旧版本插件的房间并重新计时，不是本模块房间对象的会被丢弃"""
+        for group_id, room in rooms.items():
+            if isinstance(room, GameRoom) and room.status != ENDED:
+                self.rooms[group_id] = room
+                self._arm(room, max(0.0, self._timeout_for(room) - room.idle_time()))
+            else:
+                logger.warning(f"丢弃无法交接的游戏房间: 群 {group_id}")
+
+    async def dispatch(self, group_id: int, event: Dict[str, Any], message: str) -> Optional[bool]:
+        """
+        把群消息交给房间当前阶段的处理函数
+
+        返回:
+            处理函数的结果；群中没有房间时返回None
+        """
+        room = self.rooms.get(group_id)
+        if room is None:
+            return None
+        handler = self.handlers.get((room.game_type, room.status))
+        if handler is None:
+            if room.status == ENDED:
+                self.close(group_id)
+            return None
+        handled = await handler(room, event, message)
+        if room.status == ENDED:
+            if self.rooms.get(group_id) is room:
+                self.close(group_id)
+        elif handled:
+            room.update_activity()
+        return handled
+
+    async def start(self, room: GameRoom, event: Dict[str, Any]) -> bool:
+        """开始游戏并调用该游戏类型的开始处理函数"""
+        if not room.start_game():
+            return False
+        # 游戏中使用游戏中的超时时间
+        self._arm(room, self.running_timeout)
+        handler = self.handlers.get((room.game_type, START))
+        if handler is not None:
+            await handler(room, event, "")
+        return True
+
+    def _timeout_for(self, room: GameRoom) -> float:
+        return self.waiting_timeout if room.status == WAITING else self.running_timeout
+
+    def _arm(self, room: GameRoom, delay: float) -> None:
+        if room.timer is not None:
+            room.timer.cancel()
+        room.timer = asyncio.get_running_loop().call_later(delay, self._expire, room)
+
+    def _expire(self, room: GameRoom) -> None:
+        """定时器到期：仍有活动时按剩余时间重新计时，否则关闭房间"""
+        room.timer = None
+        if self.rooms.get(room.group_id) is not room:
+            return
+        remaining = self._timeout_for(room) - room.idle_time()
+        if remaining > 0:
+            self._arm(room, remaining)
+            return
+        logger.info(f"游戏房间 {room.group_id} 超时（{'等待玩家' if room.status == WAITING else '游戏中'}）")
+        self.close(room.group_id)
+        asyncio.ensure_future(self.on_timeout(room))
@@ -158,5 +158,14 @@ class Help(Plugin):
             
         return False  # 未处理该消息
 
+# 插件元数据，用于延迟加载
+plugin_meta = {
+    "class": "Help",
+    "events": ["message"],
+    "triggers": [
+        r"/help"
+    ]
+}
+
 # 导出插件类，确保插件加载器能找到它
 plugin_class = Help 
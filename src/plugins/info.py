@@ -74,5 +74,14 @@ class Info(Plugin):
             
         return False  # 未处理该消息 
 
+# 插件元数据，用于延迟加载
+plugin_meta = {
+    "class": "Info",
+    "events": ["message"],
+    "triggers": [
+        r"/info"
+    ]
+}
+
 # 导出插件类，确保插件加载器能找到它
 plugin_class = Info 
\ No newline at end of file
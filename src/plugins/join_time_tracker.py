@@ -122,10 +122,12 @@ class JoinTimeTracker(Plugin):
             current_time - self.cache_update_time[group_id] < self.cache_expire_time
         ):
             logger.debug(f"使用缓存的群成员信息，群号: {group_id}")
+            self.bot.metrics.record_cache("group_members", hit=True)
             return list(self.group_members_cache[group_id].values())
         
         # 缓存无效或不存在，重新获取
         logger.debug(f"重新获取群成员信息，群号: {group_id}")
+        self.bot.metrics.record_cache("group_members", hit=False)
         
         # 调用OneBot API获取群成员列表
         data = {
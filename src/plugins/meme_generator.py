@@ -55,7 +55,7 @@ class MemeGenerator(Plugin):
         raw_message = event.get('raw_message', '')
         
         # 获取机器人的QQ号
-        bot_qq = str(self.bot.config.get("bot", {}).get("self_id", ""))
+        bot_qq = self.bot.self_id
         
         # 检查是否是@机器人的消息并且包含/meme命令
         is_at_command, match, command = handle_at_command(event, self.bot, self.command_pattern)
@@ -219,5 +219,14 @@ class MemeGenerator(Plugin):
         
         return result_path
 
+# 插件元数据，用于延迟加载
+plugin_meta = {
+    "class": "MemeGenerator",
+    "events": ["message"],
+    "triggers": [
+        r"/meme"
+    ]
+}
+
 # 导出插件类，确保插件加载器能找到它
 plugin_class = MemeGenerator 
\ No newline at end of file
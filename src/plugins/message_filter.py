@@ -3,62 +3,46 @@ import json
 from typing import Dict, Any, List, Optional
 
 from src.plugin_system import Plugin
+from admission import BLOCKED, USER, GROUP, Rule, make_key
 
 logger = logging.getLogger('LCHBot')
 
+# 在准入过滤中注册的来源名称
+ADMISSION_SOURCE = "message_filter"
+
 class MessageFilter(Plugin):
-    """消息过滤插件，用于过滤来自特定QQ号的消息"""
-    
+    """消息过滤插件，用于过滤来自特定QQ号或群的群消息
+
+    屏蔽名单注册到机器人的准入过滤中，消息在分发给插件之前丢弃，本插件不再逐条检查消息
+    """
+
     def __init__(self, bot):
         super().__init__(bot)
         self.name = "MessageFilter"
         self.priority = 999  # 设置高优先级，确保在其他插件之前处理
-        
+
+        config = self.bot.config.get("message_filter", {})
         # 需要屏蔽的QQ号列表
-        self.blocked_qq_list = [
+        self.blocked_qq_list = config.get("blocked_users", [
             2854196310,  # Q群管家
-            # 可以添加更多需要屏蔽的QQ号
-        ]
-        
-        # 记录屏蔽消息统计
-        self.blocked_count = 0
-        
-        logger.info(f"插件 {self.name} (ID: {self.id}) 已初始化，当前屏蔽用户数: {len(self.blocked_qq_list)}")
+        ])
+        # 需要屏蔽的群列表
+        self.blocked_groups = config.get("blocked_groups", [])
+
+        rules = {}
+        for scope, targets in ((USER, self.blocked_qq_list), (GROUP, self.blocked_groups)):
+            for target in targets:
+                key = make_key(scope, target)
+                if key is not None:
+                    rules[key] = Rule(BLOCKED, ADMISSION_SOURCE)
+        self.bot.admission.set_source(ADMISSION_SOURCE, rules)
+
+        logger.info(f"插件 {self.name} (ID: {self.id}) 已初始化，当前屏蔽用户数: {len(self.blocked_qq_list)}，屏蔽群数: {len(self.blocked_groups)}")
 
-    async def handle_message(self, event: Dict[str, Any]) -> bool:
-        """处理消息事件，返回True表示消息被屏蔽，不再继续处理"""
-        # 只处理群聊消息
-        if event.get('message_type') != 'group':
-            return False
-            
-        # 获取发送者QQ号
-        user_id = event.get('user_id')
-        if not user_id:
-            return False
-            
-        # 检查是否在屏蔽列表中
-        if user_id in self.blocked_qq_list:
-            sender_name = event.get('sender', {}).get('nickname', str(user_id))
-            group_id = event.get('group_id', '未知群')
-            message = event.get('raw_message', '')[:30]  # 只记录前30个字符
-            
-            logger.info(f"已屏蔽来自 {sender_name}({user_id}) 在群 {group_id} 的消息: {message}...")
-            self.blocked_count += 1
-            
-            # 返回True表示消息已处理，阻止其他插件处理
-            return True
-            
-        return False
-        
-    async def handle_notice(self, event: Dict[str, Any]) -> bool:
-        """处理通知事件"""
-        # 可以根据需要屏蔽特定用户的通知事件
-        return False
-        
-    async def handle_request(self, event: Dict[str, Any]) -> bool:
-        """处理请求事件"""
-        # 可以根据需要屏蔽特定用户的请求事件
-        return False
+    @property
+    def blocked_count(self) -> int:
+        """屏蔽的消息数"""
+        return self.bot.admission.drops[BLOCKED]
 
 # 导出插件类，确保插件加载器能找到它
-plugin_class = MessageFilter 
\ No newline at end of file
+plugin_class = MessageFilter
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+签到积分账本
+
+- 积分的增减都通过 PointsLedger.transact 完成：余额检查、扣除和同一操作的其他修改（背包物品、签到记录）
+  在状态存储的一次原子更新中完成，其他进程同时修改同一个群时不会丢失更新
+- 跨越 await 的操作（如使用物品时等待用户选择目标）先取得该用户的锁；
+  锁按 (群号, QQ号) 哈希分为固定数量的条带，不同用户的操作互不等待，也没有全局锁
+- 每笔操作可以带幂等键（通常由消息ID生成），群记录中保留最近的幂等键，
+  同一条消息重复投递时直接返回第一次的结果
+- 每笔成功的操作追加一行到该群的交易日志（JSON Lines），记录变化量和操作后的余额，
+  可以从日志重建各用户的余额并与存储中的余额核对
+"""
+
+import os
+import json
+import time
+import zlib
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+logger = logging.getLogger("LCHBot")
+
+class LedgerResult:
+    """一笔积分操作的结果"""
+
+    __slots__ = ("ok", "duplicate", "balance", "delta", "seq")
+
+    def __init__(self, ok: bool, balance: int, delta: int = 0, seq: int = 0, duplicate: bool = False):
+        self.ok = ok                # 是否成功（积分不足时为False）
+        self.duplicate = duplicate  # 是否为重复的操作（幂等键已存在）
+        self.balance = balance      # 操作后的余额（失败时为当前余额）
+        self.delta = delta          # 实际变化量（余额不会低于0）
+        self.seq = seq              # 群内的交易序号
+
+def new_user_data() -> Dict[str, Any]:
+    """新用户的签到数据"""
+    return {
+        "total_points": 0,
+        "sign_count": 0,
+        "consecutive_days": 0,
+        "last_sign_date": "",
+        "history": []
+    }
+
+class PointsLedger:
+    """签到积分的原子增减、用户锁、幂等键和交易日志"""
+
+    def __init__(self, store, namespace: str, log_dir: str = "data/ledger",
+                 stripes: int = 64, recent_keys: int = 512):
+        """
+        参数:
+            store: 共享状态存储
+            namespace: 签到数据的命名空间，每个群一条记录
+            log_dir: 交易日志目录，每个群一个文件
+            stripes: 用户锁的条带数
+            recent_keys: 每个群保留的最近幂等键数量
+        """
+        self.store = store
+        self.namespace = namespace
+        self.log_dir = log_dir
+        self.recent_keys = recent_keys
+        self._locks = [asyncio.Lock() for _ in range(stripes)]
+        self.duplicates = 0  # 因幂等键重复而跳过的操作数
+
+    def lock(self, group_id: str, user_id: str) -> asyncio.Lock:
+        """获取用户的锁，同一用户的操作按顺序执行"""
+        index = zlib.crc32(f"{group_id}:{user_id}".encode("utf-8")) % len(self._locks)
+        return self._locks[index]
+
+    def transact(self, group_id: str, user_id: str, delta: int, reason: str,
+                 key: Optional[str] = None, required: int = 0,
+                 mutate: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None,
+                 fallback: Optional[Dict[str, Any]] = None) -> Tuple[LedgerResult, Dict[str, Any]]:
+        """
+        原子地修改用户积分
+
+        参数:
+            group_id: 群号
+            user_id: 用户QQ号
+            delta: 积分变化量，可为负数；余额不会低于0
+            reason: 操作类型，写入交易日志
+            key: 幂等键，已存在时不做任何修改
+            required: 余额少于该值时不做任何修改（用于扣除积分前检查余额）
+            mutate: 成功时在同一事务中执行的其他修改，参数为 (群数据, 用户数据)；
+                返回False时积分不变，也不记录交易
+            fallback: 存储中没有该群记录时使用的群数据
+        返回:
+            (操作结果, 更新后的群数据)
+        """
+        outcome: Dict[str, Any] = {}
+
+        def _apply(group_data: Dict[str, Any]) -> Dict[str, Any]:
+            group_data = group_data or fallback
+            ledger = group_data.setdefault("ledger", {"seq": 0, "recent": {}})
+            user_data = group_data["users"].setdefault(user_id, new_user_data())
+            balance = user_data.get("total_points", 0)
+
+            if key is not None and key in ledger["recent"]:
+                seq, applied = ledger["recent"][key]
+                outcome["result"] = LedgerResult(True, balance, applied, seq, duplicate=True)
+                return group_data
+            if balance < required:
+                outcome["result"] = LedgerResult(False, balance)
+                return group_data
+
+            new_balance = max(0, balance + delta)
+            user_data["total_points"] = new_balance
+            if mutate is not None and mutate(group_data, user_data) is False:
+                user_data["total_points"] = balance
+                outcome["result"] = LedgerResult(False, balance)
+                return group_data
+            ledger["seq"] += 1
+            applied = new_balance - balance
+            if key is not None:
+                recent = ledger["recent"]
+                recent[key] = [ledger["seq"], applied]
+                # 只保留最近的幂等键（按插入顺序淘汰）
+                while len(recent) > self.recent_keys:
+                    del recent[next(iter(recent))]
+            outcome["result"] = LedgerResult(True, new_balance, applied, ledger["seq"])
+            outcome["entry"] = {
+                "seq": ledger["seq"],
+                "time": int(time.time()),
+                "user": user_id,
+                "delta": applied,
+                "balance": new_balance,
+                "reason": reason,
+                "key": key
+            }
+            return group_data
+
+        group_data = self.store.update(self.namespace, group_id, _apply)
+        result = outcome["result"]
+        if result.duplicate:
+            self.duplicates += 1
+            logger.info(f"忽略重复的积分操作: 群 {group_id} 用户 {user_id} {reason} ({key})")
+        elif "entry" in outcome:
+            self._append_log(group_id, outcome["entry"])
+        return result, group_data
+
+    def _log_path(self, group_id: str) -> str:
+        return os.path.join(self.log_dir, f"{group_id}.jsonl")
+
+    def _append_log(self, group_id: str, entry: Dict[str, Any]) -> None:
+        try:
+            os.makedirs(self.log_dir, exist_ok=True)
+            with open(self._log_path(group_id), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        except OSError as e:
+            logger.error(f"写入积分交易日志失败: {e}")
+
+    def read_log(self, group_id: str) -> List[Dict[str, Any]]:
+        """读取群的交易日志，按交易序号排序"""
+        path = self._log_path(group_id)
+        if not os.path.exists(path):
+            return []
+        entries = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        entries.sort(key=lambda entry: entry.get("seq", 0))
+        return entries
+
+    def rebuild_balances(self, group_id: str) -> Dict[str, int]:
+        """
+        从交易日志重建余额
+
+        返回:
+            {QQ号: 余额}，只包含日志中出现过的用户
+        """
+        balances: Dict[str, int] = {}
+        for entry in self.read_log(group_id):
+            user_id = entry.get("user")
+            # 每个用户的第一笔记录之前的余额为 balance - delta（账本启用前的积分）
+            if user_id not in balances:
+                balances[user_id] = entry.get("balance", 0) - entry.get("delta", 0)
+            balances[user_id] = max(0, balances[user_id] + entry.get("delta", 0))
+        return balances
+
+    def verify(self, group_id: str, users: Dict[str, Dict[str, Any]]) -> List[Tuple[str, int, int]]:
+        """
+        核对交易日志重建的余额与存储中的余额
+
+        返回:
+            [(QQ号, 日志余额, 存储余额), ...]，只包含不一致的用户
+        """
+        mismatches = []
+        for user_id, balance in self.rebuild_balances(group_id).items():
+            stored = users.get(user_id, {}).get("total_points", 0)
+            if stored != balance:
+                mismatches.append((user_id, balance, stored))
+        return mismatches
@@ -4,7 +4,6 @@
 import re
 import logging
 import time
-import json
 import os
 import sys
 from typing import Dict, Any, List, Set, Optional, Tuple
@@ -18,14 +17,24 @@ if parent_dir not in sys.path:
 
 # 导入Plugin基类
 from plugin_system import Plugin
+from state_store import MISSING, import_legacy_file
+from admission import EXEMPT, RATE_LIMITED, USER, Rule, make_key
 
 logger = logging.getLogger("LCHBot")
 
+# 拉黑记录在共享状态存储中的命名空间，每个用户一条 {"expires": 到期时间, "notified": 是否已提示}
+RATE_LIMIT_NAMESPACE = "rate_limit_blocks"
+# 白名单在准入过滤中的来源名称，拉黑记录的来源名称为 RATE_LIMIT_NAMESPACE
+WHITELIST_SOURCE = "rate_limit_whitelist"
+
 class RateLimiter(Plugin):
     """
     用户访问限制插件
     功能：限制用户API调用频率，防止刷屏，超过访问限制会被临时拉黑
     这是一个全局生效的插件，不区分群组
+    
+    拉黑记录和白名单注册到机器人的准入过滤中，被拉黑用户的消息在分发给插件之前丢弃，
+    本插件只统计放行的群消息
     """
     
     def __init__(self, bot):
@@ -45,76 +54,77 @@ class RateLimiter(Plugin):
         # 添加Q群管家到白名单
         self.whitelist_users.add(2854196310)  # Q群管家QQ号
         
-        # 用户请求记录 {user_id: [(timestamp, count)]}
+        # 用户请求记录 {user_id: [(timestamp, count)]}，只在本进程内统计，不持久化
         self.user_requests: Dict[int, List[Tuple[float, int]]] = {}
-        # 被拉黑用户 {user_id: expiry_time}
-        self.blacklisted_users: Dict[int, float] = {}
-        # 已提示过的拉黑用户（避免重复提示）
-        self.notified_users: Set[int] = set()
-        
-        # 持久化数据文件
-        self.data_file = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 
-                                    "data", "rate_limiter.json")
         
-        # 创建数据目录（如果不存在）
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-        
-        # 加载数据
-        self.load_data()
+        # 拉黑记录保存在共享状态存储中，多个机器人进程共用
+        self.store = self.bot.state_store
+        # 首次运行时导入旧的数据文件
+        import_legacy_file(self.store, RATE_LIMIT_NAMESPACE, "data/rate_limiter.json", self._convert_legacy_data)
+        self.cleanup_expired()
+        
+        # 注册到准入过滤：白名单和超级用户不受限制（避免管理员无法使用 /rate 命令解除自己的限制），
+        # 其他进程的拉黑记录按准入过滤的刷新间隔生效
+        self.admission = self.bot.admission
+        superusers = self.bot.config.get("bot", {}).get("superusers", [])
+        self.admission.set_source(WHITELIST_SOURCE, {
+            key: Rule(EXEMPT, WHITELIST_SOURCE)
+            for key in (make_key(USER, uid) for uid in list(self.whitelist_users) + list(superusers))
+            if key is not None
+        })
+        self.admission.set_source(RATE_LIMIT_NAMESPACE, self._load_rules(), loader=self._load_rules)
+        self.admission.set_notifier(RATE_LIMITED, self._notify_blocked)
         
         logger.info(f"访问限制插件已初始化，全局生效模式")
     
-    def save_data(self) -> None:
-        """保存数据到文件"""
-        data = {
-            "blacklisted_users": {
-                str(user_id): expiry_time for user_id, expiry_time in self.blacklisted_users.items()
-            },
-            "user_requests": {
-                str(user_id): requests for user_id, requests in self.user_requests.items()
-            },
-            "notified_users": list(self.notified_users)
+    @staticmethod
+    def _convert_legacy_data(data: Dict[str, Any]) -> Dict[str, Any]:
+        """把旧数据文件中的拉黑用户转换为状态存储的记录"""
+        notified = {str(user_id) for user_id in data.get("notified_users", [])}
+        return {
+            str(user_id): {"expires": expiry_time, "notified": str(user_id) in notified}
+            for user_id, expiry_time in data.get("blacklisted_users", {}).items()
         }
-        
-        try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4)
-        except Exception as e:
-            logger.error(f"保存访问限制数据失败: {e}", exc_info=True)
     
-    def load_data(self) -> None:
-        """从文件加载数据"""
-        try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    
-                    # 加载拉黑用户
-                    blacklisted_users = data.get("blacklisted_users", {})
-                    self.blacklisted_users = {
-                        int(user_id): expiry_time 
-                        for user_id, expiry_time in blacklisted_users.items()
-                    }
-                    
-                    # 加载用户请求记录
-                    user_requests = data.get("user_requests", {})
-                    self.user_requests = {
-                        int(user_id): requests 
-                        for user_id, requests in user_requests.items()
-                    }
-                    
-                    # 加载已提示用户
-                    self.notified_users = set(data.get("notified_users", []))
-                    
-                    # 清理过期的拉黑记录
-                    self.cleanup_expired()
-                    
-                    logger.info(f"加载访问限制数据: {len(self.blacklisted_users)} 个拉黑用户, {len(self.user_requests)} 个用户请求记录")
-        except Exception as e:
-            logger.error(f"加载访问限制数据失败: {e}", exc_info=True)
-            self.blacklisted_users = {}
-            self.user_requests = {}
-            self.notified_users = set()
+    def _load_rules(self) -> Dict[Any, Rule]:
+        """从状态存储读取未过期的拉黑记录，生成准入规则；功能未启用时不拦截"""
+        if not self.enabled:
+            return {}
+        current_time = time.time()
+        rules = {}
+        for user_id, block in self.store.items(RATE_LIMIT_NAMESPACE).items():
+            key = make_key(USER, user_id)
+            if key is not None and block.get("expires", 0) > current_time:
+                rules[key] = Rule(RATE_LIMITED, RATE_LIMIT_NAMESPACE, block["expires"], block)
+        return rules
+    
+    async def _notify_blocked(self, event: Dict[str, Any], rule: Rule) -> None:
+        """被拉黑的用户第一次被拦截时发送一次提示"""
+        if rule.data.get("notified"):
+            return
+        # 多个进程同时收到该用户的消息时，只有标记成功的进程发送
+        user_id = event.get('user_id')
+        notified = dict(rule.data, notified=True)
+        if not self.store.compare_and_set(RATE_LIMIT_NAMESPACE, str(user_id), rule.data, notified):
+            return
+        rule.data = notified
+        remaining_minutes = max(0, int((rule.expires - time.time()) / 60))
+        group_id = event.get('group_id')
+        if group_id is not None:
+            await self.bot.send_msg(
+                message_type='group',
+                group_id=int(group_id),
+                message=f"[CQ:at,qq={user_id}] 您的消息发送过于频繁，已被临时限制 {remaining_minutes} 分钟。",
+                deferrable=True
+            )
+    
+    def export_state(self) -> Dict[str, Any]:
+        """热重载时交接请求记录，拉黑状态保存在状态存储中，无需交接"""
+        return {"user_requests": self.user_requests}
+    
+    def import_state(self, state: Dict[str, Any]) -> None:
+        """接收旧版本插件的请求记录"""
+        self.user_requests = state.get("user_requests", self.user_requests)
     
     async def handle_message(self, event: Dict[str, Any]) -> bool:
         """处理消息事件"""
@@ -134,7 +144,7 @@ class RateLimiter(Plugin):
             return False
         
         # 如果用户在白名单中，直接放行
-        if user_id in self.whitelist_users:
+        if self.admission.is_exempt(user_id):
             return False
             
         # 如果功能未启用，直接放行
@@ -146,34 +156,11 @@ class RateLimiter(Plugin):
         
         # 如果消息中有@机器人，处理管理员命令
         if '[CQ:at,qq=' in message:
-            bot_qq = str(self.bot.config.get("bot", {}).get("self_id", ""))
+            bot_qq = self.bot.self_id
             if is_at_bot(event, bot_qq) and self.is_admin_command(event):
                 return await self.handle_admin_command(event)
         
-        # 检查用户是否被拉黑
-        if self.is_blacklisted(user_id):
-            # 如果用户被拉黑且没有收到通知
-            if user_id not in self.notified_users:
-                # 发送一次拉黑通知
-                # 使用直接访问字典而不是get方法
-                expiry_time = self.blacklisted_users[user_id] if user_id in self.blacklisted_users else 0
-                remaining_minutes = max(0, int((expiry_time - time.time()) / 60))
-                
-                if message_type == 'group':
-                    group_id = event.get('group_id')
-                    if group_id is not None:
-                        await self.bot.send_msg(
-                            message_type='group',
-                            group_id=int(group_id),
-                            message=f"[CQ:at,qq={user_id}] 您的消息发送过于频繁，已被临时限制 {remaining_minutes} 分钟。"
-                        )
-                
-                # 标记为已通知
-                self.notified_users.add(user_id)
-                self.save_data()
-                
-            return True  # 拦截此消息
-        
+        # 被拉黑用户的消息已由准入过滤丢弃，这里只记录用户请求
         # 记录用户请求并检查是否超过限制
         if self.add_request(user_id):
             logger.info(f"用户 {user_id} 超过访问限制，已临时拉黑 {self.blacklist_duration} 分钟")
@@ -185,12 +172,10 @@ class RateLimiter(Plugin):
                     await self.bot.send_msg(
                         message_type='group',
                         group_id=int(group_id),
-                        message=f"[CQ:at,qq={user_id}] 您的消息发送过于频繁，已被临时限制 {self.blacklist_duration} 分钟。"
+                        message=f"[CQ:at,qq={user_id}] 您的消息发送过于频繁，已被临时限制 {self.blacklist_duration} 分钟。",
+                        deferrable=True
                     )
             
-            # 标记为已通知
-            self.notified_users.add(user_id)
-            self.save_data()
             
             return True  # 拦截此消息
         
@@ -205,7 +190,7 @@ class RateLimiter(Plugin):
         
         # 如果消息中有@机器人，则提取命令部分
         if '[CQ:at,qq=' in message:
-            bot_qq = str(self.bot.config.get("bot", {}).get("self_id", ""))
+            bot_qq = self.bot.self_id
             if is_at_bot(event, bot_qq):
                 message = extract_command(event, bot_qq)
                 
@@ -239,7 +224,7 @@ class RateLimiter(Plugin):
         message = event.get('raw_message', '')
         
         # 如果消息中有@机器人，则提取命令部分
-        bot_qq = str(self.bot.config.get("bot", {}).get("self_id", ""))
+        bot_qq = self.bot.self_id
         if is_at_bot(event, bot_qq):
             message = extract_command(event, bot_qq)
         else:
@@ -302,6 +287,8 @@ class RateLimiter(Plugin):
         if enable_match:
             enable = enable_match.group(1) == 'enable'
             self.enabled = enable
+            # 禁用时不再拦截已拉黑的用户，重新启用时恢复
+            self.admission.set_source(RATE_LIMIT_NAMESPACE, self._load_rules())
             
             # 初始化配置（如果不存在）
             if "rate_limiter" not in self.bot.config:
@@ -327,10 +314,12 @@ class RateLimiter(Plugin):
             
             if action == 'add':
                 self.whitelist_users.add(target_id)
+                self.admission.add(WHITELIST_SOURCE, make_key(USER, target_id), EXEMPT)
                 action_text = "添加到"
             else:  # remove
                 if target_id in self.whitelist_users:
                     self.whitelist_users.remove(target_id)
+                    self.admission.remove(WHITELIST_SOURCE, make_key(USER, target_id))
                 action_text = "从"
             
             # 初始化配置（如果不存在）
@@ -352,7 +341,8 @@ class RateLimiter(Plugin):
         if message == '/rate settings':
             # 统计有效拉黑用户
             current_time = time.time()
-            active_blacklist = sum(1 for expiry in self.blacklisted_users.values() if expiry > current_time)
+            active_blacklist = sum(1 for block in self.store.items(RATE_LIMIT_NAMESPACE).values()
+                                   if block.get("expires", 0) > current_time)
             
             settings = f"""访问限制设置:
 - 功能状态: {'启用' if self.enabled else '禁用'}
@@ -374,12 +364,8 @@ class RateLimiter(Plugin):
         if unblock_match:
             target_id = int(unblock_match.group(1))
             
-            if target_id in self.blacklisted_users:
-                del self.blacklisted_users[target_id]
-                if target_id in self.notified_users:
-                    self.notified_users.remove(target_id)
-                self.save_data()
-                
+            self.admission.remove(RATE_LIMIT_NAMESPACE, make_key(USER, target_id))
+            if self.store.delete(RATE_LIMIT_NAMESPACE, str(target_id)):
                 await self.bot.send_msg(
                     message_type='group',
                     group_id=group_id,
@@ -396,32 +382,23 @@ class RateLimiter(Plugin):
         
         return False
     
+    def get_block(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """获取用户有效的拉黑记录，未被拉黑或已过期时返回None（过期记录同时删除）"""
+        key = str(user_id)
+        block = self.store.get(RATE_LIMIT_NAMESPACE, key)
+        if block is None:
+            return None
+        if time.time() > block.get("expires", 0):
+            # 只删除读到的这条过期记录，其他进程可能刚刚重新拉黑了该用户
+            self.store.compare_and_set(RATE_LIMIT_NAMESPACE, key, block, MISSING)
+            return None
+        return block
+    
     def is_blacklisted(self, user_id: int) -> bool:
         """检查用户是否被拉黑"""
-        # 确保user_id是整数类型
         if user_id is None:
             return False
-            
-        user_id = int(user_id)
-        
-        if user_id not in self.blacklisted_users:
-            return False
-            
-        current_time = time.time()
-        # 使用直接访问字典而不是get方法
-        expiry_time = self.blacklisted_users[user_id]
-        
-        # 如果拉黑已过期
-        if current_time > expiry_time:
-            # 清理过期记录
-            if user_id in self.blacklisted_users:
-                del self.blacklisted_users[user_id]
-            if user_id in self.notified_users:
-                self.notified_users.remove(user_id)
-            self.save_data()
-            return False
-        
-        return True
+        return self.get_block(int(user_id)) is not None
     
     def add_request(self, user_id: int) -> bool:
         """添加用户请求记录，如果超过限制则拉黑并返回True"""
@@ -452,10 +429,11 @@ class RateLimiter(Plugin):
         
         # 判断是否超过限制
         if total_requests + 1 > self.max_requests:
-            # 拉黑用户
+            # 拉黑用户，调用方随后会发送通知，直接标记为已通知
             expiry_time = current_time + (self.blacklist_duration * 60)
-            self.blacklisted_users[user_id] = expiry_time
-            self.save_data()
+            block = {"expires": expiry_time, "notified": True}
+            self.store.set(RATE_LIMIT_NAMESPACE, str(user_id), block)
+            self.admission.add(RATE_LIMIT_NAMESPACE, make_key(USER, user_id), RATE_LIMITED, expiry_time, block)
             return True  # 超过限制
             
         return False  # 未超过限制
@@ -467,15 +445,11 @@ class RateLimiter(Plugin):
         
         # 清理过期的拉黑记录
         expired_users = [
-            user_id for user_id, expiry_time in self.blacklisted_users.items()
-            if current_time > expiry_time
+            user_id for user_id, block in self.store.items(RATE_LIMIT_NAMESPACE).items()
+            if current_time > block.get("expires", 0)
+            and self.store.compare_and_set(RATE_LIMIT_NAMESPACE, user_id, block, MISSING)
         ]
         
-        for user_id in expired_users:
-            del self.blacklisted_users[user_id]
-            if user_id in self.notified_users:
-                self.notified_users.remove(user_id)
-        
         # 清理过期的请求记录
         for user_id in list(self.user_requests.keys()):
             self.user_requests[user_id] = [
@@ -488,7 +462,6 @@ class RateLimiter(Plugin):
                 del self.user_requests[user_id]
         
         if expired_users:
-            self.save_data()
             logger.info(f"清理了 {len(expired_users)} 个过期的拉黑记录")
 
 # 导出插件类，确保插件加载器能找到它
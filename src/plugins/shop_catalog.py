@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+签到插件的商店目录
+
+- 每个群的目录（全局商品 + 本群商品）只在首次使用时合并一次：商品列表、ID到商品的字典和
+  /shop 的列表文本都预先生成，之后 /shop、/exchange 直接读取，不再复制商品或查找物品类型
+- 目录中的商品是只读的映射，调用方不能修改缓存
+- 商店数据变化（添加商品、标记是否可使用）时状态存储中的商店版本号递增，各群的目录在下次使用时按新版本重建，
+  其他进程修改商店数据后本进程的目录同样失效
+"""
+
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional, Tuple
+
+def new_shop_data() -> Dict[str, Any]:
+    """空的商店数据"""
+    return {"global": [], "groups": {}}
+
+class Catalog:
+    """一个群的商店目录（只读）"""
+
+    __slots__ = ("version", "items", "by_id", "listing")
+
+    def __init__(self, version: int, items: Tuple[Mapping[str, Any], ...], listing: str):
+        self.version = version
+        self.items = items                                    # 按ID顺序的商品
+        self.by_id = {item["id"]: item for item in items}     # {商品ID: 商品}
+        self.listing = listing                                # /shop 的列表文本
+
+class ShopCatalog:
+    """按群缓存商店目录，版本号变化后重建"""
+
+    def __init__(self, item_types: Dict[str, Dict[str, Any]]):
+        """
+        参数:
+            item_types: 物品类型配置，未标记是否可使用的商品按物品类型的默认值
+        """
+        self.item_types = item_types
+        self._catalogs: Dict[str, Catalog] = {}
+
+    def get(self, shop_data: Dict[str, Any], group_id: str, version: int) -> Catalog:
+        """
+        获取群的商店目录
+
+        参数:
+            shop_data: 商店数据
+            group_id: 群号
+            version: 商店数据的版本号（保存在状态存储中），与缓存的目录不同时重建
+        """
+        catalog = self._catalogs.get(group_id)
+        if catalog is None or catalog.version != version:
+            catalog = self._catalogs[group_id] = self._build(shop_data, group_id, version)
+        return catalog
+
+    def _build(self, shop_data: Dict[str, Any], group_id: str, version: int) -> Catalog:
+        sources = [("global", item) for item in shop_data.get("global", [])]
+        sources += [("group", item) for item in shop_data.get("groups", {}).get(group_id, [])]
+
+        items = []
+        for index, (item_type, raw) in enumerate(sources):
+            item = dict(raw)
+            item["id"] = index + 1
+            item["type"] = item_type
+            # 管理员标记过的以标记为准，否则按物品类型判断是否可使用
+            item["usable"] = raw.get("usable", self.item_types.get(raw.get("name", ""), {}).get("usable", False))
+            items.append(MappingProxyType(item))
+        return Catalog(version, tuple(items), self._render(items))
+
+    @staticmethod
+    def _render(items) -> str:
+        if not items:
+            return "商店中暂无可兑换物品"
+
+        lines = ["🛍️ 积分兑换商店 🛍️"]
+        for item in items:
+            item_type = "【全局】" if item["type"] == "global" else "【本群】"
+            usable_mark = "🔹" if item["usable"] else "🔸"
+            lines.append(f"{item['id']}. {usable_mark} {item_type} {item['name']} - {item['points']}积分\n   {item['description']}")
+
+        lines.append("\n💡 使用 /exchange <ID> 兑换物品")
+        if any(item["usable"] for item in items):
+            lines.append("🔹 标记的物品可以使用 /use <物品ID> 命令使用")
+        return "\n".join(lines)
+
+def source_item(shop_data: Dict[str, Any], group_id: str, item_id: int) -> Optional[Dict[str, Any]]:
+    """
+    按群内的商品ID找到商店数据中的原始商品（全局商品在前，本群商品在后）
+
+    返回:
+        原始商品字典，可以直接修改；ID无效时返回None
+    """
+    if item_id < 1:
+        return None
+    global_items = shop_data.get("global", [])
+    if item_id <= len(global_items):
+        return global_items[item_id - 1]
+    group_items = shop_data.get("groups", {}).get(group_id, [])
+    index = item_id - len(global_items) - 1
+    return group_items[index] if index < len(group_items) else None
@@ -2,21 +2,30 @@
 # -*- coding: utf-8 -*-
 
 import re
-import os
-import json
 import logging
 import time
 import random
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Tuple, Optional, Union
+from typing import Dict, Any, List, Tuple, Optional, Union, Mapping, Callable
 
 # 导入Plugin基类和工具函数
 from plugin_system import Plugin
 from plugins.utils import handle_at_command, extract_command, is_at_bot
+from plugins.draw_engine import DrawEngine
+from plugins.sign_ranking import GroupRanking
+from plugins.points_ledger import PointsLedger, new_user_data
+from plugins.shop_catalog import ShopCatalog, Catalog, new_shop_data, source_item
+from plugins import sign_storage
+from state_store import import_legacy_file
 
 logger = logging.getLogger("LCHBot")
 
+# 签到数据在共享状态存储中的命名空间，每个群一条记录
+SIGN_NAMESPACE = "sign_groups"
+# 商店数据的命名空间，只有一条 catalog 记录
+SHOP_NAMESPACE = "sign_shop"
+
 class SignPoints(Plugin):
     """
     签到与积分系统插件：提供群内签到、积分管理和兑换功能
@@ -36,6 +45,9 @@ class SignPoints(Plugin):
     - @机器人 /points_add <@用户> <数值> - 为用户添加积分
     - @机器人 /shop_add <名称> <所需积分> <描述> - 添加兑换项目
     - @机器人 /item_mark <物品ID> usable|unusable - 标记物品是否可使用
+    - @机器人 /draw <次数> - 管理员单次最多可抽 admin_max_draw_times 次（用于群活动）
+    - @机器人 /draw_sim <次数> - 模拟抽奖，检查实际频率与配置的概率
+    - @机器人 /ledger_check - 用积分交易日志核对本群的积分
     """
     
     def __init__(self, bot):
@@ -64,6 +76,8 @@ class SignPoints(Plugin):
             'add_points_direct': re.compile(r'^/points_add\s+(\d+)\s+(-?\d+)$'),  # 为用户添加积分(直接QQ号)
             'shop_add': re.compile(r'^/shop_add\s+(.+?)\s+(\d+)\s+(.+)$'),  # 添加兑换项目
             'mark_usable': re.compile(r'^/item_mark\s+(\d+)\s+(usable|unusable)$'),  # 标记物品是否可使用
+            'draw_sim': re.compile(r'^/draw_sim\s+(\d+)$'),  # 模拟抽奖
+            'ledger_check': re.compile(r'^/ledger_check$'),  # 核对积分交易日志
         }
 
         # 物品类型和用途
@@ -112,8 +126,15 @@ class SignPoints(Plugin):
                 }
             }
         }
+        # 单次抽奖次数上限：普通用户和管理员（群活动批量发放）
+        sign_config = self.bot.config.get("sign_points", {})
+        self.max_draw_times = sign_config.get("max_draw_times", 10)
+        self.admin_max_draw_times = sign_config.get("admin_max_draw_times", 1000)
+        self.max_simulation_draws = sign_config.get("max_simulation_draws", 1000000)
+        # 抽奖别名表，抽奖配置变化时重建
+        self.draw_engine = DrawEngine(self.draw_config)
 
-        # 数据文件路径
+        # 旧版本的数据文件路径，首次运行时导入共享状态存储
         self.sign_data_file = "data/sign_data.json"
         self.shop_data_file = "data/shop_data.json"
         
@@ -128,48 +149,58 @@ class SignPoints(Plugin):
             }
         }
         
-        # 加载数据
-        self.sign_data = self.load_json(self.sign_data_file, {})
-        self.shop_data = self.load_json(self.shop_data_file, {"global": [], "groups": {}})
-        
-        # 确保所有群的配置都存在
+        # 加载数据：签到数据每个群一条记录，只写入发生变化的群，
+        # 分片模式下每个群只由一个工作进程处理，各进程写入的记录互不覆盖
+        self.store = self.bot.state_store
+        import_legacy_file(self.store, SIGN_NAMESPACE, self.sign_data_file, lambda data: data)
+        import_legacy_file(self.store, SHOP_NAMESPACE, self.shop_data_file, lambda data: {"catalog": data})
+        self.sign_data = self.store.items(SIGN_NAMESPACE)
+        # 积分的增减都通过账本完成，同一用户的操作按顺序执行，同一条消息不会重复扣除积分
+        self.ledger = PointsLedger(self.store, SIGN_NAMESPACE, sign_config.get("ledger_dir", "data/ledger"))
+        # 商店数据和版本号保存在状态存储中，其他进程修改商店后版本号变化，本进程重新读取
+        self.shop_version = self.store.get(SHOP_NAMESPACE, "version", 0)
+        self.shop_data = self.store.get(SHOP_NAMESPACE, "catalog", new_shop_data())
+        # 各群的商店目录预先合并和渲染，商店数据变化时通过版本号失效
+        self.shop_catalog = ShopCatalog(self.item_types)
+        
+        # 确保所有群的配置都存在，用户记录转换为当前格式（下次写入该群时保存）
         for group_id in self.sign_data:
             self.ensure_group_config(group_id)
+            for user_data in self.sign_data[group_id].get("users", {}).values():
+                sign_storage.compact_user(user_data)
+            
+        # 各群的积分排行和今日签到顺序，首次使用时建立，之后随积分变化增量更新
+        self.rankings: Dict[str, GroupRanking] = {}
             
         logger.info(f"插件 {self.name} (ID: {self.id}) 已初始化，当前记录用户数: {self.count_total_users()}")
         
-    def load_json(self, file_path: str, default_value: Any) -> Dict:
-        """从文件加载JSON数据，如果文件不存在则返回默认值"""
-        if not os.path.exists(file_path):
-            # 创建目录（如果不存在）
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            # 写入默认值
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(default_value, f, ensure_ascii=False, indent=2)
-            return default_value
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            logger.error(f"加载JSON文件 {file_path} 失败: {e}")
-            return default_value
+    def update_shop(self, func: Callable[[Dict[str, Any]], None]) -> None:
+        """在状态存储中原子地修改商店数据并递增版本号，不覆盖其他进程同时做的修改，各进程的商店目录随之失效"""
+        def _apply(shop_data: Dict[str, Any]) -> Dict[str, Any]:
+            shop_data = shop_data or new_shop_data()
+            func(shop_data)
+            return shop_data
             
-    def save_json(self, file_path: str, data: Dict) -> None:
-        """保存数据到JSON文件"""
-        try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存JSON文件 {file_path} 失败: {e}")
+        self.shop_data = self.store.update(SHOP_NAMESPACE, "catalog", _apply)
+        self.shop_version = self.store.incr(SHOP_NAMESPACE, "version")
+        
+    def _shop(self, group_id: str) -> Catalog:
+        """获取群的商店目录，其他进程修改过商店数据时先重新读取"""
+        version = self.store.get(SHOP_NAMESPACE, "version", 0)
+        if version != self.shop_version:
+            self.shop_data = self.store.get(SHOP_NAMESPACE, "catalog", new_shop_data())
+            self.shop_version = version
+        return self.shop_catalog.get(self.shop_data, group_id, self.shop_version)
             
     def ensure_group_config(self, group_id: str) -> None:
         """确保群配置存在"""
         if group_id not in self.sign_data:
-            self.sign_data[group_id] = {
+            # 其他进程可能在本进程启动后创建了该群的记录
+            stored = self.store.get(SIGN_NAMESPACE, group_id)
+            if stored is not None:
+                self.sign_data[group_id] = stored
+                return
+            group_data = {
                 "users": {},  # 用户签到数据
                 "config": self.default_config.copy(),  # 复制默认配置
                 "statistics": {  # 群统计信息
@@ -177,7 +208,18 @@ class SignPoints(Plugin):
                     "total_points": 0
                 }
             }
-            self.save_json(self.sign_data_file, self.sign_data)
+            # 其他进程同时创建时以先写入的为准
+            self.sign_data[group_id] = self.store.update(
+                SIGN_NAMESPACE, group_id, lambda current: group_data if current is None else current)
+            
+    def _modify_group_config(self, group_id: str, func) -> None:
+        """在状态存储中原子地修改群配置，不覆盖其他进程对该群用户记录的修改"""
+        def _apply(group_data: Dict[str, Any]) -> Dict[str, Any]:
+            group_data = group_data or self.sign_data[group_id]
+            func(group_data["config"])
+            return group_data
+            
+        self.sign_data[group_id] = self.store.update(SIGN_NAMESPACE, group_id, _apply)
             
     def count_total_users(self) -> int:
         """统计所有用户数"""
@@ -211,51 +253,49 @@ class SignPoints(Plugin):
         # 确保群配置存在
         self.ensure_group_config(group_id)
         
-        # 检查今天是否已经签到
-        if not self.can_sign_today(group_id, user_id):
-            user_data = self.sign_data[group_id]["users"][user_id]
-            # 添加QQ头像
-            avatar_url = f"[CQ:image,file=https://q1.qlogo.cn/g?b=qq&nk={user_id}&s=640]"
-            return f"{avatar_url}\nQQ: {user_id}\n您今天已经签到过了\n当前积分: {user_data['total_points']}\n连续签到: {user_data['consecutive_days']}天"
-            
-        # 计算签到积分
-        points, consecutive_days, bonus_messages = await self.calc_sign_points(group_id, user_id)
-        
-        # 更新用户数据
-        if user_id not in self.sign_data[group_id]["users"]:
-            self.sign_data[group_id]["users"][user_id] = {
-                "total_points": 0,
-                "sign_count": 0,
-                "consecutive_days": 0,
-                "last_sign_date": "",
-                "history": []
-            }
+        async with self.ledger.lock(group_id, user_id):
+            # 检查今天是否已经签到
+            if not self.can_sign_today(group_id, user_id):
+                user_data = self.sign_data[group_id]["users"][user_id]
+                # 添加QQ头像
+                avatar_url = f"[CQ:image,file=https://q1.qlogo.cn/g?b=qq&nk={user_id}&s=640]"
+                return f"{avatar_url}\nQQ: {user_id}\n您今天已经签到过了\n当前积分: {user_data['total_points']}\n连续签到: {user_data['consecutive_days']}天"
+                
+            # 计算签到积分
+            points, consecutive_days, bonus_messages = await self.calc_sign_points(group_id, user_id)
+            # 计算时使用了双倍签到卡的，在事务中同样移除
+            local_buffs = self.sign_data[group_id]["users"].get(user_id, {}).get("buffs", {})
+            today = self.get_today_date()
             
-        # 更新签到记录
-        user_data = self.sign_data[group_id]["users"][user_id]
-        user_data["total_points"] += points
-        user_data["sign_count"] += 1
-        user_data["consecutive_days"] = consecutive_days
-        user_data["last_sign_date"] = self.get_today_date()
-        user_data["history"].append({
-            "date": self.get_today_date(),
-            "points": points,
-            "time": int(time.time())
-        })
-        
-        # 限制历史记录长度，只保留最近30条
-        if len(user_data["history"]) > 30:
-            user_data["history"] = user_data["history"][-30:]
+            def _record(group_data: Dict[str, Any], user_data: Dict[str, Any]) -> None:
+                # 更新签到记录，只保留最近的记录，长期统计计入月度汇总
+                sign_storage.compact_user(user_data)
+                user_data["sign_count"] += 1
+                user_data["consecutive_days"] = consecutive_days
+                user_data["last_sign_date"] = today
+                sign_storage.push_history(user_data, {
+                    "date": today,
+                    "points": points,
+                    "time": int(time.time())
+                })
+                if "double_sign" not in local_buffs:
+                    user_data.get("buffs", {}).pop("double_sign", None)
+                # 更新群统计数据
+                group_data["statistics"]["total_signs"] += 1
+                group_data["statistics"]["total_points"] += points
+                
+            # 以日期作为幂等键，同一天只会签到一次
+            result, self.sign_data[group_id] = self.ledger.transact(
+                group_id, user_id, points, "sign", key=f"sign:{user_id}:{today}",
+                mutate=_record, fallback=self.sign_data[group_id])
+            self._sync_points(group_id, user_id)
+            user_data = self.sign_data[group_id]["users"][user_id]
+            if result.duplicate:
+                # 其他进程已处理了今天的签到
+                return f"您今天已经签到过了\n当前积分: {user_data['total_points']}\n连续签到: {user_data['consecutive_days']}天"
             
-        # 更新群统计数据
-        self.sign_data[group_id]["statistics"]["total_signs"] += 1
-        self.sign_data[group_id]["statistics"]["total_points"] += points
-        
-        # 保存数据
-        self.save_json(self.sign_data_file, self.sign_data)
-        
         # 构建签到成功消息
-        sign_rank = self.get_sign_rank_today(group_id, user_id)
+        sign_rank = self._ranking(group_id).record_sign(today, user_id)
         # 添加QQ头像
         avatar_url = f"[CQ:image,file=https://q1.qlogo.cn/g?b=qq&nk={user_id}&s=640]"
         message = [
@@ -273,44 +313,50 @@ class SignPoints(Plugin):
             
         return "\n".join(message)
         
-    def get_sign_rank_today(self, group_id: str, user_id: str) -> int:
-        """获取用户今日签到排名"""
+    def _ranking(self, group_id: str) -> GroupRanking:
+        """获取群的排行，首次使用或日期变化时从签到数据建立"""
+        ranking = self.rankings.get(group_id)
+        users = self.sign_data.get(group_id, {}).get("users", {})
+        if ranking is None:
+            ranking = self.rankings[group_id] = GroupRanking.build(users)
         today = self.get_today_date()
-        signed_users = []
-        
-        # 收集今天签到的用户及其时间
-        for uid, data in self.sign_data.get(group_id, {}).get("users", {}).items():
-            if data.get("last_sign_date") == today:
-                # 找到该用户当天的签到记录
-                for record in data.get("history", []):
-                    if record.get("date") == today:
-                        signed_users.append((uid, record.get("time", 0)))
-                        break
-                        
-        # 按签到时间排序
-        signed_users.sort(key=lambda x: x[1])
+        if ranking.sign_date != today:
+            ranking.load_signers(today, users)
+        return ranking
         
-        # 查找用户排名
-        for i, (uid, _) in enumerate(signed_users):
-            if uid == user_id:
-                return i + 1
-                
-        # 如果没找到，返回总签到人数+1
-        return len(signed_users) + 1
+    def _sync_points(self, group_id: str, user_id: str) -> None:
+        """用户积分变化后更新排行（排行尚未建立时无需处理）"""
+        ranking = self.rankings.get(group_id)
+        user_data = self.sign_data.get(group_id, {}).get("users", {}).get(user_id)
+        if ranking is not None and user_data is not None:
+            ranking.update(user_id, user_data.get("total_points", 0))
+        
+    def get_sign_rank_today(self, group_id: str, user_id: str) -> int:
+        """获取用户今日签到排名，今天未签到时返回总签到人数+1"""
+        ranking = self._ranking(group_id)
+        return ranking.sign_positions.get(user_id) or len(ranking.signers) + 1
+        
+    def get_user_points_rank(self, group_id: str, user_id: str) -> Tuple[int, int]:
+        """获取用户的积分排名
+        
+        返回:
+            (名次, 群内有积分记录的人数)，用户没有记录时名次为0
+        """
+        ranking = self._ranking(group_id)
+        return ranking.rank(user_id), len(ranking)
         
     def get_points_rank(self, group_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         """获取群积分排行榜"""
         users = self.sign_data.get(group_id, {}).get("users", {})
-        # 按积分排序
-        sorted_users = sorted(users.items(), key=lambda x: x[1].get("total_points", 0), reverse=True)
         
         # 构建排行榜
         rank_list = []
-        for i, (uid, data) in enumerate(sorted_users[:limit]):
+        for i, (uid, points) in enumerate(self._ranking(group_id).top(limit)):
+            data = users.get(uid, {})
             rank_list.append({
                 "rank": i + 1,
                 "user_id": uid,
-                "points": data.get("total_points", 0),
+                "points": points,
                 "sign_count": data.get("sign_count", 0),
                 "consecutive_days": data.get("consecutive_days", 0)
             })
@@ -318,7 +364,12 @@ class SignPoints(Plugin):
         return rank_list
         
     async def generate_rank_message(self, group_id: str, limit: int = 10) -> str:
-        """生成排行榜消息"""
+        """生成排行榜消息，排行没有变化时使用缓存"""
+        ranking = self._ranking(group_id)
+        cached = ranking.get_cached_message() if limit == 10 else None
+        if cached is not None:
+            return cached
+        version = ranking.version
         rank_list = self.get_points_rank(group_id, limit)
         
         if not rank_list:
@@ -348,7 +399,11 @@ class SignPoints(Plugin):
         statistics = self.sign_data.get(group_id, {}).get("statistics", {})
         lines.append(f"\n📝 群统计: {statistics.get('total_signs', 0)}次签到 | {statistics.get('total_points', 0)}总积分")
         
-        return "\n".join(lines)
+        message = "\n".join(lines)
+        # 查询昵称期间排行有变化时不缓存
+        if limit == 10 and ranking.version == version:
+            ranking.cache_message(message)
+        return message
         
     def get_user_sign_info(self, group_id: str, user_id: str) -> Dict[str, Any]:
         """获取用户签到信息"""
@@ -366,10 +421,11 @@ class SignPoints(Plugin):
         """获取用户签到详细信息"""
         user_info = self.get_user_sign_info(group_id, user_id)
         
-        # 计算签到率
-        days_registered = len(user_info.get("history", []))
+        # 本月签到统计
         sign_count = user_info.get("sign_count", 0)
-        sign_rate = (sign_count / max(1, days_registered)) * 100 if days_registered > 0 else 0
+        now = datetime.now()
+        month_signs, month_points = sign_storage.monthly_stats(user_info, now.strftime("%Y-%m"))
+        sign_rate = month_signs / now.day * 100
         
         # 构建消息
         lines = [
@@ -377,7 +433,8 @@ class SignPoints(Plugin):
             f"💰 积分: {user_info.get('total_points', 0)}",
             f"📝 总签到: {sign_count}次",
             f"🔄 连续签到: {user_info.get('consecutive_days', 0)}天",
-            f"📊 签到率: {sign_rate:.1f}%"
+            f"📅 本月签到: {month_signs}次，获得{month_points}积分",
+            f"📊 本月签到率: {sign_rate:.1f}%"
         ]
         
         # 添加最近签到记录
@@ -395,52 +452,17 @@ class SignPoints(Plugin):
         return "\n".join(lines)
         
     # 商店功能
-    def get_shop_items(self, group_id: str) -> List[Dict[str, Any]]:
-        """获取可兑换的商店物品"""
-        # 合并全局商品和群特定商品
-        global_items = self.shop_data.get("global", [])
-        group_items = self.shop_data.get("groups", {}).get(group_id, [])
-        
-        # 为每个项目添加ID和是否可用标记
-        all_items = []
-        for i, item in enumerate(global_items):
-            item_copy = item.copy()
-            item_copy["id"] = i + 1
-            item_copy["type"] = "global"
-            # 检查物品类型是否可用
-            item_name = item_copy.get("name", "")
-            item_copy["usable"] = self.item_types.get(item_name, {}).get("usable", False)
-            all_items.append(item_copy)
-            
-        group_start_id = len(global_items) + 1
-        for i, item in enumerate(group_items):
-            item_copy = item.copy()
-            item_copy["id"] = group_start_id + i
-            item_copy["type"] = "group"
-            # 检查物品类型是否可用
-            item_name = item_copy.get("name", "")
-            item_copy["usable"] = self.item_types.get(item_name, {}).get("usable", False)
-            all_items.append(item_copy)
-            
-        return all_items
+    def get_shop_items(self, group_id: str) -> Tuple[Mapping[str, Any], ...]:
+        """获取可兑换的商店物品（只读，全局商品在前，ID从1开始）"""
+        return self._shop(group_id).items
+        
+    def get_shop_item(self, group_id: str, item_id: int) -> Optional[Mapping[str, Any]]:
+        """按ID获取商店物品（只读），不存在时返回None"""
+        return self._shop(group_id).by_id.get(item_id)
         
     def get_shop_list(self, group_id: str) -> str:
         """获取商店列表文本"""
-        items = self.get_shop_items(group_id)
-        
-        if not items:
-            return "商店中暂无可兑换物品"
-            
-        lines = ["🛍️ 积分兑换商店 🛍️"]
-        for item in items:
-            item_type = "【全局】" if item["type"] == "global" else "【本群】"
-            usable_mark = "🔹" if item.get("usable", False) else "🔸"
-            lines.append(f"{item['id']}. {usable_mark} {item_type} {item['name']} - {item['points']}积分\n   {item['description']}")
-            
-        lines.append("\n💡 使用 /exchange <ID> 兑换物品")
-        if any(item.get("usable", False) for item in items):
-            lines.append("🔹 标记的物品可以使用 /use <物品ID> 命令使用")
-        return "\n".join(lines)
+        return self._shop(group_id).listing
         
     def add_shop_item(self, group_id: str, name: str, points: int, description: str, is_global: bool = False) -> bool:
         """添加商店物品"""
@@ -451,51 +473,33 @@ class SignPoints(Plugin):
             "created_time": int(time.time())
         }
         
-        if is_global:
-            self.shop_data["global"].append(item)
-        else:
-            if group_id not in self.shop_data["groups"]:
-                self.shop_data["groups"][group_id] = []
-            self.shop_data["groups"][group_id].append(item)
-            
+        def _add(shop_data: Dict[str, Any]) -> None:
+            if is_global:
+                shop_data["global"].append(item)
+            else:
+                shop_data["groups"].setdefault(group_id, []).append(item)
+                
         # 保存商店数据
-        self.save_json(self.shop_data_file, self.shop_data)
+        self.update_shop(_add)
         return True
         
-    def exchange_item(self, group_id: str, user_id: str, item_id: int) -> Tuple[bool, str]:
-        """兑换物品"""
-        items = self.get_shop_items(group_id)
-        
-        # 查找商品
-        target_item = None
-        for item in items:
-            if item["id"] == item_id:
-                target_item = item
-                break
+    def exchange_item(self, group_id: str, user_id: str, item_id: int, key: Optional[str] = None) -> Tuple[bool, str]:
+        """兑换物品，扣除积分和添加物品在一个事务中完成
         
+        参数:
+            group_id: 群号
+            user_id: 用户QQ号
+            item_id: 商品ID
+            key: 幂等键，同一个键只兑换一次
+            
+        返回:
+            (是否成功, 结果消息)
+        """
+        target_item = self.get_shop_item(group_id, item_id)
         if not target_item:
             return False, f"未找到ID为{item_id}的物品"
             
-        # 获取用户积分
-        user_points = self.get_user_sign_info(group_id, user_id).get("total_points", 0)
-        
-        # 检查积分是否足够
-        if user_points < target_item["points"]:
-            return False, f"积分不足，需要{target_item['points']}积分，您当前有{user_points}积分"
-            
-        # 扣除积分
-        self.sign_data[group_id]["users"][user_id]["total_points"] -= target_item["points"]
-        
-        # 记录兑换历史
-        if "exchanges" not in self.sign_data[group_id]["users"][user_id]:
-            self.sign_data[group_id]["users"][user_id]["exchanges"] = []
-            
-        # 添加到用户背包
-        if "bag" not in self.sign_data[group_id]["users"][user_id]:
-            self.sign_data[group_id]["users"][user_id]["bag"] = []
-            
-        # 为物品生成唯一ID
-        bag_item_id = int(time.time() * 1000) % 1000000
+        self.ensure_group_config(group_id)
         
         # 获取物品过期时间设置（如果有）
         expires_in_days = target_item.get("expires_in_days", None)
@@ -505,33 +509,38 @@ class SignPoints(Plugin):
             # 计算过期时间戳
             expire_time = int(time.time() + expires_in_days * 86400)  # 转换为秒
             
-        # 添加到背包
-        bag_item = {
-            "id": bag_item_id,
-            "shop_id": item_id,
-            "name": target_item["name"],
-            "description": target_item["description"],
-            "obtained_time": int(time.time()),
-            "obtained_date": self.get_today_date(),
-            "used": False,
-            "usable": target_item.get("usable", False),
-            "expire_time": expire_time  # 添加过期时间字段
-        }
-        
-        self.sign_data[group_id]["users"][user_id]["bag"].append(bag_item)
-        
-        # 记录兑换记录
-        self.sign_data[group_id]["users"][user_id]["exchanges"].append({
-            "item_id": item_id,
-            "item_name": target_item["name"],
-            "points": target_item["points"],
-            "time": int(time.time()),
-            "date": self.get_today_date(),
-            "bag_item_id": bag_item_id
-        })
-        
-        # 保存数据
-        self.save_json(self.sign_data_file, self.sign_data)
+        def _add_item(group_data: Dict[str, Any], user_data: Dict[str, Any]) -> None:
+            # 添加到背包
+            bag_item_id = sign_storage.add_bag_item(user_data, {
+                "shop_id": item_id,
+                "name": target_item["name"],
+                "description": target_item["description"],
+                "obtained_time": int(time.time()),
+                "obtained_date": self.get_today_date(),
+                "used": False,
+                "usable": target_item.get("usable", False),
+                "expire_time": expire_time  # 添加过期时间字段
+            })
+            
+            # 记录兑换记录
+            sign_storage.push_exchange(user_data, {
+                "item_id": item_id,
+                "item_name": target_item["name"],
+                "points": target_item["points"],
+                "time": int(time.time()),
+                "date": self.get_today_date(),
+                "bag_item_id": bag_item_id
+            })
+            
+        # 检查积分和扣除积分在同一事务中，同时兑换时不会透支
+        result, self.sign_data[group_id] = self.ledger.transact(
+            group_id, user_id, -target_item["points"], "exchange", key=key,
+            required=target_item["points"], mutate=_add_item, fallback=self.sign_data[group_id])
+        if result.duplicate:
+            return False, "这条消息的兑换已经处理过了"
+        if not result.ok:
+            return False, f"积分不足，需要{target_item['points']}积分，您当前有{result.balance}积分"
+        self._sync_points(group_id, user_id)
         
         # 构建返回消息
         expire_info = ""
@@ -539,11 +548,23 @@ class SignPoints(Plugin):
             expire_date = time.strftime("%Y-%m-%d %H:%M", time.localtime(expire_time))
             expire_info = f"（{expires_in_days}天后过期，过期时间：{expire_date}）"
             
-        return True, f"兑换成功！消费{target_item['points']}积分兑换了 {target_item['name']} {expire_info}\n物品已添加到您的背包，使用 /bag 命令查看\n当前剩余积分: {self.sign_data[group_id]['users'][user_id]['total_points']}"
+        return True, f"兑换成功！消费{target_item['points']}积分兑换了 {target_item['name']} {expire_info}\n物品已添加到您的背包，使用 /bag 命令查看\n当前剩余积分: {result.balance}"
         
     def get_user_bag(self, group_id: str, user_id: str) -> List[Dict[str, Any]]:
         """获取用户背包内容"""
-        return self.sign_data.get(group_id, {}).get("users", {}).get(user_id, {}).get("bag", [])
+        return sign_storage.bag_items(self.sign_data.get(group_id, {}).get("users", {}).get(user_id, {}))
+        
+    def _modify_user(self, group_id: str, user_id: str, func) -> Dict[str, Any]:
+        """在状态存储中原子地修改一个用户的记录（不涉及积分），返回修改后的用户记录"""
+        def _apply(group_data: Dict[str, Any]) -> Dict[str, Any]:
+            group_data = group_data or self.sign_data[group_id]
+            user_data = group_data["users"].setdefault(user_id, new_user_data())
+            sign_storage.compact_user(user_data)
+            func(user_data)
+            return group_data
+            
+        self.sign_data[group_id] = self.store.update(SIGN_NAMESPACE, group_id, _apply)
+        return self.sign_data[group_id]["users"][user_id]
 
     def format_bag_message(self, group_id: str, user_id: str) -> str:
         """格式化背包消息"""
@@ -554,24 +575,16 @@ class SignPoints(Plugin):
         
         lines = ["🎒 您的物品背包 🎒"]
         
-        # 清理已过期的物品
+        # 清理已过期的物品：未到最早的过期时间时不需要检查，到期后一次清理全部
         current_time = int(time.time())
-        valid_bag_items = []
-        expired_count = 0
-        
-        for item in bag_items:
-            expire_time = item.get("expire_time")
-            if expire_time is not None and expire_time < current_time:
-                # 物品已过期
-                expired_count += 1
-            else:
-                valid_bag_items.append(item)
-                
-        # 如果有过期物品，更新用户背包
-        if expired_count > 0:
-            self.sign_data[group_id]["users"][user_id]["bag"] = valid_bag_items
-            self.save_json(self.sign_data_file, self.sign_data)
-            lines.append(f"\n⚠️ {expired_count} 个物品已过期并被自动清理")
+        user_data = self.sign_data[group_id]["users"][user_id]
+        if sign_storage.needs_purge(user_data, current_time):
+            expired = []
+            user_data = self._modify_user(group_id, user_id,
+                                          lambda data: expired.append(sign_storage.purge_expired(data, current_time)))
+            if expired and expired[0]:
+                lines.append(f"\n⚠️ {expired[0]} 个物品已过期并被自动清理")
+        valid_bag_items = sign_storage.bag_items(user_data)
             
         if not valid_bag_items:
             lines.append("\n您的背包中暂无有效物品")
@@ -676,13 +689,16 @@ class SignPoints(Plugin):
         lines.append("\n💡 使用 /use <物品ID> 使用物品")
         return "\n".join(lines)
         
-    def update_points(self, group_id: str, user_id: str, points: int) -> int:
-        """更新用户积分
+    def update_points(self, group_id: str, user_id: str, points: int, reason: str = "adjust",
+                      key: Optional[str] = None) -> int:
+        """通过账本更新用户积分，在状态存储中原子地读-改-写该群的记录，其他进程同时修改积分时不会丢失更新
         
         参数:
             group_id: 群号
             user_id: 用户QQ号
             points: 要添加的积分（可为负数）
+            reason: 操作类型，写入交易日志
+            key: 幂等键，同一个键只生效一次
             
         返回:
             用户当前总积分
@@ -690,31 +706,24 @@ class SignPoints(Plugin):
         # 确保群配置存在
         self.ensure_group_config(group_id)
         
-        # 如果用户不存在，创建用户数据
-        if user_id not in self.sign_data[group_id]["users"]:
-            self.sign_data[group_id]["users"][user_id] = {
-                "total_points": 0,
-                "sign_count": 0,
-                "consecutive_days": 0,
-                "last_sign_date": "",
-                "history": []
-            }
-            
-        # 更新积分
-        self.sign_data[group_id]["users"][user_id]["total_points"] += points
-        
-        # 确保积分不为负数
-        if self.sign_data[group_id]["users"][user_id]["total_points"] < 0:
-            self.sign_data[group_id]["users"][user_id]["total_points"] = 0
-            
-        # 保存数据
-        self.save_json(self.sign_data_file, self.sign_data)
+        # 用存储中的最新记录替换本地数据
+        result, self.sign_data[group_id] = self.ledger.transact(
+            group_id, user_id, points, reason, key=key, fallback=self.sign_data[group_id])
+        self._sync_points(group_id, user_id)
         
         # 返回更新后的积分
-        return self.sign_data[group_id]["users"][user_id]["total_points"]
+        return result.balance
+        
+    @staticmethod
+    def operation_key(event: Dict[str, Any], operation: str) -> Optional[str]:
+        """由消息ID生成积分操作的幂等键，没有消息ID时返回None"""
+        message_id = event.get("message_id")
+        if not message_id:
+            return None
+        return f"{operation}:{event.get('user_id', 0)}:{message_id}"
         
     async def perform_draw(self, event: Dict[str, Any], group_id: str, user_id: str, draw_times: int = 1) -> Tuple[bool, str]:
-        """执行抽奖
+        """执行抽奖：一次批量抽取全部次数，积分扣除、经验卡积分和背包物品在一个事务中写入
         
         参数:
             event: 事件数据
@@ -728,32 +737,46 @@ class SignPoints(Plugin):
         # 检查次数合法性
         if draw_times <= 0:
             return False, "抽奖次数必须为正数"
-        if draw_times > 10:
-            return False, "单次最多抽奖10次"
+        max_times = self.admin_max_draw_times if self.is_admin(int(user_id), group_id) else self.max_draw_times
+        if draw_times > max_times:
+            return False, f"单次最多抽奖{max_times}次"
             
         # 计算总消耗积分
         total_cost = self.draw_config["cost_per_draw"] * draw_times
+        self.ensure_group_config(group_id)
         
-        # 获取用户积分
-        user_points = self.get_user_sign_info(group_id, user_id).get("total_points", 0)
+        # 批量抽取，积分不足时不写入结果
+        self.draw_engine.refresh(self.draw_config)
+        draw_results = self.draw_engine.draw(draw_times)
+        bonus_total = sum(item.get("bonus_points", 0) for item in draw_results)
+        now = int(time.time())
+        today = self.get_today_date()
+        
+        def _add_items(group_data: Dict[str, Any], user_data: Dict[str, Any]) -> None:
+            sign_storage.purge_expired(user_data, now)
+            for item in draw_results:
+                sign_storage.add_bag_item(user_data, self._make_bag_item(item, now, today))
+                
+        # 在事务中检查积分，同时消费积分时不会透支
+        async with self.ledger.lock(group_id, user_id):
+            result, self.sign_data[group_id] = self.ledger.transact(
+                group_id, user_id, bonus_total - total_cost, "draw", key=self.operation_key(event, "draw"),
+                required=total_cost, mutate=_add_items, fallback=self.sign_data[group_id])
         
         # 检查积分是否足够
-        if user_points < total_cost:
-            return False, f"积分不足，需要{total_cost}积分，您当前有{user_points}积分"
-            
-        # 扣除积分
-        remaining_points = self.update_points(group_id, user_id, -total_cost)
-        
-        # 执行抽奖
-        draw_results = []
-        for _ in range(draw_times):
-            result = self._draw_once(group_id, user_id)
-            draw_results.append(result)
+        if result.duplicate:
+            return False, "这条消息的抽奖已经处理过了"
+        if not result.ok:
+            return False, f"积分不足，需要{total_cost}积分，您当前有{result.balance}积分"
+        self._sync_points(group_id, user_id)
+        remaining_points = result.balance
             
-        # 统计结果
-        items_by_pool = {"common": [], "rare": [], "epic": []}
+        # 按奖池统计结果，相同物品合并显示
+        items_by_pool = {}
         for item in draw_results:
-            items_by_pool[item["pool"]].append(item)
+            pool_items = items_by_pool.setdefault(item["pool"], {})
+            count, bonus = pool_items.get(item["name"], (0, 0))
+            pool_items[item["name"]] = (count + 1, bonus + item.get("bonus_points", 0))
             
         # 构建结果消息
         nickname = event.get("sender", {}).get("nickname", "用户")
@@ -765,147 +788,42 @@ class SignPoints(Plugin):
         ]
         
         # 按奖池分类显示结果
-        if items_by_pool["epic"]:
-            result_lines.append("\n🌟 史诗物品:")
-            for item in items_by_pool["epic"]:
-                result_lines.append(f"- {item['name']}" + (f" (积分+{item['bonus_points']})" if "bonus_points" in item else ""))
-                
-        if items_by_pool["rare"]:
-            result_lines.append("\n💎 稀有物品:")
-            for item in items_by_pool["rare"]:
-                result_lines.append(f"- {item['name']}" + (f" (积分+{item['bonus_points']})" if "bonus_points" in item else ""))
-                
-        if items_by_pool["common"]:
-            result_lines.append("\n📦 普通物品:")
-            for item in items_by_pool["common"]:
-                result_lines.append(f"- {item['name']}" + (f" (积分+{item['bonus_points']})" if "bonus_points" in item else ""))
+        for pool_name, title in (("epic", "\n🌟 史诗物品:"), ("rare", "\n💎 稀有物品:"), ("common", "\n📦 普通物品:")):
+            if pool_name not in items_by_pool:
+                continue
+            result_lines.append(title)
+            for name, (count, bonus) in items_by_pool[pool_name].items():
+                result_lines.append(f"- {name}" + (f" x{count}" if count > 1 else "") + (f" (积分+{bonus})" if bonus else ""))
                 
         result_lines.append("\n💡 所有物品已自动添加到背包，使用 /bag 命令查看")
         
         # 返回结果
         return True, "\n".join(result_lines)
         
-    def _draw_once(self, group_id: str, user_id: str) -> Dict[str, Any]:
-        """执行一次抽奖
-        
-        参数:
-            group_id: 群号
-            user_id: 用户QQ号
-            
-        返回:
-            抽奖结果
-        """
-        # 随机选择奖池
-        pools = self.draw_config["pools"]
-        pool_weights = [(pool_name, pool_info["weight"]) for pool_name, pool_info in pools.items()]
-        pool_name = self._weighted_choice([p[0] for p in pool_weights], [p[1] for p in pool_weights])
-        
-        # 随机选择物品
-        pool = pools[pool_name]
-        items = pool["items"]
-        item_weights = [item["weight"] for item in items]
-        selected_item = items[self._weighted_index(item_weights)]
-        
-        # 复制物品信息
-        item_result = selected_item.copy()
-        item_result["pool"] = pool_name
-        
-        # 处理特殊物品（如经验卡，需要随机生成积分）
-        if "min_points" in item_result and "max_points" in item_result:
-            bonus_points = random.randint(item_result["min_points"], item_result["max_points"])
-            item_result["bonus_points"] = bonus_points
-            # 为用户添加积分
-            self.update_points(group_id, user_id, bonus_points)
-            item_result["description"] = f"获得{bonus_points}积分的经验卡"
-        
-        # 将物品添加到用户背包
-        self._add_item_to_bag(group_id, user_id, item_result)
-        
-        return item_result
-        
-    def _weighted_choice(self, items: List[Any], weights: List[int]) -> Any:
-        """根据权重随机选择一项
-        
-        参数:
-            items: 可选项列表
-            weights: 对应的权重列表
-            
-        返回:
-            选中的项
-        """
-        total_weight = sum(weights)
-        rand_val = random.random() * total_weight
-        
-        cumulative_weight = 0
-        for i, weight in enumerate(weights):
-            cumulative_weight += weight
-            if rand_val <= cumulative_weight:
-                return items[i]
-                
-        # 防止浮点误差，返回最后一项
-        return items[-1]
-        
-    def _weighted_index(self, weights: List[int]) -> int:
-        """根据权重随机选择索引
+    def _make_bag_item(self, item: Dict[str, Any], now: int, today: str) -> Dict[str, Any]:
+        """根据抽奖结果构建背包物品（ID在放入背包时分配）
         
         参数:
-            weights: 权重列表
+            item: 抽奖结果
+            now: 获得时间戳
+            today: 获得日期
             
         返回:
-            选中的索引
-        """
-        total_weight = sum(weights)
-        rand_val = random.random() * total_weight
-        
-        cumulative_weight = 0
-        for i, weight in enumerate(weights):
-            cumulative_weight += weight
-            if rand_val <= cumulative_weight:
-                return i
-                
-        # 防止浮点误差，返回最后一个索引
-        return len(weights) - 1
-        
-    def _add_item_to_bag(self, group_id: str, user_id: str, item: Dict[str, Any]) -> None:
-        """将物品添加到用户背包
-        
-        参数:
-            group_id: 群号
-            user_id: 用户QQ号
-            item: 物品信息
+            背包物品
         """
-        # 确保用户数据存在
-        if user_id not in self.sign_data[group_id]["users"]:
-            self.sign_data[group_id]["users"][user_id] = {
-                "total_points": 0,
-                "sign_count": 0,
-                "consecutive_days": 0,
-                "last_sign_date": "",
-                "history": []
-            }
-            
-        # 确保背包存在
-        if "bag" not in self.sign_data[group_id]["users"][user_id]:
-            self.sign_data[group_id]["users"][user_id]["bag"] = []
-            
-        # 为物品生成唯一ID
-        bag_item_id = int(time.time() * 1000) % 1000000 + random.randint(1, 999)
-        
         # 检查物品是否需要设置过期时间
         expires_in_days = item.get("expires_in_days", None)
         expire_time = None
         
         if expires_in_days is not None and expires_in_days > 0:
             # 计算过期时间戳
-            expire_time = int(time.time() + expires_in_days * 86400)  # 转换为秒
+            expire_time = int(now + expires_in_days * 86400)  # 转换为秒
         
-        # 构建背包物品
-        bag_item = {
-            "id": bag_item_id,
+        return {
             "name": item["name"],
             "description": item.get("description", self.item_types.get(item["name"], {}).get("description", "未知物品")),
-            "obtained_time": int(time.time()),
-            "obtained_date": self.get_today_date(),
+            "obtained_time": now,
+            "obtained_date": today,
             "used": False,
             "usable": self.item_types.get(item["name"], {}).get("usable", False),
             "source": "抽奖",
@@ -913,11 +831,28 @@ class SignPoints(Plugin):
             "expire_time": expire_time  # 添加过期时间字段
         }
         
-        # 添加到背包
-        self.sign_data[group_id]["users"][user_id]["bag"].append(bag_item)
+    async def simulate_draw(self, draw_times: int) -> str:
+        """蒙特卡洛模拟抽奖，比较实际频率与配置的概率（在线程池中执行，不修改任何数据）
         
-        # 保存数据
-        self.save_json(self.sign_data_file, self.sign_data)
+        参数:
+            draw_times: 模拟次数
+            
+        返回:
+            模拟结果消息
+        """
+        draw_times = min(max(1, draw_times), self.max_simulation_draws)
+        self.draw_engine.refresh(self.draw_config)
+        started = time.perf_counter()
+        result = await asyncio.to_thread(self.draw_engine.simulate, draw_times)
+        elapsed = time.perf_counter() - started
+        
+        lines = [f"🎲 抽奖模拟 {result['count']} 次 (耗时 {elapsed:.2f} 秒)", "物品: 配置概率 / 实际频率"]
+        for pool_name, name, expected, observed in result["items"]:
+            lines.append(f"  [{pool_name}] {name}: {expected * 100:.2f}% / {observed * 100:.2f}%")
+        cost = self.draw_config["cost_per_draw"]
+        lines.append(f"\n每次抽奖消耗 {cost} 积分，平均返还积分 {result['bonus_points']:.2f} "
+                     f"(期望 {result['expected_bonus_points']:.2f})")
+        return "\n".join(lines)
         
     def get_draw_info(self) -> str:
         """获取抽奖信息
@@ -931,7 +866,7 @@ class SignPoints(Plugin):
         lines = [
             "🎰 米池抽奖系统 🎰",
             f"每次抽奖消耗 {cost} 积分",
-            f"使用命令: /draw <次数> 参与抽奖 (最多10次)",
+            f"使用命令: /draw <次数> 参与抽奖 (最多{self.max_draw_times}次)",
             "\n📊 奖池信息:"
         ]
         
@@ -963,17 +898,10 @@ class SignPoints(Plugin):
         return "\n".join(lines)
 
     async def use_item(self, event: Dict[str, Any], group_id: str, user_id: str, item_id: int) -> Tuple[bool, str]:
-        """使用物品"""
-        bag_items = self.get_user_bag(group_id, user_id)
-        
+        """使用物品，等待用户输入时不持有锁，最后在事务中确认物品未被使用并标记，同一物品不会被使用两次"""
         # 查找物品
-        target_item = None
-        item_index = -1
-        for i, item in enumerate(bag_items):
-            if item["id"] == item_id:
-                target_item = item
-                item_index = i
-                break
+        user_data = self.sign_data.get(group_id, {}).get("users", {}).get(user_id, {})
+        target_item = sign_storage.get_bag_item(user_data, item_id)
         
         if not target_item:
             return False, f"未找到ID为{item_id}的物品"
@@ -989,9 +917,10 @@ class SignPoints(Plugin):
         # 检查物品是否过期
         expire_time = target_item.get("expire_time")
         if expire_time is not None and expire_time < int(time.time()):
-            # 删除过期物品
-            self.sign_data[group_id]["users"][user_id]["bag"].pop(item_index)
-            self.save_json(self.sign_data_file, self.sign_data)
+            # 删除全部过期物品
+            async with self.ledger.lock(group_id, user_id):
+                self._modify_user(group_id, user_id,
+                                  lambda data: sign_storage.purge_expired(data, int(time.time())))
             return False, f"该物品已过期无法使用"
         
         # 根据物品类型执行不同操作
@@ -1004,20 +933,26 @@ class SignPoints(Plugin):
                 bonus_points = random.randint(10, 50)
             else:
                 bonus_points = random.randint(100, 300)
-            self.update_points(group_id, user_id, bonus_points)
-            result_msg = f"使用了{item_name}，获得额外{bonus_points}积分！"
+            # 积分和物品标记在同一事务中修改
+            async with self.ledger.lock(group_id, user_id):
+                consumed = self._consume_item(group_id, user_id, item_id, bonus_points,
+                                              key=self.operation_key(event, "use"))
+            if not consumed:
+                return False, f"该物品已经被使用过了"
+            return True, f"使用了{item_name}，获得额外{bonus_points}积分！"
             
         elif item_name == "双倍签到卡":
-            # 添加双倍签到标记
-            if "buffs" not in self.sign_data[group_id]["users"][user_id]:
-                self.sign_data[group_id]["users"][user_id]["buffs"] = {}
-            
             # 设置双倍签到Buff，持续1天
-            self.sign_data[group_id]["users"][user_id]["buffs"]["double_sign"] = {
+            buff = {
                 "expires": int(time.time()) + 86400,  # 24小时后过期
                 "multiplier": 2
             }
-            result_msg = f"使用了{item_name}，您的下次签到将获得双倍积分！(24小时内有效)"
+            async with self.ledger.lock(group_id, user_id):
+                consumed = self._consume_item(group_id, user_id, item_id,
+                                              effect=lambda data: data.setdefault("buffs", {}).update(double_sign=buff))
+            if not consumed:
+                return False, f"该物品已经被使用过了"
+            return True, f"使用了{item_name}，您的下次签到将获得双倍积分！(24小时内有效)"
             
         elif item_name == "禁言卡" or item_name == "超级禁言卡":
             # 启动禁言流程，先要求用户输入要禁言的对象
@@ -1178,7 +1113,7 @@ class SignPoints(Plugin):
                             # 检查机器人是否有管理员权限
                             try:
                                 # 获取机器人自身QQ号
-                                bot_qq = int(self.bot.config.get("bot", {}).get("self_id", "0"))
+                                bot_qq = int(self.bot.self_id or 0)
                                 
                                 # 获取机器人在群内的角色
                                 response = await self.bot._call_api('get_group_member_info', {
@@ -1231,16 +1166,53 @@ class SignPoints(Plugin):
                 logger.error(f"设置专属头衔过程中出错: {e}")
                 return False, f"头衔设置过程中出错: {str(e)}"
         
-        # 标记物品为已使用
-        self.sign_data[group_id]["users"][user_id]["bag"][item_index]["used"] = True
-        self.sign_data[group_id]["users"][user_id]["bag"][item_index]["use_time"] = int(time.time())
-        self.sign_data[group_id]["users"][user_id]["bag"][item_index]["use_date"] = self.get_today_date()
-        
-        # 保存数据
-        self.save_json(self.sign_data_file, self.sign_data)
+        # 标记物品为已使用：使用过程中可能等待了较长时间，期间同一物品可能已在其他消息中被使用
+        async with self.ledger.lock(group_id, user_id):
+            consumed = self._consume_item(group_id, user_id, item_id)
+        if not consumed:
+            return False, f"该物品已经被使用过了"
         
         return True, result_msg
         
+    def _consume_item(self, group_id: str, user_id: str, item_id: int, points: int = 0,
+                      key: Optional[str] = None, effect: Optional[Callable[[Dict[str, Any]], None]] = None) -> bool:
+        """在一个事务中确认物品仍存在且未被使用，标记为已使用并执行物品效果
+        
+        参数:
+            group_id: 群号
+            user_id: 用户QQ号
+            item_id: 物品ID
+            points: 同时增加的积分（经验卡）
+            key: 积分操作的幂等键
+            effect: 同时对用户记录执行的其他修改
+            
+        返回:
+            物品已被使用或已不存在时返回False
+        """
+        now, today = int(time.time()), self.get_today_date()
+        
+        def _mark_used(user_data: Dict[str, Any]) -> bool:
+            sign_storage.compact_user(user_data)
+            item = sign_storage.get_bag_item(user_data, item_id)
+            if item is None or item.get("used", False):
+                return False
+            sign_storage.mark_used(user_data, item, now, today)
+            if effect is not None:
+                effect(user_data)
+            return True
+            
+        if not points:
+            consumed = []
+            self._modify_user(group_id, user_id, lambda data: consumed.append(_mark_used(data)))
+            return consumed[0]
+            
+        self.ensure_group_config(group_id)
+        result, self.sign_data[group_id] = self.ledger.transact(
+            group_id, user_id, points, "use", key=key,
+            mutate=lambda group_data, user_data: _mark_used(user_data), fallback=self.sign_data[group_id])
+        self._sync_points(group_id, user_id)
+        return result.ok
+        
     async def _ask_for_target_user(self, event: Dict[str, Any], group_id: str, user_id: str, prompt: str) -> Optional[str]:
         """询问用户输入目标用户
         
@@ -1341,9 +1313,9 @@ class SignPoints(Plugin):
         if "double_sign" in buffs and buffs["double_sign"]["expires"] > time.time():
             multiplier = buffs["double_sign"]["multiplier"]
             original_points = points + bonus_points
-            points = int(original_points * multiplier)
-            bonus_points = points - original_points
-            bonus_messages.append(f"🎭 双倍签到卡生效: 额外 +{bonus_points}积分")
+            extra_points = int(original_points * multiplier) - original_points
+            bonus_points += extra_points
+            bonus_messages.append(f"🎭 双倍签到卡生效: 额外 +{extra_points}积分")
             # 使用后移除Buff
             del buffs["double_sign"]
         
@@ -1448,12 +1420,14 @@ class SignPoints(Plugin):
         if is_at_command and match:
             logger.info(f"用户 {user_id} 在群 {group_id} 查看积分")
             points = self.get_user_sign_info(group_id, user_id).get("total_points", 0)
+            rank, total = self.get_user_points_rank(group_id, user_id)
+            rank_text = f"\n🏆 群内排名: 第{rank}/{total}位" if rank else ""
             # 添加QQ头像
             avatar_url = f"[CQ:image,file=https://q1.qlogo.cn/g?b=qq&nk={user_id}&s=640]"
             await self.bot.send_msg(
                 message_type="group",
                 group_id=int(group_id),
-                message=f"{reply_code}{avatar_url}\nQQ: {user_id}\n💰 您当前的积分为: {points}"
+                message=f"{reply_code}{avatar_url}\nQQ: {user_id}\n💰 您当前的积分为: {points}{rank_text}"
             )
             return True
 
@@ -1462,6 +1436,9 @@ class SignPoints(Plugin):
         if is_at_command and match:
             logger.info(f"用户 {user_id} 在群 {group_id} 查看积分排行榜")
             result = await self.generate_rank_message(group_id)
+            rank, total = self.get_user_points_rank(group_id, user_id)
+            if rank > 10:
+                result += f"\n👤 你的排名: 第{rank}/{total}位"
             await self.bot.send_msg(
                 message_type="group",
                 group_id=int(group_id),
@@ -1536,7 +1513,8 @@ class SignPoints(Plugin):
         if is_at_command and match:
             item_id = int(match.group(1))
             logger.info(f"用户 {user_id} 在群 {group_id} 尝试兑换物品 {item_id}")
-            success, message = self.exchange_item(group_id, user_id, item_id)
+            async with self.ledger.lock(group_id, user_id):
+                success, message = self.exchange_item(group_id, user_id, item_id, key=self.operation_key(event, "exchange"))
             await self.bot.send_msg(
                 message_type="group",
                 group_id=int(group_id),
@@ -1551,8 +1529,7 @@ class SignPoints(Plugin):
             if is_at_command and match:
                 base_points = int(match.group(1))
                 self.ensure_group_config(group_id)
-                self.sign_data[group_id]["config"]["base_points"] = base_points
-                self.save_json(self.sign_data_file, self.sign_data)
+                self._modify_group_config(group_id, lambda config: config.update(base_points=base_points))
                 await self.bot.send_msg(
                     message_type="group",
                     group_id=int(group_id),
@@ -1566,8 +1543,8 @@ class SignPoints(Plugin):
                 days = match.group(1)
                 bonus = int(match.group(2))
                 self.ensure_group_config(group_id)
-                self.sign_data[group_id]["config"]["consecutive_bonus"][days] = bonus
-                self.save_json(self.sign_data_file, self.sign_data)
+                self._modify_group_config(
+                    group_id, lambda config: config.setdefault("consecutive_bonus", {}).update({days: bonus}))
                 await self.bot.send_msg(
                     message_type="group",
                     group_id=int(group_id),
@@ -1580,7 +1557,8 @@ class SignPoints(Plugin):
             if is_at_command and match:
                 target_user = match.group(1)
                 points_to_add = int(match.group(2))
-                new_points = self.update_points(group_id, target_user, points_to_add)
+                new_points = self.update_points(group_id, target_user, points_to_add, "admin",
+                                                key=self.operation_key(event, f"admin:{target_user}"))
                 
                 operation = "增加" if points_to_add > 0 else "减少"
                 points_abs = abs(points_to_add)
@@ -1597,7 +1575,8 @@ class SignPoints(Plugin):
             if is_at_command and match:
                 target_user = match.group(1)
                 points_to_add = int(match.group(2))
-                new_points = self.update_points(group_id, target_user, points_to_add)
+                new_points = self.update_points(group_id, target_user, points_to_add, "admin",
+                                                key=self.operation_key(event, f"admin:{target_user}"))
                 
                 operation = "增加" if points_to_add > 0 else "减少"
                 points_abs = abs(points_to_add)
@@ -1631,14 +1610,21 @@ class SignPoints(Plugin):
                 item_id = int(match.group(1))
                 state = match.group(2)
                 self.ensure_group_config(group_id)
-                for item in self.shop_data["global"]:
-                    if item["id"] == item_id:
+                # 商品ID是本群商店目录中的编号，找到对应的原始商品修改
+                found = []
+                def _mark_usable(shop_data: Dict[str, Any]) -> None:
+                    item = source_item(shop_data, group_id, item_id)
+                    if item is not None:
                         item["usable"] = (state == "usable")
-                for group_items in self.shop_data["groups"].values():
-                    for item in group_items:
-                        if item["id"] == item_id:
-                            item["usable"] = (state == "usable")
-                self.save_json(self.shop_data_file, self.shop_data)
+                        found.append(item)
+                self.update_shop(_mark_usable)
+                if not found:
+                    await self.bot.send_msg(
+                        message_type="group",
+                        group_id=int(group_id),
+                        message=f"{reply_code}❌ 未找到ID为{item_id}的物品"
+                    )
+                    return True
                 await self.bot.send_msg(
                     message_type="group",
                     group_id=int(group_id),
@@ -1646,6 +1632,38 @@ class SignPoints(Plugin):
                 )
                 return True
 
+            # 核对积分交易日志命令
+            is_at_command, match, _ = handle_at_command(event, self.bot, self.admin_patterns['ledger_check'])
+            if is_at_command and match:
+                self.ensure_group_config(group_id)
+                mismatches = self.ledger.verify(group_id, self.sign_data[group_id]["users"])
+                if not mismatches:
+                    result = "✅ 积分交易日志与当前积分一致"
+                else:
+                    lines = [f"⚠️ {len(mismatches)} 名用户的积分与交易日志不一致:"]
+                    for uid, logged, stored in mismatches[:20]:
+                        lines.append(f"  {uid}: 日志 {logged} / 当前 {stored}")
+                    result = "\n".join(lines)
+                await self.bot.send_msg(
+                    message_type="group",
+                    group_id=int(group_id),
+                    message=f"{reply_code}{result}"
+                )
+                return True
+
+            # 模拟抽奖命令
+            is_at_command, match, _ = handle_at_command(event, self.bot, self.admin_patterns['draw_sim'])
+            if is_at_command and match:
+                draw_times = int(match.group(1))
+                logger.info(f"管理员 {user_id} 在群 {group_id} 模拟抽奖 {draw_times} 次")
+                result = await self.simulate_draw(draw_times)
+                await self.bot.send_msg(
+                    message_type="group",
+                    group_id=int(group_id),
+                    message=f"{reply_code}{result}"
+                )
+                return True
+
         return False
 
 # 导出插件类，确保插件加载器能找到它
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+签到插件的群内排行
+
+- 积分排行使用按 (-积分, QQ号) 排序的列表，积分变化时二分查找删除旧位置并插入新位置，
+  任意用户的排名和前N名都可以直接取得，不再在每次 /rank 时排序全部用户
+- 今日签到顺序只追加，日期变化后清空；重启后首次使用时从签到记录恢复一次
+- 每次变化递增版本号，排行榜消息按版本号缓存
+"""
+
+from bisect import bisect_left, insort
+from typing import Dict, Any, List, Optional, Tuple
+
+class GroupRanking:
+    """一个群的积分排行和今日签到顺序"""
+
+    __slots__ = ("keys", "points", "version", "sign_date", "signers", "sign_positions", "cached_message")
+
+    def __init__(self):
+        self.keys: List[Tuple[int, str]] = []   # 按 (-积分, QQ号) 排序
+        self.points: Dict[str, int] = {}        # {QQ号: 积分}
+        self.version = 0
+        self.sign_date = ""                     # signers 对应的日期
+        self.signers: List[str] = []            # 今日按签到先后的QQ号
+        self.sign_positions: Dict[str, int] = {}  # {QQ号: 今日签到名次}
+        self.cached_message: Optional[Tuple[int, str]] = None  # (版本号, 排行榜消息)
+
+    @classmethod
+    def build(cls, users: Dict[str, Dict[str, Any]]) -> "GroupRanking":
+        """从群的用户数据建立排行"""
+        ranking = cls()
+        ranking.points = {uid: data.get("total_points", 0) for uid, data in users.items()}
+        ranking.keys = sorted((-points, uid) for uid, points in ranking.points.items())
+        return ranking
+
+    def update(self, user_id: str, points: int) -> None:
+        """更新用户积分"""
+        old = self.points.get(user_id)
+        if old == points:
+            return
+        if old is not None:
+            index = bisect_left(self.keys, (-old, user_id))
+            if index < len(self.keys) and self.keys[index] == (-old, user_id):
+                del self.keys[index]
+        self.points[user_id] = points
+        insort(self.keys, (-points, user_id))
+        self.version += 1
+
+    def rank(self, user_id: str) -> int:
+        """用户的积分名次（从1开始），没有记录时返回0"""
+        points = self.points.get(user_id)
+        if points is None:
+            return 0
+        return bisect_left(self.keys, (-points, user_id)) + 1
+
+    def top(self, limit: int) -> List[Tuple[str, int]]:
+        """积分前 limit 名 [(QQ号, 积分), ...]"""
+        return [(uid, -negative) for negative, uid in self.keys[:limit]]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def load_signers(self, date: str, users: Dict[str, Dict[str, Any]]) -> None:
+        """从签到记录恢复某天的签到顺序"""
+        signed = []
+        for uid, data in users.items():
+            if data.get("last_sign_date") != date:
+                continue
+            for record in reversed(data.get("history", [])):
+                if record.get("date") == date:
+                    signed.append((record.get("time", 0), uid))
+                    break
+        signed.sort()
+        self.sign_date = date
+        self.signers = [uid for _, uid in signed]
+        self.sign_positions = {uid: i + 1 for i, uid in enumerate(self.signers)}
+
+    def record_sign(self, date: str, user_id: str) -> int:
+        """
+        记录用户签到
+
+        返回:
+            用户今日的签到名次
+        """
+        if date != self.sign_date:
+            self.sign_date = date
+            self.signers = []
+            self.sign_positions = {}
+        position = self.sign_positions.get(user_id)
+        if position is None:
+            self.signers.append(user_id)
+            position = self.sign_positions[user_id] = len(self.signers)
+            self.version += 1
+        return position
+
+    def cache_message(self, message: str) -> None:
+        self.cached_message = (self.version, message)
+
+    def get_cached_message(self) -> Optional[str]:
+        """当前版本的排行榜消息，排行有变化后返回None"""
+        if self.cached_message is not None and self.cached_message[0] == self.version:
+            return self.cached_message[1]
+        return None
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+签到插件的用户记录格式
+
+- 签到记录和兑换记录是固定长度的环形缓冲区（保存为列表，超出长度时丢弃最旧的记录），
+  长期统计按月汇总为计数器，只保留最近若干个月
+- 背包保存为 {物品ID: 物品} 的字典，物品ID由每个用户的递增序号生成，使用和删除物品都是O(1)
+- 记录背包中最早的过期时间，未到该时间时检查过期为O(1)；到期后一次清理全部过期物品
+- 已使用的物品只保留最近若干个，超出两倍时批量清理
+
+旧版本的记录（背包为列表）在首次读取时由 compact_user 转换
+"""
+
+from typing import Dict, Any, List, Optional
+
+HISTORY_SIZE = 30           # 保留的签到记录数
+EXCHANGE_HISTORY_SIZE = 20  # 保留的兑换记录数
+MONTHS_KEPT = 24            # 保留的月度统计数
+USED_ITEMS_KEPT = 20        # 背包中保留的已使用物品数
+
+def compact_user(user_data: Dict[str, Any]) -> bool:
+    """
+    把用户记录转换为当前格式并裁剪超长的记录
+
+    返回:
+        记录是否有变化
+    """
+    changed = False
+    bag = user_data.get("bag")
+    if isinstance(bag, list):
+        items: Dict[str, Dict[str, Any]] = {}
+        next_id = max((item.get("id", 0) for item in bag), default=0) + 1
+        for item in bag:
+            # 旧版本的物品ID可能重复，重复的重新编号
+            if str(item.get("id")) in items:
+                item["id"] = next_id
+                next_id += 1
+            items[str(item["id"])] = item
+        user_data["bag"] = items
+        user_data["bag_seq"] = next_id
+        user_data["bag_used"] = sum(1 for item in bag if item.get("used"))
+        user_data["bag_next_expire"] = _next_expire(items)
+        changed = True
+    if "monthly" not in user_data:
+        monthly: Dict[str, List[int]] = {}
+        for record in user_data.get("history", []):
+            _add_monthly(monthly, record.get("date", ""), record.get("points", 0))
+        user_data["monthly"] = monthly
+        changed = True
+    for key, size in (("history", HISTORY_SIZE), ("exchanges", EXCHANGE_HISTORY_SIZE)):
+        records = user_data.get(key)
+        if records is not None and len(records) > size:
+            del records[:-size]
+            changed = True
+    return changed
+
+def _add_monthly(monthly: Dict[str, List[int]], date: str, points: int) -> None:
+    """把一次签到计入月度统计 {YYYY-MM: [签到次数, 积分]}"""
+    month = date[:7]
+    if not month:
+        return
+    counters = monthly.setdefault(month, [0, 0])
+    counters[0] += 1
+    counters[1] += points
+    while len(monthly) > MONTHS_KEPT:
+        del monthly[min(monthly)]
+
+def push_history(user_data: Dict[str, Any], record: Dict[str, Any]) -> None:
+    """追加签到记录并计入月度统计"""
+    history = user_data.setdefault("history", [])
+    history.append(record)
+    if len(history) > HISTORY_SIZE:
+        del history[:-HISTORY_SIZE]
+    _add_monthly(user_data.setdefault("monthly", {}), record.get("date", ""), record.get("points", 0))
+
+def push_exchange(user_data: Dict[str, Any], record: Dict[str, Any]) -> None:
+    """追加兑换记录"""
+    exchanges = user_data.setdefault("exchanges", [])
+    exchanges.append(record)
+    if len(exchanges) > EXCHANGE_HISTORY_SIZE:
+        del exchanges[:-EXCHANGE_HISTORY_SIZE]
+
+def monthly_stats(user_data: Dict[str, Any], month: str) -> List[int]:
+    """某月的 [签到次数, 积分]"""
+    return user_data.get("monthly", {}).get(month, [0, 0])
+
+def bag_items(user_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """背包中的物品，按获得顺序"""
+    bag = user_data.get("bag") or {}
+    return list(bag.values()) if isinstance(bag, dict) else list(bag)
+
+def get_bag_item(user_data: Dict[str, Any], item_id: int) -> Optional[Dict[str, Any]]:
+    bag = user_data.get("bag") or {}
+    return bag.get(str(item_id))
+
+def add_bag_item(user_data: Dict[str, Any], item: Dict[str, Any]) -> int:
+    """
+    把物品放入背包并分配ID
+
+    返回:
+        物品ID
+    """
+    compact_user(user_data)
+    bag = user_data.setdefault("bag", {})
+    item_id = user_data.get("bag_seq", 1)
+    user_data["bag_seq"] = item_id + 1
+    item["id"] = item_id
+    bag[str(item_id)] = item
+    expire_time = item.get("expire_time")
+    if expire_time is not None:
+        current = user_data.get("bag_next_expire")
+        user_data["bag_next_expire"] = expire_time if current is None else min(current, expire_time)
+    return item_id
+
+def remove_bag_item(user_data: Dict[str, Any], item_id: int) -> Optional[Dict[str, Any]]:
+    bag = user_data.get("bag") or {}
+    item = bag.pop(str(item_id), None)
+    if item is not None and item.get("used"):
+        user_data["bag_used"] = max(0, user_data.get("bag_used", 0) - 1)
+    return item
+
+def mark_used(user_data: Dict[str, Any], item: Dict[str, Any], now: int, today: str) -> None:
+    """标记物品已使用，已使用的物品过多时只保留最近的"""
+    if item.get("used"):
+        return
+    item["used"] = True
+    item["use_time"] = now
+    item["use_date"] = today
+    user_data["bag_used"] = user_data.get("bag_used", 0) + 1
+    if user_data["bag_used"] > USED_ITEMS_KEPT * 2:
+        bag = user_data["bag"]
+        used = sorted((bag_item.get("use_time", 0), key) for key, bag_item in bag.items() if bag_item.get("used"))
+        for _, key in used[:-USED_ITEMS_KEPT]:
+            del bag[key]
+        user_data["bag_used"] = min(len(used), USED_ITEMS_KEPT)
+
+def needs_purge(user_data: Dict[str, Any], now: int) -> bool:
+    """背包中是否可能有过期物品（O(1)）"""
+    next_expire = user_data.get("bag_next_expire")
+    return next_expire is not None and next_expire < now
+
+def purge_expired(user_data: Dict[str, Any], now: int) -> int:
+    """
+    清理背包中全部过期的物品
+
+    返回:
+        清理的物品数
+    """
+    if not needs_purge(user_data, now):
+        return 0
+    bag = user_data["bag"]
+    expired = [key for key, item in bag.items()
+               if item.get("expire_time") is not None and item["expire_time"] < now]
+    for key in expired:
+        remove_bag_item(user_data, int(key))
+    user_data["bag_next_expire"] = _next_expire(bag)
+    return len(expired)
+
+def _next_expire(bag: Dict[str, Dict[str, Any]]) -> Optional[int]:
+    return min((item["expire_time"] for item in bag.values() if item.get("expire_time") is not None), default=None)
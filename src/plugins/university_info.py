@@ -63,7 +63,7 @@ class UniversityInfo(Plugin):
         
         # 如果消息中有@机器人，则提取命令部分
         if '[CQ:at,qq=' in message:
-            bot_qq = str(self.bot.config.get("bot", {}).get("self_id", ""))
+            bot_qq = self.bot.self_id
             if is_at_bot(event, bot_qq):
                 message = extract_command(event, bot_qq)
                 
@@ -450,6 +450,16 @@ class UniversityInfo(Plugin):
             )
             return True
 
+# 插件元数据，用于延迟加载
+plugin_meta = {
+    "class": "UniversityInfo",
+    "events": ["message"],
+    "triggers": [
+        r"/university\s",
+        r"/大学\s"
+    ]
+}
+
 # 导出插件类，确保插件加载器能找到它
 plugin_class = UniversityInfo 
 
@@ -2,8 +2,6 @@
 # -*- coding: utf-8 -*-
 
 import re
-import os
-import json
 import logging
 import time
 import asyncio
@@ -13,9 +11,25 @@ from typing import Dict, Any, List, Tuple, Optional, Union
 # 导入Plugin基类和工具函数
 from plugin_system import Plugin
 from plugins.utils import handle_at_command, extract_command, is_at_bot
+from state_store import import_legacy_file
 
 logger = logging.getLogger("LCHBot")
 
+# 头衔在共享状态存储中的命名空间，每个头衔一条记录 {points, description}
+TITLES_NAMESPACE = "titles"
+# 用户头衔的命名空间，键为 "群号:QQ号"，值为 {title, set_time}
+USER_TITLES_NAMESPACE = "user_titles"
+# 头衔列表的版本号，任何进程添加或删除头衔时递增，各进程据此判断缓存的头衔列表是否过期
+TITLES_META_NAMESPACE = "titles_meta"
+
+# 没有任何头衔时创建的默认头衔
+DEFAULT_TITLES = {
+    "初级成员": {"points": 0, "description": "新人专属头衔"},
+    "活跃成员": {"points": 500, "description": "活跃的群组成员"},
+    "资深成员": {"points": 1000, "description": "在群内长期活跃的成员"},
+    "群内大佬": {"points": 2000, "description": "德高望重的群内成员"}
+}
+
 class UserItemManager(Plugin):
     """
     用户物品管理和专属头衔管理插件
@@ -55,112 +69,72 @@ class UserItemManager(Plugin):
             'title_admin': re.compile(r'^/title\s+admin\s+\[CQ:at,qq=(\d+)(?:,name=.*?)?\]\s+(.+)$'),
         }
         
-        # 数据文件路径
-        self.titles_data_file = "data/user_titles.json"
-        # 头衔数据
-        self.titles_data = self.load_titles_data()
+        # 头衔数据保存在共享状态存储中，首次运行时导入旧的数据文件
+        self.store = self.bot.state_store
+        import_legacy_file(self.store, USER_TITLES_NAMESPACE, "data/user_titles.json", self._import_legacy_data)
+        if not self.store.items(TITLES_NAMESPACE):
+            self.store.set_many(TITLES_NAMESPACE, DEFAULT_TITLES)
+            self._bump_titles_version()
+        # 头衔列表文本按共享的版本号缓存
+        self._title_list_cache: Optional[Tuple[int, str]] = None
         
         logger.info(f"插件 {self.name} (ID: {self.id}) 已初始化")
         
-    def load_titles_data(self) -> Dict[str, Any]:
-        """加载头衔数据"""
-        if not os.path.exists(self.titles_data_file):
-            # 创建目录（如果不存在）
-            os.makedirs(os.path.dirname(self.titles_data_file), exist_ok=True)
-            
-            # 创建默认数据
-            default_data = {
-                "titles": {
-                    "初级成员": {"points": 0, "description": "新人专属头衔"},
-                    "活跃成员": {"points": 500, "description": "活跃的群组成员"},
-                    "资深成员": {"points": 1000, "description": "在群内长期活跃的成员"},
-                    "群内大佬": {"points": 2000, "description": "德高望重的群内成员"}
-                },
-                "users": {}  # 格式: {"群号": {"用户QQ": {"title": "头衔名", "set_time": 时间戳}}}
-            }
+    def _import_legacy_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """导入旧数据文件：头衔直接写入，返回按 "群号:QQ号" 展开的用户头衔"""
+        self.store.set_many(TITLES_NAMESPACE, data.get("titles", {}))
+        self._bump_titles_version()
+        return {
+            f"{group_id}:{user_id}": info
+            for group_id, users in data.get("users", {}).items()
+            for user_id, info in users.items()
+        }
             
-            # 保存默认数据
-            with open(self.titles_data_file, 'w', encoding='utf-8') as f:
-                json.dump(default_data, f, ensure_ascii=False, indent=2)
-                
-            return default_data
+    def titles_version(self) -> int:
+        """头衔列表的版本号"""
+        return self.store.get(TITLES_META_NAMESPACE, "version", 0)
+        
+    def _bump_titles_version(self) -> None:
+        self.store.incr(TITLES_META_NAMESPACE, "version")
         
-        try:
-            with open(self.titles_data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            logger.error(f"加载头衔数据失败: {e}")
-            return {"titles": {}, "users": {}}
-            
-    def save_titles_data(self) -> None:
-        """保存头衔数据"""
-        try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(self.titles_data_file), exist_ok=True)
-            
-            with open(self.titles_data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.titles_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存头衔数据失败: {e}")
-            
     def get_available_titles(self) -> Dict[str, Dict[str, Any]]:
         """获取可用的头衔列表"""
-        return self.titles_data.get("titles", {})
+        return self.store.items(TITLES_NAMESPACE)
         
     def get_user_title(self, group_id: str, user_id: str) -> Optional[str]:
         """获取用户当前的头衔"""
-        return self.titles_data.get("users", {}).get(group_id, {}).get(user_id, {}).get("title")
+        return (self.store.get(USER_TITLES_NAMESPACE, f"{group_id}:{user_id}") or {}).get("title")
         
     def set_user_title(self, group_id: str, user_id: str, title: str) -> bool:
         """设置用户头衔"""
-        if title not in self.titles_data.get("titles", {}):
+        if self.store.get(TITLES_NAMESPACE, title) is None:
             return False
             
-        # 确保数据结构存在
-        if "users" not in self.titles_data:
-            self.titles_data["users"] = {}
-            
-        if group_id not in self.titles_data["users"]:
-            self.titles_data["users"][group_id] = {}
-            
-        # 设置头衔
-        self.titles_data["users"][group_id][user_id] = {
+        self.store.set(USER_TITLES_NAMESPACE, f"{group_id}:{user_id}", {
             "title": title,
             "set_time": int(time.time())
-        }
-        
-        self.save_titles_data()
+        })
         return True
         
     def clear_user_title(self, group_id: str, user_id: str) -> bool:
         """清除用户头衔"""
-        if (group_id in self.titles_data.get("users", {}) and 
-            user_id in self.titles_data["users"].get(group_id, {})):
-            del self.titles_data["users"][group_id][user_id]
-            self.save_titles_data()
-            return True
-        return False
+        return self.store.delete(USER_TITLES_NAMESPACE, f"{group_id}:{user_id}")
         
     def add_title(self, title_name: str, points: int, description: str) -> bool:
         """添加新头衔"""
-        if "titles" not in self.titles_data:
-            self.titles_data["titles"] = {}
-            
-        self.titles_data["titles"][title_name] = {
+        self.store.set(TITLES_NAMESPACE, title_name, {
             "points": points,
             "description": description
-        }
-        
-        self.save_titles_data()
+        })
+        self._bump_titles_version()
         return True
         
     def delete_title(self, title_name: str) -> bool:
         """删除头衔"""
-        if title_name in self.titles_data.get("titles", {}):
-            del self.titles_data["titles"][title_name]
-            self.save_titles_data()
-            return True
-        return False
+        deleted = self.store.delete(TITLES_NAMESPACE, title_name)
+        if deleted:
+            self._bump_titles_version()
+        return deleted
     
     def is_admin(self, user_id: int) -> bool:
         """检查用户是否是管理员"""
@@ -192,7 +166,7 @@ class UserItemManager(Plugin):
         """检查机器人是否有管理员权限"""
         try:
             # 获取机器人自身QQ号
-            bot_qq = int(self.bot.config.get("bot", {}).get("self_id", "0"))
+            bot_qq = int(self.bot.self_id or 0)
             
             # 获取机器人在群内的角色
             response = await self.bot._call_api('get_group_member_info', {
@@ -210,7 +184,16 @@ class UserItemManager(Plugin):
             return False
     
     async def format_title_list(self) -> str:
-        """格式化头衔列表信息"""
+        """格式化头衔列表信息，头衔没有变化时返回缓存的文本"""
+        version = self.titles_version()
+        cached = self._title_list_cache
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        text = self._render_title_list()
+        self._title_list_cache = (version, text)
+        return text
+        
+    def _render_title_list(self) -> str:
         titles = self.get_available_titles()
         
         if not titles:
@@ -604,7 +604,7 @@ def handle_at_command(event: Dict[str, Any], bot, command_pattern: re.Pattern) -
         (是否是有效的@命令, 匹配结果, 提取的命令)
     """
     # 获取机器人的QQ号
-    bot_qq = str(bot.config.get("bot", {}).get("self_id", ""))
+    bot_qq = bot.self_id
     
     # 检查是否@了机器人
     if not is_at_bot(event, bot_qq):
@@ -415,5 +415,14 @@ class Weather(Plugin):
             logger.error(f"格式化天气信息时发生错误: {e}", exc_info=True)
             return f"获取到天气信息，但格式化时出错。"
 
+# 插件元数据，用于延迟加载
+plugin_meta = {
+    "class": "Weather",
+    "events": ["message"],
+    "triggers": [
+        r"/weather\s"
+    ]
+}
+
 # 导出插件类，确保插件加载器能找到它
 plugin_class = Weather 
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+文字游戏的词库
+
+- 词库文件为UTF-8文本，每行一个词，可在制表符后附带空格分隔的拼音；
+  也可以是JSON列表，元素为字符串或带 word/pinyin 字段的对象（兼容常见的成语词典数据）；
+  文件名以 .gz 结尾时按gzip读取
+- 词库在首次使用时在线程池中加载，之后常驻内存
+- 全部词语放在集合中，并按首字、首个拼音（去掉声调）建立索引，
+  判断词语是否有效为O(1)，查找可接的词语和机器人接龙只访问对应的候选列表
+"""
+
+import os
+import gzip
+import json
+import random
+import asyncio
+import logging
+import unicodedata
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Tuple, Set
+
+logger = logging.getLogger("LCHBot")
+
+def plain_syllable(syllable: str) -> str:
+    """去掉拼音的声调符号和数字声调，ü 保留为 v"""
+    decomposed = unicodedata.normalize("NFD", syllable.strip().lower())
+    decomposed = decomposed.replace("u\u0308", "v").replace("u:", "v")
+    plain = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return plain.rstrip("012345")
+
+class Lexicon:
+    """一个词库及其索引"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.entries: List[str] = []  # 按加载顺序的全部词语，用于随机抽取
+        self.words: Set[str] = set()
+        # 首字索引 {字: [词语, ...]}
+        self.by_first: Dict[str, List[str]] = {}
+        # 首个拼音索引 {拼音: [词语, ...]}，只包含带拼音的词语
+        self.by_first_pinyin: Dict[str, List[str]] = {}
+        # 词语首尾的拼音 {词语: (首个拼音, 最后一个拼音)}
+        self.pinyin: Dict[str, Tuple[str, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.words
+
+    def add(self, word: str, pinyin: str = "") -> None:
+        """添加一个词语，重复的词语会被忽略"""
+        word = word.strip()
+        if not word or word in self.words:
+            return
+        self.words.add(word)
+        self.entries.append(word)
+        self.by_first.setdefault(word[0], []).append(word)
+        syllables = pinyin.split()
+        if syllables:
+            first, last = plain_syllable(syllables[0]), plain_syllable(syllables[-1])
+            self.pinyin[word] = (first, last)
+            self.by_first_pinyin.setdefault(first, []).append(word)
+
+    def links(self, previous: str, word: str, homophone: bool = False) -> bool:
+        """
+        判断 word 能否接在 previous 之后
+
+        参数:
+            previous: 上一个词语
+            word: 接龙的词语
+            homophone: 是否允许首字与尾字同音（两个词语都有拼音时才生效）
+        """
+        if word[:1] == previous[-1:]:
+            return True
+        if homophone:
+            tail = self.pinyin.get(previous)
+            head = self.pinyin.get(word)
+            return tail is not None and head is not None and head[0] == tail[1]
+        return False
+
+    def _candidates(self, word: str, homophone: bool) -> Iterator[str]:
+        """可以接在 word 之后的全部词语（可能包含已使用的）"""
+        yield from self.by_first.get(word[-1:], ())
+        if homophone and word in self.pinyin:
+            last_char = word[-1:]
+            for candidate in self.by_first_pinyin.get(self.pinyin[word][1], ()):
+                if candidate[0] != last_char:
+                    yield candidate
+
+    def continuations(self, word: str, used: Optional[Set[str]] = None, homophone: bool = False,
+                      limit: Optional[int] = None) -> List[str]:
+        """
+        查找可以接在 word 之后且未使用过的词语
+
+        参数:
+            word: 当前词语
+            used: 已使用的词语
+            homophone: 是否包含同音接龙的词语
+            limit: 最多返回的数量
+        返回:
+            词语列表
+        """
+        result = []
+        for candidate in self._candidates(word, homophone):
+            if used is None or candidate not in used:
+                result.append(candidate)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    def has_continuation(self, word: str, used: Optional[Set[str]] = None, homophone: bool = False) -> bool:
+        return bool(self.continuations(word, used, homophone, limit=1))
+
+    def next_move(self, word: str, used: Optional[Set[str]] = None, homophone: bool = False,
+                  rng: Optional[random.Random] = None) -> Optional[str]:
+        """
+        机器人接龙：从可接的词语中选择让下一位玩家可接词语最少（但不为零）的一个
+
+        返回:
+            词语，没有可接的词语时返回None
+        """
+        rng = rng or random
+        candidates = self.continuations(word, used, homophone)
+        if not candidates:
+            return None
+        rng.shuffle(candidates)
+
+        def options(candidate: str) -> int:
+            count = len(self.by_first.get(candidate[-1], ()))
+            return count if count > 0 else len(self.entries) + 1
+
+        return min(candidates, key=options)
+
+    def random_entry(self, rng: Optional[random.Random] = None, min_continuations: int = 1,
+                     attempts: int = 20) -> Optional[str]:
+        """
+        随机抽取一个词语，尽量选择后面至少有 min_continuations 个可接词语的
+
+        返回:
+            词语，词库为空时返回None
+        """
+        if not self.entries:
+            return None
+        rng = rng or random
+        word = rng.choice(self.entries)
+        for _ in range(attempts):
+            if len(self.by_first.get(word[-1], ())) >= min_continuations:
+                break
+            word = rng.choice(self.entries)
+        return word
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def read_entries(path: str) -> Iterable[Tuple[str, str]]:
+    """
+    读取词库文件
+
+    返回:
+        [(词语, 拼音), ...]，没有拼音时为空字符串
+    """
+    with _open_text(path) as f:
+        if path.endswith((".json", ".json.gz")):
+            data = json.load(f)
+            for item in data:
+                if isinstance(item, dict):
+                    yield str(item.get("word", "")), str(item.get("pinyin", ""))
+                else:
+                    yield str(item), ""
+            return
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            word, _, pinyin = line.partition("\t")
+            yield word, pinyin
+
+def load_lexicon(name: str, paths: List[str], min_length: int = 1, max_length: int = 0) -> Lexicon:
+    """
+    从一个或多个文件加载词库（同步执行）
+
+    参数:
+        name: 词库名
+        paths: 文件路径列表，不存在的文件会被跳过
+        min_length: 词语最少字数
+        max_length: 词语最多字数，为0时不限制
+    返回:
+        词库
+    """
+    lexicon = Lexicon(name)
+    for path in paths:
+        if not os.path.exists(path):
+            logger.warning(f"词库文件不存在: {path}")
+            continue
+        try:
+            for word, pinyin in read_entries(path):
+                word = word.strip()
+                if len(word) < min_length or (max_length and len(word) > max_length):
+                    continue
+                lexicon.add(word, pinyin)
+        except Exception as e:
+            logger.error(f"读取词库文件 {path} 失败: {e}")
+    logger.info(f"已加载词库「{name}」: {len(lexicon)} 个词语")
+    return lexicon
+
+class LexiconStore:
+    """按需加载的多个词库"""
+
+    def __init__(self, sources: Dict[str, Dict[str, Any]]):
+        """
+        参数:
+            sources: {词库名: {"files": [文件路径, ...], "min_length": 最少字数, "max_length": 最多字数}}
+        """
+        self.sources = sources
+        self.lexicons: Dict[str, Lexicon] = {}
+        self._lock = asyncio.Lock()
+
+    async def get(self, name: str) -> Lexicon:
+        """获取词库，首次使用时在线程池中加载"""
+        lexicon = self.lexicons.get(name)
+        if lexicon is not None:
+            return lexicon
+        async with self._lock:
+            if name not in self.lexicons:
+                source = self.sources.get(name, {})
+                self.lexicons[name] = await asyncio.to_thread(
+                    load_lexicon, name, list(source.get("files", [])),
+                    source.get("min_length", 1), source.get("max_length", 0))
+        return self.lexicons[name]
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多进程分片模式
+
+- 前端进程接收OneBot事件，按群号（私聊和好友请求按QQ号）哈希分配给固定的工作进程，
+  同一个群的事件始终由同一个进程按到达顺序处理：前一个事件处理完或处理超过交接时间后才开始下一个，
+  等待本群后续消息的处理（如选择目标、AI回复）超过交接时间后在后台继续，不会阻塞该群之后的事件
+- 每个工作进程运行自己的插件管理器，通过本机TCP连接与前端进程通信
+- 工作进程的API调用统一转发给前端进程发送，共用一个HTTP会话和重试逻辑
+- 工作进程退出后由前端进程自动重启，期间该分片的事件在队列中等待
+
+通信协议为每行一个JSON对象:
+    工作进程 -> 前端: {"type": "hello", "shard": 序号}
+                      {"type": "api", "id": 请求ID, "url": 接口路径, "data": 参数, "self_id": 发送账号}
+    前端 -> 工作进程: {"type": "event", "event": 事件}
+                      {"type": "api_result", "id": 请求ID, "result": 返回值}
+"""
+
+import os
+import sys
+import json
+import zlib
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Deque, Set
+
+logger = logging.getLogger("LCHBot")
+
+# 单行消息的长度上限，事件中可能带有较长的卡片消息
+STREAM_LIMIT = 16 * 1024 * 1024
+
+def shard_key(event: Dict[str, Any]) -> int:
+    """事件的分片键：群号，没有群号时使用QQ号，都没有时为0"""
+    key = event.get("group_id") or event.get("user_id") or 0
+    try:
+        return int(key)
+    except (TypeError, ValueError):
+        return zlib.crc32(str(key).encode("utf-8"))
+
+def shard_for_event(event: Dict[str, Any], shards: int) -> int:
+    """计算事件分配到的分片序号"""
+    return shard_key(event) % shards
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+class ShardSupervisor:
+    """前端进程中的分片调度器，负责启动工作进程并转发事件和API调用"""
+
+    def __init__(self, bot, workers: int = 2, host: str = "127.0.0.1", max_pending: int = 10000,
+                 restart_delay: float = 1.0, config_path: str = "config/config.yml"):
+        """
+        参数:
+            bot: 前端进程的机器人实例，用于发送API调用和记录指标
+            workers: 工作进程数
+            host: 进程间通信监听地址
+            max_pending: 每个分片等待发送的事件上限，超出时丢弃新事件
+            restart_delay: 工作进程退出后重启前的等待时间（秒）
+            config_path: 传给工作进程的配置文件路径
+        """
+        self.bot = bot
+        self.workers = workers
+        self.host = host
+        self.max_pending = max_pending
+        self.restart_delay = restart_delay
+        self.config_path = config_path
+
+        self.port = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._stopping = False
+        # 每个分片一个事件队列，工作进程重启期间事件在此等待
+        self.queues: List[asyncio.Queue] = []
+        self.processes: List[Optional[asyncio.subprocess.Process]] = [None] * workers
+        self.writers: List[Optional[asyncio.StreamWriter]] = [None] * workers
+        self._monitor_tasks: List[asyncio.Task] = []
+
+        self.routed = [0] * workers
+        self.dropped = 0
+        self.restarts = 0
+
+    async def start(self) -> None:
+        """监听本机端口并启动全部工作进程"""
+        self.queues = [asyncio.Queue(self.max_pending) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(self._handle_connection, self.host, 0, limit=STREAM_LIMIT)
+        self.port = self._server.sockets[0].getsockname()[1]
+        for shard in range(self.workers):
+            self._monitor_tasks.append(asyncio.create_task(self._keep_worker(shard)))
+        logger.info(f"分片模式已启动: {self.workers} 个工作进程，通信地址 {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        """停止全部工作进程"""
+        self._stopping = True
+        for task in self._monitor_tasks:
+            task.cancel()
+        for process in self.processes:
+            if process is not None and process.returncode is None:
+                process.terminate()
+        for process in self.processes:
+            if process is not None:
+                try:
+                    await asyncio.wait_for(process.wait(), 10)
+                except asyncio.TimeoutError:
+                    process.kill()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _keep_worker(self, shard: int) -> None:
+        """启动工作进程，退出后自动重启"""
+        main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+        while not self._stopping:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, main_path,
+                "--config", self.config_path,
+                "--worker", str(shard),
+                "--supervisor", f"{self.host}:{self.port}"
+            )
+            self.processes[shard] = process
+            logger.info(f"工作进程 {shard} 已启动，PID: {process.pid}")
+            returncode = await process.wait()
+            if self._stopping:
+                break
+            self.restarts += 1
+            self.bot.metrics.inc("lchbot_shard_restarts_total", shard=str(shard))
+            logger.error(f"工作进程 {shard} 已退出（返回码 {returncode}），{self.restart_delay} 秒后重启")
+            await asyncio.sleep(self.restart_delay)
+
+    def dispatch(self, event: Dict[str, Any]) -> bool:
+        """
+        将事件放入对应分片的队列
+
+        返回:
+            是否成功入队，队列已满时返回False
+        """
+        shard = shard_for_event(event, self.workers)
+        try:
+            self.queues[shard].put_nowait(encode_message({"type": "event", "event": event}))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self.bot.metrics.inc("lchbot_shard_events_total", shard=str(shard), result="dropped")
+            logger.warning(f"分片 {shard} 的事件队列已满，丢弃事件")
+            return False
+        self.routed[shard] += 1
+        self.bot.metrics.inc("lchbot_shard_events_total", shard=str(shard), result="routed")
+        return True
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """处理工作进程的连接"""
+        shard = None
+        sender = None
+        try:
+            hello = json.loads(await reader.readline() or b"{}")
+            shard = hello.get("shard")
+            if hello.get("type") != "hello" or not isinstance(shard, int) or not 0 <= shard < self.workers:
+                logger.warning(f"收到无效的工作进程连接: {hello}")
+                return
+            self.writers[shard] = writer
+            sender = asyncio.create_task(self._send_events(shard, writer))
+            logger.info(f"工作进程 {shard} 已连接")
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get("type") == "api":
+                    asyncio.create_task(self._forward_api(writer, message))
+        except (ConnectionError, ValueError) as e:
+            logger.error(f"工作进程 {shard} 的连接出错: {e}")
+        finally:
+            if sender is not None:
+                sender.cancel()
+            if shard is not None and self.writers[shard] is writer:
+                self.writers[shard] = None
+            writer.close()
+            if shard is not None:
+                logger.info(f"工作进程 {shard} 已断开")
+
+    async def _send_events(self, shard: int, writer: asyncio.StreamWriter) -> None:
+        """按顺序把分片队列中的事件发送给工作进程"""
+        queue = self.queues[shard]
+        while True:
+            data = await queue.get()
+            writer.write(data)
+            # 积压较多时等待缓冲区写出，避免占用过多内存
+            await writer.drain()
+
+    async def _forward_api(self, writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+        """代替工作进程调用API并返回结果"""
+        # 多账号模式下通过事件所属的账号发送，本任务结束后不影响其他调用
+        account = self.bot.accounts.get(message.get("self_id"))
+        if account is not None:
+            self.bot.accounts.activate(account)
+        try:
+            result = await self.bot._call_api(message.get("url", ""), message.get("data") or {},
+                                              deferrable=message.get("deferrable", False))
+        except Exception as e:
+            logger.error(f"转发工作进程的API调用出错: {e}", exc_info=True)
+            result = {"status": "failed", "error": str(e)}
+        if not writer.is_closing():
+            writer.write(encode_message({"type": "api_result", "id": message.get("id"), "result": result}))
+
+    def format_status(self) -> Dict[str, str]:
+        """生成用于 /system 显示的状态信息"""
+        online = sum(1 for writer in self.writers if writer is not None)
+        pending = sum(queue.qsize() for queue in self.queues)
+        return {
+            "分片模式": f"{online}/{self.workers} 个工作进程在线，已转发 {sum(self.routed)} 条事件，"
+                        f"排队 {pending} 条，丢弃 {self.dropped} 条，重启 {self.restarts} 次"
+        }
+
+class ShardWorkerLink:
+    """工作进程与前端进程之间的连接"""
+
+    def __init__(self, shard: int, address: str, api_timeout: float = 60.0, handoff_timeout: float = 1.0):
+        """
+        参数:
+            shard: 分片序号
+            address: 前端进程的通信地址，格式为 host:port
+            api_timeout: 等待API调用结果的超时时间（秒）
+            handoff_timeout: 同一个群的下一个事件最多等待前一个事件处理的时间（秒）
+        """
+        self.shard = shard
+        host, _, port = address.rpartition(":")
+        self.host = host or "127.0.0.1"
+        self.port = int(port)
+        self.api_timeout = api_timeout
+        self.handoff_timeout = handoff_timeout
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        # 各群（私聊为QQ号）等待处理的事件，每个群由一个任务按顺序交给处理函数
+        self._lanes: Dict[int, Deque[Dict[str, Any]]] = {}
+        # 正在运行的按群排队任务和事件处理任务
+        self._lane_tasks: Set[asyncio.Task] = set()
+
+    async def connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port, limit=STREAM_LIMIT)
+        self._writer.write(encode_message({"type": "hello", "shard": self.shard}))
+        await self._writer.drain()
+        logger.info(f"工作进程 {self.shard} 已连接到前端进程 {self.host}:{self.port}")
+
+    async def call_api(self, url: str, data: Dict[str, Any], self_id: Optional[str] = None,
+                       deferrable: bool = False) -> Dict[str, Any]:
+        """通过前端进程调用API，self_id 为发送API调用的账号，deferrable 的调用在接口不可用时由前端进程延迟补发"""
+        if self._writer is None or self._writer.is_closing():
+            return {"status": "failed", "error": "与前端进程的连接已断开"}
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            self._writer.write(encode_message({"type": "api", "id": request_id, "url": url, "data": data,
+                                               "self_id": self_id, "deferrable": deferrable}))
+            return await asyncio.wait_for(future, self.api_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"等待前端进程返回API调用结果超时: {url}")
+            return {"status": "failed", "error": "等待API调用结果超时"}
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def run(self, handler: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        """
+        接收事件直到连接断开
+
+        参数:
+            handler: 事件处理函数；不同群的事件并发处理，同一个群的事件按到达顺序开始处理
+        """
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                logger.warning(f"工作进程 {self.shard} 与前端进程的连接已断开")
+                break
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if message.get("type") == "event":
+                self._dispatch(message["event"], handler)
+            elif message.get("type") == "api_result":
+                future = self._pending.get(message.get("id"))
+                if future is not None and not future.done():
+                    future.set_result(message.get("result") or {})
+        for future in self._pending.values():
+            if not future.done():
+                future.set_result({"status": "failed", "error": "与前端进程的连接已断开"})
+
+    def _dispatch(self, event: Dict[str, Any], handler: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        """把事件放入所属群的队列，该群没有正在处理的事件时启动排队任务"""
+        key = shard_key(event)
+        lane = self._lanes.get(key)
+        if lane is not None:
+            lane.append(event)
+            return
+        self._lanes[key] = deque([event])
+        self._track(asyncio.create_task(self._drain(key, handler)))
+
+    def _track(self, task: asyncio.Task) -> None:
+        self._lane_tasks.add(task)
+        task.add_done_callback(self._lane_tasks.discard)
+
+    async def _drain(self, key: int, handler: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        """
+        按到达顺序把一个群的事件交给处理函数，队列处理完后结束
+
+        每个事件在单独的任务中处理，下一个事件等到前一个处理完或超过交接时间后才开始；
+        等待本群后续消息的处理超时后在后台继续，它等待的消息可以进入处理
+        """
+        lane = self._lanes[key]
+        try:
+            while lane:
+                task = asyncio.create_task(self._handle(handler, lane.popleft()))
+                self._track(task)
+                await asyncio.wait((task,), timeout=self.handoff_timeout)
+        finally:
+            self._lanes.pop(key, None)
+
+    async def _handle(self, handler: Callable[[Dict[str, Any]], Awaitable[None]], event: Dict[str, Any]) -> None:
+        try:
+            await handler(event)
+        except Exception as e:
+            logger.error(f"工作进程 {self.shard} 处理事件出错: {e}", exc_info=True)
+
+    async def close(self) -> None:
+        for task in list(self._lane_tasks):
+            task.cancel()
+        if self._writer is not None:
+            self._writer.close()
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+共享状态存储
+
+- 插件按 (命名空间, 键) 保存可JSON序列化的值，多个机器人进程可以共用同一份数据
+- SQLiteStateStore: 内嵌SQLite数据库，WAL模式，按行读写，适合多进程同时读写
+- FileStateStore: 每个命名空间一个JSON文件，写入时加文件锁并重新读取，适合单机少量进程
+- update/incr/compare_and_set 在存储层的事务或文件锁内完成读-改-写，多进程并发时不会丢失更新
+- 存储在事件循环中同步调用，等待其他进程的写锁最多 lock_timeout 秒，超时抛出 StateStoreBusy，
+  不会长时间阻塞事件循环
+"""
+
+import os
+import copy
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, Optional, Callable, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger("LCHBot")
+
+# 表示键不存在的占位值，区别于保存的None
+MISSING = object()
+
+# 已完成导入的旧数据文件，键为导入到的命名空间
+MIGRATIONS_NAMESPACE = "migrations"
+
+class StateStoreBusy(Exception):
+    """其他进程持有写锁超过等待时间"""
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def _copy(value: Any) -> Any:
+    """复制缓存中的值，避免调用方修改缓存（占位值保持不变）"""
+    return value if value is MISSING else copy.deepcopy(value)
+
+def process_owner() -> str:
+    """当前进程的标识，用于租约"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class StateStore:
+    """状态存储接口，子类实现 get/items/update/set_many"""
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        """读取值，不存在时返回default"""
+        raise NotImplementedError
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        """读取命名空间中的全部键值"""
+        raise NotImplementedError
+
+    def update(self, namespace: str, key: str, func: Callable[[Any], Any], default: Any = None) -> Any:
+        """
+        原子地读-改-写一个值
+
+        参数:
+            namespace: 命名空间
+            key: 键
+            func: 接收当前值（不存在时为default），返回新值；返回MISSING时删除该键
+            default: 键不存在时传给func的值
+        返回:
+            新值
+        """
+        raise NotImplementedError
+
+    def set_many(self, namespace: str, values: Dict[str, Any]) -> None:
+        """在一次写入中保存多个键值，用于迁移旧数据"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        """保存值"""
+        self.update(namespace, key, lambda _: value)
+
+    def delete(self, namespace: str, key: str) -> bool:
+        """删除值，返回键之前是否存在"""
+        existed = []
+        def _delete(current):
+            existed.append(current is not MISSING)
+            return MISSING
+        self.update(namespace, key, _delete, MISSING)
+        return existed[0]
+
+    def incr(self, namespace: str, key: str, delta: int = 1, minimum: Optional[int] = None) -> int:
+        """
+        原子地增加整数值
+
+        参数:
+            delta: 增量，可以为负数
+            minimum: 结果的下限，为None时不限制
+        返回:
+            增加后的值
+        """
+        def _incr(current):
+            value = int(current or 0) + delta
+            return value if minimum is None else max(minimum, value)
+        return self.update(namespace, key, _incr, 0)
+
+    def compare_and_set(self, namespace: str, key: str, expected: Any, value: Any) -> bool:
+        """
+        当前值等于expected时才写入value
+
+        参数:
+            expected: 期望的当前值，为MISSING时要求键不存在
+            value: 新值，为MISSING时删除该键
+        返回:
+            是否写入成功
+        """
+        swapped = []
+        def _cas(current):
+            if current is expected or current == expected:
+                swapped.append(True)
+                return value
+            swapped.append(False)
+            return current
+        self.update(namespace, key, _cas, MISSING)
+        return swapped[0]
+
+    def acquire_lease(self, name: str, ttl: float, owner: Optional[str] = None) -> bool:
+        """
+        获取或续期一个租约，同一时间只有一个进程持有，用于只应运行一份的后台任务
+
+        参数:
+            name: 租约名称
+            ttl: 有效期（秒），持有者需要在到期前续期
+            owner: 持有者标识，默认为当前进程
+        返回:
+            是否持有租约
+        """
+        owner = owner or process_owner()
+        now = time.time()
+        def _acquire(current):
+            if current is MISSING or current.get("owner") == owner or current.get("expires", 0) < now:
+                return {"owner": owner, "expires": now + ttl}
+            return current
+        return self.update("leases", name, _acquire, MISSING).get("owner") == owner
+
+    def _record(self, namespace: str, seconds: float, success: bool) -> None:
+        if self.metrics is not None:
+            self.metrics.record_flush(f"state:{namespace}", seconds, success)
+
+class SQLiteStateStore(StateStore):
+    """基于SQLite的状态存储，每个键值一行"""
+
+    def __init__(self, path: str = "data/state.db", lock_timeout: float = 0.5, metrics=None):
+        """
+        参数:
+            path: 数据库文件路径
+            lock_timeout: 其他进程持有写锁时的最长等待时间（秒）
+            metrics: 运行指标注册表
+        """
+        super().__init__(metrics)
+        self.path = path
+        self.lock_timeout = lock_timeout
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # 手动管理事务；插件也可能在线程池中读写，连接由锁保护
+        self._conn = sqlite3.connect(path, timeout=lock_timeout, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        logger.info(f"共享状态存储: SQLite {path}")
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM state WHERE namespace = ?", (namespace,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def _begin(self, namespace: str, start: float) -> None:
+        """开始写事务，等待写锁超时时抛出 StateStoreBusy"""
+        try:
+            # IMMEDIATE 在读取前就取得写锁，其他进程的读-改-写会排队等待
+            self._conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            self._record(namespace, time.perf_counter() - start, False)
+            raise StateStoreBusy(f"状态存储 {namespace} 被其他进程锁定超过 {self.lock_timeout} 秒: {e}") from e
+
+    def update(self, namespace: str, key: str, func: Callable[[Any], Any], default: Any = None) -> Any:
+        start = time.perf_counter()
+        success = False
+        with self._lock:
+            self._begin(namespace, start)
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+                value = func(json.loads(row[0]) if row else default)
+                if value is MISSING:
+                    self._conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+                else:
+                    self._conn.execute(
+                        "INSERT INTO state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, "
+                        "updated_at = excluded.updated_at",
+                        (namespace, key, _dumps(value), time.time())
+                    )
+                self._conn.execute("COMMIT")
+                success = True
+            finally:
+                if not success:
+                    self._conn.execute("ROLLBACK")
+                self._record(namespace, time.perf_counter() - start, success)
+        return value
+
+    def set_many(self, namespace: str, values: Dict[str, Any]) -> None:
+        start = time.perf_counter()
+        success = False
+        now = time.time()
+        with self._lock:
+            self._begin(namespace, start)
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                    [(namespace, key, _dumps(value), now) for key, value in values.items()]
+                )
+                self._conn.execute("COMMIT")
+                success = True
+            finally:
+                if not success:
+                    self._conn.execute("ROLLBACK")
+                self._record(namespace, time.perf_counter() - start, success)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class _FileLock:
+    """跨进程的文件锁，等待超过 timeout 秒时抛出 StateStoreBusy"""
+
+    def __init__(self, path: str, timeout: float):
+        self.path = path
+        self.timeout = timeout
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a+b")
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+                return self
+            except OSError:
+                if time.monotonic() >= deadline:
+                    self._file.close()
+                    raise StateStoreBusy(f"状态文件 {self.path} 被其他进程锁定超过 {self.timeout} 秒")
+                time.sleep(0.005)
+
+    def __exit__(self, *exc_info):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+
+class FileStateStore(StateStore):
+    """基于JSON文件的状态存储，每个命名空间一个文件"""
+
+    def __init__(self, directory: str = "data/state", lock_timeout: float = 0.5, metrics=None):
+        """
+        参数:
+            directory: 数据目录
+            lock_timeout: 其他进程持有文件锁时的最长等待时间（秒）
+            metrics: 运行指标注册表
+        """
+        super().__init__(metrics)
+        self.directory = directory
+        self.lock_timeout = lock_timeout
+        os.makedirs(directory, exist_ok=True)
+        # {命名空间: ((修改时间, 大小), 数据)}，文件未变化时直接使用缓存
+        self._cache: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+        self._lock = threading.RLock()
+        logger.info(f"共享状态存储: 文件 {directory}")
+
+    def _path(self, namespace: str) -> str:
+        return os.path.join(self.directory, f"{namespace}.json")
+
+    def _load(self, namespace: str) -> Dict[str, Any]:
+        """读取命名空间文件，文件未变化时返回缓存"""
+        path = self._path(namespace)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._cache.pop(namespace, None)
+            return {}
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._cache.get(namespace)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"读取状态文件 {path} 失败: {e}")
+            return cached[1] if cached else {}
+        self._cache[namespace] = (signature, data)
+        return data
+
+    def _write(self, namespace: str, data: Dict[str, Any]) -> None:
+        path = self._path(namespace)
+        temp_file = f"{path}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_file, path)
+        stat = os.stat(path)
+        self._cache[namespace] = ((stat.st_mtime_ns, stat.st_size), data)
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        with self._lock:
+            value = self._load(namespace).get(key, MISSING)
+        return default if value is MISSING else _copy(value)
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        with self._lock:
+            return copy.deepcopy(self._load(namespace))
+
+    def update(self, namespace: str, key: str, func: Callable[[Any], Any], default: Any = None) -> Any:
+        start = time.perf_counter()
+        success = False
+        with self._lock:
+            try:
+                with _FileLock(f"{self._path(namespace)}.lock", self.lock_timeout):
+                    # 持有文件锁后重新读取，包含其他进程刚写入的内容
+                    data = dict(self._load(namespace))
+                    value = func(_copy(data.get(key, default)))
+                    if value is MISSING:
+                        if data.pop(key, MISSING) is not MISSING:
+                            self._write(namespace, data)
+                    elif data.get(key, MISSING) != value:
+                        data[key] = value
+                        self._write(namespace, data)
+                success = True
+            finally:
+                self._record(namespace, time.perf_counter() - start, success)
+        return _copy(value)
+
+    def set_many(self, namespace: str, values: Dict[str, Any]) -> None:
+        start = time.perf_counter()
+        success = False
+        with self._lock:
+            try:
+                with _FileLock(f"{self._path(namespace)}.lock", self.lock_timeout):
+                    data = dict(self._load(namespace))
+                    data.update(copy.deepcopy(values))
+                    self._write(namespace, data)
+                success = True
+            finally:
+                self._record(namespace, time.perf_counter() - start, success)
+
+def create_state_store(config: Dict[str, Any], metrics=None) -> StateStore:
+    """
+    按配置创建状态存储
+
+    参数:
+        config: state_store 配置项，backend 为 file 或 sqlite
+        metrics: 运行指标注册表
+    """
+    backend = config.get("backend", "file")
+    # 旧配置使用 busy_timeout（只用于sqlite）
+    lock_timeout = config.get("lock_timeout", config.get("busy_timeout", 0.5))
+    if backend == "sqlite":
+        return SQLiteStateStore(config.get("path", "data/state.db"), lock_timeout=lock_timeout, metrics=metrics)
+    if backend != "file":
+        logger.warning(f"未知的状态存储类型 {backend}，使用文件存储")
+    return FileStateStore(config.get("directory", "data/state"), lock_timeout=lock_timeout, metrics=metrics)
+
+def import_legacy_file(store: StateStore, namespace: str, path: str,
+                       convert: Callable[[Any], Dict[str, Any]], wait: float = 30.0) -> int:
+    """
+    首次运行时从旧的JSON数据文件导入数据，旧文件保留不动
+
+    导入完成后记录在 migrations 命名空间中，之后即使命名空间被清空也不会再次导入；
+    多个进程（分片工作进程或多个实例）同时启动时只有取得租约的进程导入，其他进程等待导入完成
+
+    参数:
+        store: 状态存储
+        namespace: 导入到的命名空间
+        path: 旧数据文件
+        convert: 把旧文件内容转换为 {键: 值}
+        wait: 等待其他进程导入的最长时间（秒）
+    返回:
+        本进程导入的键数
+    """
+    deadline = time.monotonic() + wait
+    while os.path.exists(path) and store.get(MIGRATIONS_NAMESPACE, namespace) is None:
+        if store.acquire_lease(f"migrate:{namespace}", wait):
+            return _import_legacy_file(store, namespace, path, convert)
+        if time.monotonic() >= deadline:
+            logger.warning(f"等待其他进程从 {path} 导入状态数据超时")
+            return 0
+        time.sleep(0.1)
+    return 0
+
+def _import_legacy_file(store: StateStore, namespace: str, path: str,
+                        convert: Callable[[Any], Dict[str, Any]]) -> int:
+    values = {}
+    # 命名空间已有数据（如旧版本导入后重命名了文件以外的情况）时只记录，不覆盖
+    if not store.items(namespace):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            # 空文件视为没有数据
+            values = convert(json.loads(text)) if text.strip() else {}
+            if values:
+                store.set_many(namespace, values)
+        except Exception as e:
+            logger.error(f"从 {path} 导入状态数据失败: {e}")
+            return 0
+        logger.info(f"已从 {path} 导入 {len(values)} 条数据到共享状态存储 {namespace}")
+    store.set(MIGRATIONS_NAMESPACE, namespace, {"source": path, "count": len(values), "time": int(time.time())})
+    return len(values)